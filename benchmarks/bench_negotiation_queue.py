@@ -0,0 +1,33 @@
+"""
+remote peers joining a room all at once, their newConsumer and newDataConsumer requests negotiated by the server
+event loop one after another, or handed off to the negotiation queue of the recv handler which merges them:
+time until all of them are consumed, offer/answer rounds, time spent queued and the longest the server event loop
+was held by a newConsumer request
+
+usage: python -m benchmarks.bench_negotiation_queue [num_peers]
+"""
+import asyncio
+import logging
+import sys
+
+from tests.fake_room import runConcurrentJoins
+
+
+def run(numPeers: int = 50):
+    logging.disable(logging.ERROR)
+    print(f'{"mode":>10} {"total(ms)":>10} {"rounds":>7} {"operations":>11} {"round avg(ms)":>14} '
+          f'{"wait max(ms)":>13} {"loop held max(ms)":>18}')
+    for mode, negotiateInBackground in (('inline', False), ('background', True)):
+        result = asyncio.run(runConcurrentJoins(numPeers, negotiateInBackground))
+        stats = result['negotiationStats']['recv']
+        rounds = stats['negotiation']['count']
+        operations = sum(wait['count'] for wait in stats['wait'].values())
+        waitMax = max(wait['maxSeconds'] for wait in stats['wait'].values())
+        loopHeld = result['dispatchStats']['request']['newConsumer']['maxSeconds']
+        print(f'{mode:>10} {result["seconds"] * 1000:>10.1f} {rounds:>7} {operations:>11} '
+              f'{stats["negotiation"]["totalSeconds"] * 1000 / rounds:>14.2f} {waitMax * 1000:>13.2f} '
+              f'{loopHeld * 1000:>18.2f}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
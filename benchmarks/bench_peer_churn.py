@@ -0,0 +1,35 @@
+"""
+memory kept by a long-running client while remote peers join, are consumed and leave:
+tracemalloc growth per churned peer, overall and allocated by smcdk itself, the allocation sites that grew most,
+the sizes of the structures indexed by consumer and of the remote SDP before and after the churn,
+and the time per peer at the start and at the end of the churn, flat as long as the closed media sections are reused
+
+usage: python -m benchmarks.bench_peer_churn [num_peers] [num_data_consumers_per_peer]
+"""
+import asyncio
+import logging
+import sys
+
+from tests.fake_room import runPeerChurn
+
+
+def run(numPeers: int = 1000, numDataConsumers: int = 1):
+    logging.disable(logging.ERROR)
+    result = asyncio.run(runPeerChurn(numPeers, numDataConsumers=numDataConsumers))
+    print(f'{numPeers} peers churned in {result["seconds"]:.1f} s, '
+          f'{result["seconds"] * 1000 / numPeers:.1f} ms/peer')
+    peerSeconds = result['peerSeconds']
+    decile = max(1, numPeers // 10)
+    print(f'first {decile} peers {sum(peerSeconds[:decile]) * 1000 / decile:.1f} ms/peer, '
+          f'last {decile} peers {sum(peerSeconds[-decile:]) * 1000 / decile:.1f} ms/peer')
+    print(f'{result["bytesPerPeer"]:.0f} bytes/peer, {result["filteredBytesPerPeer"]:.0f} bytes/peer by smcdk')
+    print(f'{"structure":>28} {"before":>8} {"after":>8}')
+    for name, sizeBefore in result['sizesBefore'].items():
+        print(f'{name:>28} {sizeBefore:>8} {result["sizesAfter"][name]:>8}')
+    print('top growth:')
+    for site, sizeDiff in result['topGrowth']:
+        print(f'{sizeDiff / numPeers:>10.0f} bytes/peer  {site}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000, int(sys.argv[2]) if len(sys.argv) > 2 else 1)
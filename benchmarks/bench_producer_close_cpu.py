@@ -0,0 +1,23 @@
+"""
+CPU time of the process while video producers send to an in-process aiortc peer and once they were closed:
+closing a producer stops its sender, so the encoding of a track which stays live(e.g. shared) stops with it
+
+usage: python -m benchmarks.bench_producer_close_cpu [num_producers] [window_seconds]
+"""
+import asyncio
+import logging
+import sys
+
+from tests.fake_sfu import measureProducerCpu
+
+
+def run(numProducers: int = 4, windowSeconds: float = 3):
+    logging.disable(logging.ERROR)
+    result = asyncio.run(measureProducerCpu(numProducers, windowSeconds))
+    print(f'{numProducers} video producers, CPU seconds per second over {windowSeconds} s windows')
+    for name in ('idle', 'producing', 'closed'):
+        print(f'{name:>10} {result[name]:>8.3f}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 4, float(sys.argv[2]) if len(sys.argv) > 2 else 3)
@@ -0,0 +1,103 @@
+"""
+CPU cost of each recorded consumer stream per record mode: transcode(MediaRecorder decoding and encoding again),
+container(EncodedFrameRecorder) and rtp(RtpDumpRecorder), the RTP packets of a VP8/Opus media file
+are fed in real time to as many RTCRtpReceiver as recorded streams
+
+usage: python -m benchmarks.bench_recording_modes [numStreams] [seconds]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from aiortc.contrib.media import MediaRecorder
+from aiortc.rtcrtpparameters import RTCRtpCodecParameters
+
+from smcdk.api.encoded_recorder import EncodedFrameRecorder, RtpDumpRecorder
+
+from tests.fake_media import createFakeReceiver, generateMediaFile, generateRtpPackets
+
+CODECS = {
+    'video': RTCRtpCodecParameters(mimeType='video/VP8', clockRate=90000, payloadType=101),
+    'audio': RTCRtpCodecParameters(mimeType='audio/opus', clockRate=48000, channels=2, payloadType=100)
+}
+SUFFIXES = {
+    'transcode': {'video': 'mp4', 'audio': 'mp3'},
+    'container': {'video': 'webm', 'audio': 'ogg'},
+    'rtp': {'video': 'rtp', 'audio': 'rtp'}
+}
+
+
+def createRecorder(mode: str, kind: str, filePath: str):
+    if mode == 'container':
+        return EncodedFrameRecorder(filePath, CODECS[kind].mimeType)
+    if mode == 'rtp':
+        codec = CODECS[kind]
+        return RtpDumpRecorder(filePath, kind, {'codecs': [{
+            'mimeType': codec.mimeType, 'clockRate': codec.clockRate, 'channels': codec.channels or 1,
+            'payloadType': codec.payloadType}]})
+    return MediaRecorder(filePath)
+
+
+async def feed(receiver, packets: list, startTime: float):
+    loop = asyncio.get_running_loop()
+    for seconds, packet in packets:
+        delay = startTime + seconds - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await receiver._handle_rtp_packet(packet, arrival_time_ms=int(loop.time() * 1000))
+
+
+async def measure(mode: str, kind: str, packets: list, numStreams: int, directoryPath: str) -> float:
+    """
+    :return: CPU seconds per second of media
+    """
+    loop = asyncio.get_running_loop()
+    receivers = []
+    recorders = []
+    for idx in range(numStreams):
+        receiver = await createFakeReceiver(kind, CODECS[kind], ssrc=1000 + idx)
+        recorder = createRecorder(mode, kind, f'{directoryPath}/{mode}_{kind}_{idx}.{SUFFIXES[mode][kind]}')
+        if mode == 'transcode':
+            recorder.addTrack(receiver.track)
+        else:
+            recorder.addReceiver(receiver)
+        await recorder.start()
+        receivers.append(receiver)
+        recorders.append(recorder)
+    try:
+        startCpu = time.process_time()
+        startTime = loop.time()
+        await asyncio.gather(*[feed(receiver, packets, startTime) for receiver in receivers])
+        # let the decoding and encoding of the last frames happen
+        await asyncio.sleep(0.1)
+        cpu = time.process_time() - startCpu
+        elapsed = loop.time() - startTime
+    finally:
+        for receiver, recorder in zip(receivers, recorders):
+            await receiver.stop()
+            await recorder.stop()
+    return cpu / elapsed
+
+
+async def runAll(numStreams: int, seconds: float):
+    with tempfile.TemporaryDirectory() as directoryPath:
+        mediaFilePath = os.path.join(directoryPath, 'sample.webm')
+        generateMediaFile(mediaFilePath, seconds=seconds, videoCodec='libvpx', audioCodec='libopus',
+                          width=640, height=480)
+        packets = {kind: generateRtpPackets(mediaFilePath, kind, codec) for kind, codec in CODECS.items()}
+        print(f'{numStreams} streams of {seconds}s 640x480 VP8 or Opus')
+        print(f'{"mode":>10} {"kind":>6} {"cpu%":>8} {"cpu%/stream":>12}')
+        for mode in SUFFIXES:
+            for kind in CODECS:
+                cpu = await measure(mode, kind, packets[kind], numStreams, directoryPath)
+                print(f'{mode:>10} {kind:>6} {cpu * 100:>8.1f} {cpu * 100 / numStreams:>12.2f}')
+
+
+def run(numStreams: int = 4, seconds: float = 5):
+    asyncio.run(runAll(numStreams, seconds))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 4, float(sys.argv[2]) if len(sys.argv) > 2 else 5)
@@ -0,0 +1,101 @@
+"""
+event loop lag while transcoding recorded streams: MediaRecorder encoding on the event loop
+against PooledMediaRecorder on a thread or process RecordingPool,
+each stream is fed 640x480 frames at 30 fps like a consumer's track
+
+usage: python -m benchmarks.bench_recording_pool [numStreams] [seconds]
+"""
+import asyncio
+import fractions
+import sys
+import tempfile
+
+import av
+from aiortc import MediaStreamTrack
+from aiortc.contrib.media import MediaRecorder
+from aiortc.mediastreams import MediaStreamError
+
+from smcdk.api.recording_pool import PooledMediaRecorder, RecordingPool
+
+
+class PacedVideoTrack(MediaStreamTrack):
+    kind = 'video'
+
+    def __init__(self, seconds: float):
+        super().__init__()
+        self._numFrames = int(seconds * 30)
+        self._frameIdx = 0
+        self._startTime = None
+
+    async def recv(self):
+        loop = asyncio.get_running_loop()
+        if self._startTime is None:
+            self._startTime = loop.time()
+        if self._frameIdx >= self._numFrames:
+            self.stop()
+            raise MediaStreamError
+        await asyncio.sleep(max(0, self._startTime + self._frameIdx / 30 - loop.time()))
+        frame = av.VideoFrame(640, 480, 'yuv420p')
+        for plane in frame.planes:
+            # so that every frame costs a real encode
+            plane.update(bytes((self._frameIdx + offset) % 256 for offset in range(plane.line_size)) * plane.height)
+        frame.pts, frame.time_base = self._frameIdx, fractions.Fraction(1, 30)
+        self._frameIdx += 1
+        return frame
+
+
+async def measureLag(stopEvent: asyncio.Event, interval: float = 0.01) -> float:
+    """
+    :return: max seconds a timer of the loop fired late
+    """
+    loop = asyncio.get_running_loop()
+    maxLag = 0
+    while not stopEvent.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        maxLag = max(maxLag, loop.time() - expected)
+    return maxLag
+
+
+async def measure(backend: str, numStreams: int, seconds: float, directoryPath: str) -> tuple:
+    """
+    :return: (max loop lag in seconds, dropped frames)
+    """
+    pool = RecordingPool(backend) if backend != 'loop' else None
+    recorders = []
+    for idx in range(numStreams):
+        filePath = f'{directoryPath}/{backend}_{idx}.mp4'
+        recorder = MediaRecorder(filePath) if pool is None else PooledMediaRecorder(filePath, pool=pool)
+        recorder.addTrack(PacedVideoTrack(seconds))
+        recorders.append(recorder)
+    stopEvent = asyncio.Event()
+    lagTask = asyncio.ensure_future(measureLag(stopEvent))
+    try:
+        for recorder in recorders:
+            await recorder.start()
+        await asyncio.sleep(seconds)
+    finally:
+        for recorder in recorders:
+            await recorder.stop()
+        stopEvent.set()
+        if pool is not None:
+            pool.shutdown()
+    droppedFrames = sum(recorder.droppedFrames for recorder in recorders if isinstance(recorder, PooledMediaRecorder))
+    return await lagTask, droppedFrames
+
+
+async def runAll(numStreams: int, seconds: float):
+    print(f'{numStreams} streams of {seconds}s 640x480 at 30 fps')
+    print(f'{"backend":>8} {"max lag(ms)":>12} {"dropped":>8}')
+    with tempfile.TemporaryDirectory() as directoryPath:
+        for backend in ('loop', 'thread', 'process'):
+            lag, droppedFrames = await measure(backend, numStreams, seconds, directoryPath)
+            print(f'{backend:>8} {lag * 1000:>12.1f} {droppedFrames:>8}')
+
+
+def run(numStreams: int = 4, seconds: float = 5):
+    asyncio.run(runAll(numStreams, seconds))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 4, float(sys.argv[2]) if len(sys.argv) > 2 else 5)
@@ -0,0 +1,47 @@
+"""
+per-call latency of RemoteSdp.getSdp() while receive sections are added one by one,
+compared with writing the whole session dict on every call (the former getSdp())
+
+usage: python -m benchmarks.bench_remote_sdp
+"""
+import time
+
+from smcdk.deps.sdp_transform import sdp_transform
+from smcdk.handlers.sdp.remote_sdp import RemoteSdp
+from smcdk.rtp_parameters import RtpParameters
+
+from tests.fake_parameters import generateTransportRemoteParameters, generateConsumerRemoteParameters
+
+
+def run(numSections: int = 500, reportEvery: int = 100):
+    _, iceParameters, iceCandidates, dtlsParameters, sctpParameters = generateTransportRemoteParameters()
+    remoteSdp = RemoteSdp(iceParameters=iceParameters, iceCandidates=iceCandidates, dtlsParameters=dtlsParameters,
+                          sctpParameters=sctpParameters)
+    fullWriteSeconds = 0.0
+    cachedSeconds = 0.0
+    print(f'{"sections":>8} {"full write(ms/call)":>20} {"cached(ms/call)":>16}')
+    for idx in range(numSections):
+        consumerParameters = generateConsumerRemoteParameters(
+            codecMimeType='audio/opus' if idx % 2 == 0 else 'video/VP8')
+        rtpParameters = RtpParameters(**consumerParameters['rtpParameters'])
+        remoteSdp.receive(mid=str(idx), kind=consumerParameters['kind'], offerRtpParameters=rtpParameters,
+                          streamId=rtpParameters.rtcp.cname, trackId=consumerParameters['id'])
+
+        start = time.perf_counter()
+        sdp = remoteSdp.getSdp()
+        cachedSeconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        fullSdp = sdp_transform.write(remoteSdp._sdpDict)
+        fullWriteSeconds += time.perf_counter() - start
+
+        assert sdp == fullSdp, f'output mismatch with {idx + 1} sections'
+        if (idx + 1) % reportEvery == 0:
+            print(f'{idx + 1:>8} {fullWriteSeconds * 1000 / reportEvery:>20.3f} '
+                  f'{cachedSeconds * 1000 / reportEvery:>16.3f}')
+            fullWriteSeconds = 0.0
+            cachedSeconds = 0.0
+
+
+if __name__ == '__main__':
+    run()
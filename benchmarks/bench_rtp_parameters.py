@@ -0,0 +1,109 @@
+"""
+per producer and per consumer cost of the RTP parameters work of the negotiation, with the pydantic models
+(the former deep copies, validations and dict()) and with the slotted structs of smcdk.rtp_structs,
+the validation of the consumer parameters from the server at the API boundary included in both
+
+usage: python -m benchmarks.bench_rtp_parameters
+"""
+import asyncio
+import logging
+import timeit
+
+from smcdk.consumer import ConsumerOptions
+from smcdk.models.handler_interface import HandlerReceiveOptions, HandlerSendResult
+from smcdk.ortc import getExtendedRtpCapabilities, getSendingRtpParameters, getSendingRemoteRtpParameters, \
+    generateProbatorRtpParameters, reduceCodecs, RTP_PROBATOR_MID, RTP_PROBATOR_SSRC, \
+    RTP_PROBATOR_CODEC_PAYLOAD_TYPE
+from smcdk.rtp_parameters import RtpParameters, RtpEncodingParameters, RtcpParameters, RTX
+from smcdk.rtp_structs import RtpParametersStruct, RtpEncodingParametersStruct, RtcpParametersStruct, RtxStruct, \
+    modelDict
+
+from tests.fake_handler import FakeHandler
+from tests.fake_parameters import generateRouterRtpCapabilities, generateConsumerRemoteParameters
+
+
+def produceWithModels(sendingRtpParameters: RtpParameters, sendingRemoteRtpParameters: RtpParameters) -> dict:
+    rtpParameters = sendingRtpParameters.copy(deep=True)
+    rtpParameters.codecs = reduceCodecs(rtpParameters.codecs)
+    remoteRtpParameters = sendingRemoteRtpParameters.copy(deep=True)
+    remoteRtpParameters.codecs = reduceCodecs(remoteRtpParameters.codecs)
+    rtpParameters.mid = '0'
+    rtpParameters.rtcp = RtcpParameters()
+    rtpParameters.rtcp.cname = 'cname'
+    rtpParameters.encodings = [RtpEncodingParameters(ssrc=1111, rtx=RTX(ssrc=1112))]
+    result = HandlerSendResult(localId='0', rtpParameters=rtpParameters, rtpSender=None)
+    return result.rtpParameters.dict(exclude_none=True)
+
+
+def produceWithStructs(sendingRtpParameters: RtpParametersStruct,
+                       sendingRemoteRtpParameters: RtpParametersStruct) -> dict:
+    rtpParameters = sendingRtpParameters.copy()
+    rtpParameters.codecs = reduceCodecs(rtpParameters.codecs)
+    remoteRtpParameters = sendingRemoteRtpParameters.copy()
+    remoteRtpParameters.codecs = reduceCodecs(remoteRtpParameters.codecs)
+    rtpParameters.mid = '0'
+    rtpParameters.rtcp = RtcpParametersStruct()
+    rtpParameters.rtcp.cname = 'cname'
+    rtpParameters.encodings = [RtpEncodingParametersStruct(ssrc=1111, rtx=RtxStruct(ssrc=1112))]
+    result = HandlerSendResult(localId='0', rtpParameters=rtpParameters.toModel(), rtpSender=None)
+    return modelDict(result.rtpParameters, exclude_none=True)
+
+
+def consumeWithModels(remoteParameters: dict) -> RtpParameters:
+    # validated at the API boundary in both cases
+    options = ConsumerOptions(id=remoteParameters['id'], producerId=remoteParameters['producerId'],
+                              kind=remoteParameters['kind'],
+                              rtpParameters=RtpParameters(**remoteParameters['rtpParameters']))
+    rtpParameters = options.rtpParameters.copy(deep=True)
+    # the former generateProbatorRtpParameters()
+    videoRtpParameters = rtpParameters.copy(deep=True)
+    probatorRtpParameters = RtpParameters(mid=RTP_PROBATOR_MID,
+                                          encodings=[RtpEncodingParameters(ssrc=RTP_PROBATOR_SSRC)],
+                                          rtcp=RtcpParameters(cname='probator'))
+    probatorRtpParameters.codecs.append(videoRtpParameters.codecs[0])
+    probatorRtpParameters.codecs[0].payloadType = RTP_PROBATOR_CODEC_PAYLOAD_TYPE
+    probatorRtpParameters.headerExtensions = videoRtpParameters.headerExtensions
+    return rtpParameters
+
+
+def consumeWithStructs(remoteParameters: dict) -> RtpParameters:
+    # validated at the API boundary in both cases
+    options = ConsumerOptions(id=remoteParameters['id'], producerId=remoteParameters['producerId'],
+                              kind=remoteParameters['kind'],
+                              rtpParameters=RtpParameters(**remoteParameters['rtpParameters']))
+    rtpParameters = RtpParametersStruct.fromModel(options.rtpParameters)
+    HandlerReceiveOptions(trackId=options.id, kind=options.kind, rtpParameters=rtpParameters)
+    generateProbatorRtpParameters(rtpParameters)
+    return rtpParameters.toModel()
+
+
+def run(number: int = 2000):
+    logging.disable(logging.ERROR)
+    localCaps = asyncio.run(FakeHandler(tracks=[]).getNativeRtpCapabilities())
+    extendedRtpCapabilities = getExtendedRtpCapabilities(localCaps, generateRouterRtpCapabilities())
+    sendingModels = (getSendingRtpParameters('video', extendedRtpCapabilities),
+                     getSendingRemoteRtpParameters('video', extendedRtpCapabilities))
+    sendingStructs = tuple(RtpParametersStruct.fromModel(model) for model in sendingModels)
+    assert produceWithModels(*sendingModels) == produceWithStructs(*sendingStructs)
+    remoteParameters = generateConsumerRemoteParameters(codecMimeType='video/VP8')
+    assert consumeWithModels(remoteParameters) == consumeWithStructs(remoteParameters)
+    model = consumeWithModels(remoteParameters)
+    struct = RtpParametersStruct.fromModel(model)
+
+    cases = [
+        ('deep copy', lambda: model.copy(deep=True), lambda: struct.copy()),
+        ('model -> internal', lambda: model.copy(deep=True), lambda: RtpParametersStruct.fromModel(model)),
+        ('dict(exclude_none)', lambda: model.dict(exclude_none=True), lambda: struct.dict(exclude_none=True)),
+        ('produce', lambda: produceWithModels(*sendingModels), lambda: produceWithStructs(*sendingStructs)),
+        ('consume', lambda: consumeWithModels(remoteParameters), lambda: consumeWithStructs(remoteParameters)),
+    ]
+    print(f'{"video parameters":>20} {"pydantic(us)":>13} {"structs(us)":>12} {"speedup":>8}')
+    for name, withModels, withStructs in cases:
+        modelsSeconds = min(timeit.repeat(withModels, number=number, repeat=7)) / number
+        structsSeconds = min(timeit.repeat(withStructs, number=number, repeat=7)) / number
+        print(f'{name:>20} {modelsSeconds * 1e6:>13.1f} {structsSeconds * 1e6:>12.1f} '
+              f'{modelsSeconds / structsSeconds:>7.1f}x')
+
+
+if __name__ == '__main__':
+    run()
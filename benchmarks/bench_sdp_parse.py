@@ -0,0 +1,50 @@
+"""
+microbenchmark of sdp_transform.parse against the former regex-per-line implementation
+
+usage: python -m benchmarks.bench_sdp_parse
+"""
+import re
+import timeit
+
+from smcdk.deps.sdp_transform.grammar import grammar
+from smcdk.deps.sdp_transform.parser import parse, parseReg
+
+from .sdp_samples import generateSdp
+
+
+def legacyParse(sdp: str) -> dict:
+    # the implementation before the compiled parser engine, kept as the baseline
+    session = {}
+    media = []
+    location = session
+    lines = [line for line in sdp.splitlines() if re.match(r'^([a-z])=(.*)', line)]
+    for l in lines:
+        field = l[0]
+        content = l[2:]
+        if field == 'm':
+            media.append({
+                'rtp': [],
+                'fmtp': []
+            })
+            location = media[-1]
+        for obj in grammar.get(field, []):
+            if re.match(obj['reg'], content):
+                parseReg(obj, location, content)
+                break
+    session['media'] = media
+    return session
+
+
+def run(sectionCounts=(1, 10, 50, 200)):
+    print(f'{"m-sections":>10} {"legacy(ms)":>12} {"compiled(ms)":>13} {"speedup":>8}')
+    for count in sectionCounts:
+        sdp = generateSdp(count)
+        assert parse(sdp) == legacyParse(sdp), f'output mismatch with {count} m-sections'
+        number = max(1, 200 // count)
+        legacy = min(timeit.repeat(lambda: legacyParse(sdp), number=number, repeat=5)) / number
+        compiled = min(timeit.repeat(lambda: parse(sdp), number=number, repeat=5)) / number
+        print(f'{count:>10} {legacy * 1000:>12.3f} {compiled * 1000:>13.3f} {legacy / compiled:>7.1f}x')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,30 @@
+"""
+microbenchmark of sdp_transform.write against the former writer, which scanned the whole grammar per media section
+
+usage: python -m benchmarks.bench_sdp_write
+"""
+import copy
+import timeit
+
+from smcdk.deps.sdp_transform.parser import parse
+from smcdk.deps.sdp_transform.writer import write
+
+from tests.fake_sdp import legacyWrite
+
+from .sdp_samples import generateSdp
+
+
+def run(sectionCounts=(1, 10, 50, 200)):
+    print(f'{"m-sections":>10} {"legacy(ms)":>12} {"compiled(ms)":>13} {"speedup":>8}')
+    for count in sectionCounts:
+        sdpDict = parse(generateSdp(count))
+        assert write(copy.deepcopy(sdpDict)) == legacyWrite(copy.deepcopy(sdpDict)), \
+            f'output mismatch with {count} m-sections'
+        number = max(1, 200 // count)
+        legacy = min(timeit.repeat(lambda: legacyWrite(sdpDict), number=number, repeat=15)) / number
+        compiled = min(timeit.repeat(lambda: write(sdpDict), number=number, repeat=15)) / number
+        print(f'{count:>10} {legacy * 1000:>12.3f} {compiled * 1000:>13.3f} {legacy / compiled:>7.1f}x')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,80 @@
+"""
+CPU cost of each producer added on the same media file, either every producer with its own MediaPlayer
+or all of them subscribed to the shared source of mediaSourceRegistry,
+the producer tracks are drained at the pace of the media like the senders do, without encoding
+
+usage: python -m benchmarks.bench_shared_media_source [media_file]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+from aiortc.contrib.media import MediaPlayer
+from aiortc.mediastreams import MediaStreamError
+
+from smcdk.api.media_source_registry import MediaSourceRegistry
+
+from tests.fake_media import generateMediaFile
+
+
+async def drain(track, deadline: float):
+    loop = asyncio.get_running_loop()
+    while loop.time() < deadline:
+        try:
+            await track.recv()
+        except MediaStreamError:
+            return
+
+
+async def measure(playerFactory: Callable, mediaFilePath: str, numProducers: int, seconds: float) -> float:
+    """
+    :return: CPU seconds per second of media
+    """
+    loop = asyncio.get_running_loop()
+    players = [playerFactory(mediaFilePath) for _ in range(numProducers)]
+    tracks = [track for player in players for track in (player.audio, player.video) if track is not None]
+    startCpu = time.process_time()
+    startTime = loop.time()
+    await asyncio.gather(*[drain(track, startTime + seconds) for track in tracks])
+    elapsed = loop.time() - startTime
+    cpu = time.process_time() - startCpu
+    for track in tracks:
+        track.stop()
+    # let the players' decoding threads exit
+    await asyncio.sleep(0.2)
+    return cpu / elapsed
+
+
+async def runAll(mediaFilePath: str, producerCounts: List[int] = (1, 2, 4, 8, 16), seconds: float = 5):
+    print(f'{mediaFilePath}, {seconds}s per measure')
+    print(f'{"producers":>9} {"independent(cpu%)":>18} {"shared(cpu%)":>13} '
+          f'{"independent(cpu%/producer)":>27} {"shared(cpu%/producer)":>22}')
+    registry = MediaSourceRegistry()
+    baseline = {}
+    for numProducers in producerCounts:
+        independent = await measure(MediaPlayer, mediaFilePath, numProducers, seconds)
+        shared = await measure(registry.acquire, mediaFilePath, numProducers, seconds)
+        assert len(registry) == 0, 'the shared source is still open'
+        baseline.setdefault('independent', independent)
+        baseline.setdefault('shared', shared)
+        added = max(numProducers - 1, 1)
+        print(f'{numProducers:>9} {independent * 100:>18.1f} {shared * 100:>13.1f} '
+              f'{(independent - baseline["independent"]) * 100 / added:>27.2f} '
+              f'{(shared - baseline["shared"]) * 100 / added:>22.2f}')
+
+
+def run(mediaFilePath: str = None):
+    if mediaFilePath is not None:
+        asyncio.run(runAll(mediaFilePath))
+        return
+    with tempfile.TemporaryDirectory() as directoryPath:
+        generatedFilePath = os.path.join(directoryPath, 'sample.mkv')
+        generateMediaFile(generatedFilePath, seconds=10, width=640, height=480)
+        asyncio.run(runAll(generatedFilePath))
+
+
+if __name__ == '__main__':
+    run(sys.argv[1] if len(sys.argv) > 1 else None)
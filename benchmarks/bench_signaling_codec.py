@@ -0,0 +1,95 @@
+"""
+encode/decode throughput of the signaling codecs over protoo traffic, either recorded
+(a file with one raw protoo message per line) or a synthetic session: router rtp capabilities,
+transports, join, newConsumer requests and a stream of downlinkBwe/consumerScore notifications
+
+usage: python -m benchmarks.bench_signaling_codec [recorded_messages_file]
+"""
+import random
+import sys
+import time
+from typing import List
+
+from smcdk.api.signaling_codec import CODECS, StdlibJsonCodec
+
+from tests.fake_parameters import generateRouterRtpCapabilities, generateTransportRemoteParameters, \
+    generateConsumerRemoteParameters
+
+
+def generateSession(numConsumers: int = 50, numNotifications: int = 5000) -> List[str]:
+    encoder = StdlibJsonCodec()
+    messages = [{'response': True, 'id': 1, 'ok': True,
+                 'data': generateRouterRtpCapabilities().dict(exclude_none=True)}]
+    for requestId in (2, 3):
+        id, iceParameters, iceCandidates, dtlsParameters, sctpParameters = generateTransportRemoteParameters()
+        messages.append({'response': True, 'id': requestId, 'ok': True, 'data': {
+            'id': id,
+            'iceParameters': iceParameters.dict(exclude_none=True),
+            'iceCandidates': [iceCandidate.dict(exclude_none=True) for iceCandidate in iceCandidates],
+            'dtlsParameters': dtlsParameters.dict(exclude_none=True),
+            'sctpParameters': sctpParameters.dict(exclude_none=True)
+        }})
+    messages.append({'response': True, 'id': 4, 'ok': True, 'data': {'peers': []}})
+    consumerIds = []
+    for idx in range(numConsumers):
+        consumerParameters = generateConsumerRemoteParameters(
+            codecMimeType='audio/opus' if idx % 2 == 0 else 'video/VP8')
+        consumerIds.append(consumerParameters['id'])
+        messages.append({'request': True, 'id': 1000 + idx, 'method': 'newConsumer', 'data': {
+            'peerId': f'peer-{idx // 2}',
+            'producerPaused': False,
+            'type': 'simple',
+            'appData': {},
+            **consumerParameters
+        }})
+    rand = random.Random(0)
+    for idx in range(numNotifications):
+        if idx % 4 == 0:
+            messages.append({'notification': True, 'method': 'downlinkBwe', 'data': {
+                'desiredBitrate': rand.randint(100000, 3000000),
+                'effectiveDesiredBitrate': rand.randint(100000, 3000000),
+                'availableBitrate': rand.randint(100000, 3000000)
+            }})
+        else:
+            messages.append({'notification': True, 'method': 'consumerScore', 'data': {
+                'consumerId': rand.choice(consumerIds),
+                'score': {'score': rand.randint(0, 10), 'producerScore': rand.randint(0, 10),
+                          'producerScores': [rand.randint(0, 10)]}
+            }})
+    return [encoder.encode(message) for message in messages]
+
+
+def loadRecording(filePath: str) -> List[str]:
+    with open(filePath, encoding='utf-8') as file:
+        return [line for line in (line.strip() for line in file) if line]
+
+
+def run(rawMessages: List[str], rounds: int = 5):
+    numBytes = sum(len(rawMessage.encode('utf-8')) for rawMessage in rawMessages)
+    print(f'{len(rawMessages)} messages, {numBytes / 1024:.1f} KiB')
+    print(f'{"codec":>8} {"decode(us/msg)":>15} {"encode(us/msg)":>15} {"decode(MiB/s)":>14}')
+    expected = [StdlibJsonCodec().decode(rawMessage) for rawMessage in rawMessages]
+    for name, codecClass in CODECS.items():
+        try:
+            codec = codecClass()
+        except ImportError:
+            print(f'{name:>8} {"not installed":>15}')
+            continue
+        decodeSeconds = float('inf')
+        encodeSeconds = float('inf')
+        for _ in range(rounds):
+            start = time.perf_counter()
+            decoded = [codec.decode(rawMessage) for rawMessage in rawMessages]
+            decodeSeconds = min(decodeSeconds, time.perf_counter() - start)
+            start = time.perf_counter()
+            encoded = [codec.encode(message) for message in decoded]
+            encodeSeconds = min(encodeSeconds, time.perf_counter() - start)
+        assert decoded == expected, f'{name} decoded messages differently'
+        assert [codec.decode(rawMessage) for rawMessage in encoded] == expected, f'{name} round-trip mismatch'
+        print(f'{name:>8} {decodeSeconds * 1e6 / len(rawMessages):>15.2f} '
+              f'{encodeSeconds * 1e6 / len(rawMessages):>15.2f} '
+              f'{numBytes / decodeSeconds / 1024 / 1024:>14.1f}')
+
+
+if __name__ == '__main__':
+    run(loadRecording(sys.argv[1]) if len(sys.argv) > 1 else generateSession())
@@ -0,0 +1,86 @@
+"""
+synthetic but realistic SDP texts (aiortc/mediasoup flavour) shared by the SDP benchmarks
+"""
+
+_SESSION = [
+    'v=0',
+    'o=- 3848736491 3848736491 IN IP4 0.0.0.0',
+    's=-',
+    't=0 0',
+    'a=group:BUNDLE {mids}',
+    'a=msid-semantic:WMS *',
+]
+
+_AUDIO = [
+    'm=audio 9 UDP/TLS/RTP/SAVPF 100',
+    'c=IN IP4 0.0.0.0',
+    'a=recvonly',
+    'a=extmap:1 urn:ietf:params:rtp-hdrext:sdes:mid',
+    'a=extmap:5 http://www.ietf.org/id/draft-holmer-rmcat-transport-wide-cc-extensions-01',
+    'a=extmap:10 urn:ietf:params:rtp-hdrext:ssrc-audio-level',
+    'a=mid:{mid}',
+    'a=msid:{peer} {track}',
+    'a=rtcp:9 IN IP4 0.0.0.0',
+    'a=rtcp-mux',
+    'a=ssrc:{ssrc} cname:{cname}',
+    'a=rtpmap:100 opus/48000/2',
+    'a=rtcp-fb:100 transport-cc',
+    'a=fmtp:100 minptime=10;useinbandfec=1',
+    'a=ice-ufrag:8fcG',
+    'a=ice-pwd:rUbFLmjgW0xbUeDo2fG4Mc',
+    'a=candidate:0 1 udp 1076302079 192.168.56.1 44444 typ host',
+    'a=end-of-candidates',
+    'a=ice-options:renomination',
+    'a=fingerprint:sha-256 82:5A:68:3D:36:C3:0A:DE:AF:E7:32:43:D2:88:83:57:E2:BD:2D:9D:E4:E2:97:23:17:79:C3:3E:57:B4:B2:96',
+    'a=setup:active',
+]
+
+_VIDEO = [
+    'm=video 9 UDP/TLS/RTP/SAVPF 101 102',
+    'c=IN IP4 0.0.0.0',
+    'a=recvonly',
+    'a=extmap:1 urn:ietf:params:rtp-hdrext:sdes:mid',
+    'a=extmap:4 http://www.webrtc.org/experiments/rtp-hdrext/abs-send-time',
+    'a=extmap:5 http://www.ietf.org/id/draft-holmer-rmcat-transport-wide-cc-extensions-01',
+    'a=extmap:11 urn:3gpp:video-orientation',
+    'a=extmap:12 urn:ietf:params:rtp-hdrext:toffset',
+    'a=mid:{mid}',
+    'a=msid:{peer} {track}',
+    'a=rtcp:9 IN IP4 0.0.0.0',
+    'a=rtcp-mux',
+    'a=rtcp-rsize',
+    'a=ssrc-group:FID {ssrc} {rtxSsrc}',
+    'a=ssrc:{ssrc} cname:{cname}',
+    'a=ssrc:{rtxSsrc} cname:{cname}',
+    'a=rtpmap:101 VP8/90000',
+    'a=rtcp-fb:101 nack',
+    'a=rtcp-fb:101 nack pli',
+    'a=rtcp-fb:101 ccm fir',
+    'a=rtcp-fb:101 goog-remb',
+    'a=rtcp-fb:101 transport-cc',
+    'a=fmtp:101 x-google-start-bitrate=1500',
+    'a=rtpmap:102 rtx/90000',
+    'a=fmtp:102 apt=101',
+    'a=ice-ufrag:8fcG',
+    'a=ice-pwd:rUbFLmjgW0xbUeDo2fG4Mc',
+    'a=candidate:0 1 udp 1076302079 192.168.56.1 44444 typ host',
+    'a=end-of-candidates',
+    'a=ice-options:renomination',
+    'a=fingerprint:sha-256 82:5A:68:3D:36:C3:0A:DE:AF:E7:32:43:D2:88:83:57:E2:BD:2D:9D:E4:E2:97:23:17:79:C3:3E:57:B4:B2:96',
+    'a=setup:active',
+]
+
+
+def generateSdp(numMediaSections: int) -> str:
+    """
+    :param numMediaSections: number of m-sections, alternating audio and video
+    :return: the SDP text, CRLF separated
+    """
+    mids = [str(idx) for idx in range(numMediaSections)]
+    lines = [line.format(mids=' '.join(mids)) for line in _SESSION]
+    for idx, mid in enumerate(mids):
+        template = _AUDIO if idx % 2 == 0 else _VIDEO
+        ssrc = 100000000 + idx * 2
+        lines.extend(line.format(mid=mid, peer=f'peer{idx // 2}', track=f'track{idx}', ssrc=ssrc, rtxSsrc=ssrc + 1,
+                                 cname=f'cname{idx // 2}') for line in template)
+    return '\r\n'.join(lines) + '\r\n'
@@ -1,7 +1,11 @@
 from .api.mediasoup_client import MediasoupClient
+from .api.mediasoup_client_host import MediasoupClientHost
+from .api.mediasoup_client_supervisor import MediasoupClientSupervisor
 from .api.mediasoup_signaler import MediasoupSignalerInterface
+from .api.signaling_codec import SignalingCodec
 from .api.notification_listener import BandwidthNotificationListener, PeerNotificationListener, \
     ProducerNotificationListener, ConsumerNotificationListener, DataConsumerNotificationListener
 from .api.request_listener import ConsumerRequestListener, DataConsumerRequestListener
 from .device import Device
 from .handlers.aiortc_handler import AiortcHandler
+from .handlers.native_capabilities_cache import nativeCapabilitiesCache
@@ -0,0 +1,84 @@
+from typing import Dict, Iterator, List, Optional
+
+from smcdk.consumer import Consumer
+
+
+class ConsumerEntry:
+    __slots__ = ('consumerId', 'peerId', 'producerId', 'kind', 'consumer', 'recorder')
+
+    def __init__(self, consumerId: str, peerId: str, producerId: str, kind: str, recorder):
+        self.consumerId: str = consumerId
+        self.peerId: str = peerId
+        self.producerId: str = producerId
+        self.kind: str = kind
+        # set once the transport has created it
+        self.consumer: Optional[Consumer] = None
+        self.recorder = recorder
+
+
+class ConsumerRegistry:
+    """
+    the consumers of a MultimediaRuntime and their recorders, indexed by consumerId,
+    with reverse indexes by the peerId and producerId they consume, so that a closed consumer or peer
+    is released in O(1) per consumer
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, ConsumerEntry] = {}
+        # peerId -> {consumerId: entry}
+        self._peerIndex: Dict[str, Dict[str, ConsumerEntry]] = {}
+        # producerId -> {consumerId: entry}
+        self._producerIndex: Dict[str, Dict[str, ConsumerEntry]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, consumerId: str) -> bool:
+        return consumerId in self._entries
+
+    def __iter__(self) -> Iterator[ConsumerEntry]:
+        return iter(list(self._entries.values()))
+
+    def add(self, consumerId: str, peerId: str, producerId: str, kind: str, recorder) -> ConsumerEntry:
+        """
+        a consumer added again replaces the previous entry, which the caller has to release
+        """
+        self.remove(consumerId)
+        entry = ConsumerEntry(consumerId, peerId, producerId, kind, recorder)
+        self._entries[consumerId] = entry
+        self._peerIndex.setdefault(peerId, {})[consumerId] = entry
+        self._producerIndex.setdefault(producerId, {})[consumerId] = entry
+        return entry
+
+    def get(self, consumerId: str) -> Optional[ConsumerEntry]:
+        return self._entries.get(consumerId)
+
+    def getByPeerId(self, peerId: str) -> List[ConsumerEntry]:
+        return list(self._peerIndex.get(peerId, {}).values())
+
+    def getByProducerId(self, producerId: str) -> List[ConsumerEntry]:
+        return list(self._producerIndex.get(producerId, {}).values())
+
+    def remove(self, consumerId: str) -> Optional[ConsumerEntry]:
+        entry = self._entries.pop(consumerId, None)
+        if entry is None:
+            return None
+        for index, key in ((self._peerIndex, entry.peerId), (self._producerIndex, entry.producerId)):
+            entries = index[key]
+            del entries[consumerId]
+            if not entries:
+                del index[key]
+        return entry
+
+    def removeByPeerId(self, peerId: str) -> List[ConsumerEntry]:
+        return [self.remove(entry.consumerId) for entry in self.getByPeerId(peerId)]
+
+    def clear(self) -> List[ConsumerEntry]:
+        entries = list(self._entries.values())
+        self._entries.clear()
+        self._peerIndex.clear()
+        self._producerIndex.clear()
+        return entries
+
+    def stats(self) -> dict:
+        return {'consumers': len(self._entries), 'peers': len(self._peerIndex), 'producers': len(self._producerIndex)}
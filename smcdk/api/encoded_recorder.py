@@ -0,0 +1,322 @@
+import fractions
+import queue
+import struct
+import time
+from abc import ABCMeta, abstractmethod
+from typing import Callable, Optional
+
+import av
+from aiortc import RTCRtpReceiver
+from aiortc.jitterbuffer import JitterFrame
+from aiortc.rtcrtpparameters import RTCRtpCodecParameters
+from aiortc.rtp import RtpPacket
+
+from smcdk.deps.sdp_transform import sdp_transform
+from smcdk.log import Logger
+from .segmented_recording import RecordSegmenter
+
+# logger of module level
+logger = Logger.getLogger(__name__)
+
+# mimeType -> (codec of the container stream, container format) of the encoded frames recorded as they are
+CONTAINER_CODECS = {
+    'video/vp8': ('vp8', 'webm'),
+    'video/h264': ('h264', 'matroska'),
+    'audio/opus': ('opus', 'ogg'),
+    'audio/pcmu': ('pcm_mulaw', 'wav'),
+    'audio/pcma': ('pcm_alaw', 'wav')
+}
+# container format -> file suffix
+CONTAINER_SUFFIXES = {'webm': 'webm', 'matroska': 'mkv', 'ogg': 'ogg', 'wav': 'wav'}
+# RTP timestamps are 32-bit, they wrap around
+RTP_TIMESTAMP_MODULO = 1 << 32
+
+
+class _EncodedFrameTap:
+    """
+    stands in for the decoder queue of an RTCRtpReceiver: the encoded frames go to the sink
+    while the decoder thread only receives the end of the stream, so nothing is ever decoded
+    """
+
+    def __init__(self, decoderQueue: queue.Queue, sink: Callable[[RTCRtpCodecParameters, JitterFrame], None]):
+        self._decoderQueue = decoderQueue
+        self._sink = sink
+
+    def put(self, item):
+        if item is None:
+            self._decoderQueue.put(None)
+        else:
+            self._sink(*item)
+
+    def get(self):
+        return self._decoderQueue.get()
+
+
+def tapEncodedFrames(receiver: RTCRtpReceiver, sink: Callable[[RTCRtpCodecParameters, JitterFrame], None]):
+    """
+    divert the encoded frames re-assembled by the receiver to the sink instead of decoding them,
+    the receiver's track then only ends, before or after the receiver has started alike
+
+    :param sink: function(codec, encoded frame) called on the event loop
+    """
+    # aiortc has no public api for the encoded frames, see RTCRtpReceiver._handle_rtp_packet(checked against 1.15)
+    attribute = '_RTCRtpReceiver__decoder_queue'
+    decoderQueue = getattr(receiver, attribute, None)
+    if decoderQueue is None:
+        raise Exception('the decoder queue of RTCRtpReceiver is not available in this version of aiortc')
+    if isinstance(decoderQueue, _EncodedFrameTap):
+        decoderQueue = decoderQueue._decoderQueue
+    setattr(receiver, attribute, _EncodedFrameTap(decoderQueue, sink))
+
+
+class EncodedRecorder(metaclass=ABCMeta):
+    """
+    records what a consumer's RTCRtpReceiver receives without decoding it, unlike MediaRecorder
+    """
+
+    def __init__(self):
+        self.framesWritten: int = 0
+        self.bytesWritten: int = 0
+        self._started: bool = False
+        self._stopped: bool = False
+
+    @abstractmethod
+    def addReceiver(self, receiver: RTCRtpReceiver):
+        pass
+
+    async def start(self):
+        self._started = True
+
+    async def stop(self):
+        self._stopped = True
+
+
+class EncodedFrameRecorder(EncodedRecorder):
+    """
+    writes the encoded frames(VP8, H264, Opus, PCMU or PCMA) of a receiver straight into a container,
+    the video is written from its first key frame on, and rotated into a new segment on a key frame
+    """
+
+    def __init__(self, file: str, mimeType: str, format: str = None, segmenter: RecordSegmenter = None):
+        """
+        :param mimeType: mimeType of the consumer's codec
+        :param format: container format, default depends on the codec, see CONTAINER_CODECS
+        :param segmenter: splits the recording into segments instead of writing file
+        """
+        super().__init__()
+        codecAndFormat = CONTAINER_CODECS.get(mimeType.lower())
+        if codecAndFormat is None:
+            raise Exception(f'{mimeType} can not be recorded without decoding, '
+                            f'supported codecs: {", ".join(CONTAINER_CODECS)}')
+        self._file = file
+        self._kind = mimeType.split('/')[0].lower()
+        self._codecName, defaultFormat = codecAndFormat
+        self._format: str = format or defaultFormat
+        self._segmenter: Optional[RecordSegmenter] = segmenter
+        self._container: Optional[av.container.OutputContainer] = None
+        self._stream = None
+        self._timeBase: Optional[fractions.Fraction] = None
+        # the RTP timestamp of the last frame, unwrapped into a counter which does not wrap around
+        self._lastTimestamp: Optional[int] = None
+        # the unwrapped timestamp of the first frame written into the current file or segment, its pts 0
+        self._firstTimestamp: Optional[int] = None
+        self._lastPts: int = -1
+        self._waitingKeyFrame: bool = self._kind == 'video'
+        self.framesSkipped: int = 0
+
+    def addReceiver(self, receiver: RTCRtpReceiver):
+        tapEncodedFrames(receiver, self._writeFrame)
+
+    async def start(self):
+        await super().start()
+        self._openContainer()
+
+    async def stop(self):
+        await super().stop()
+        if self._container is not None:
+            self._container.close()
+            self._container = None
+            if self._segmenter is not None:
+                await self._segmenter.close()
+
+    def _openContainer(self):
+        file = self._segmenter.openSegment() if self._segmenter is not None else self._file
+        self._container = av.open(file, mode='w', format=self._format)
+        self._stream = None
+        self._firstTimestamp = None
+        self._lastPts = -1
+
+    def _unwrapTimestamp(self, timestamp: int) -> int:
+        """
+        :param timestamp: 32-bit RTP timestamp of a frame
+        :return: the timestamp counted on from the previous frame's across the wrap arounds, reordered frames included
+        """
+        if self._lastTimestamp is not None:
+            delta = (timestamp - self._lastTimestamp + RTP_TIMESTAMP_MODULO // 2) % RTP_TIMESTAMP_MODULO \
+                - RTP_TIMESTAMP_MODULO // 2
+            timestamp = self._lastTimestamp + delta
+        self._lastTimestamp = timestamp
+        return timestamp
+
+    def _isKeyFrame(self, data: bytes) -> bool:
+        if self._codecName == 'vp8':
+            return len(data) > 0 and not data[0] & 0x01
+        if self._codecName == 'h264':
+            # an IDR picture or its parameter sets, among the Annex B NAL units
+            idx = data.find(b'\x00\x00\x01')
+            while 0 <= idx < len(data) - 3:
+                if data[idx + 3] & 0x1f in (5, 7):
+                    return True
+                idx = data.find(b'\x00\x00\x01', idx + 3)
+            return False
+        return True
+
+    def _writeFrame(self, codec: RTCRtpCodecParameters, frame: JitterFrame):
+        if not self._started or self._stopped or self._container is None:
+            return
+        timestamp = self._unwrapTimestamp(frame.timestamp)
+        isKeyFrame = self._isKeyFrame(frame.data)
+        if self._waitingKeyFrame and not isKeyFrame:
+            self.framesSkipped += 1
+            return
+        self._waitingKeyFrame = False
+        try:
+            if isKeyFrame and self._segmenter is not None and self._segmenter.shouldRotate():
+                self._container.close()
+                self._openContainer()
+            if self._stream is None:
+                if self._kind == 'video':
+                    self._stream = self._container.add_stream(self._codecName)
+                else:
+                    self._stream = self._container.add_stream(self._codecName, rate=codec.clockRate)
+                    self._stream.layout = 'stereo' if (codec.channels or 1) > 1 else 'mono'
+                self._stream.time_base = fractions.Fraction(1, codec.clockRate)
+                # the time base of the pts, the muxer replaces the stream's with the container's once started
+                self._timeBase = self._stream.time_base
+            # every file or segment starts at 0, whatever the random offset of the RTP timestamps
+            if self._firstTimestamp is None:
+                self._firstTimestamp = timestamp
+            # the muxers need strictly increasing timestamps
+            pts = max(timestamp - self._firstTimestamp, self._lastPts + 1)
+            self._lastPts = pts
+            packet = av.Packet(frame.data)
+            packet.stream = self._stream
+            packet.pts = packet.dts = pts
+            packet.time_base = self._timeBase
+            packet.is_keyframe = isKeyFrame
+            self._container.mux(packet)
+        except Exception as error:
+            logger.error('failed to record into %s, stop recording: %r', self._file, error)
+            self._stopped = True
+            return
+        self.framesWritten += 1
+        self.bytesWritten += len(frame.data)
+
+
+class RtpDumpRecorder(EncodedRecorder):
+    """
+    dumps the RTP packets of a receiver, as received, into an rtpdump file(rtptools' rtpplay format),
+    along with an SDP sidecar describing them, e.g. to replay them to ffmpeg or to load them in wireshark
+    the packets are still re-assembled by the receiver, for its NACK and PLI feedback, but never decoded,
+    each segment of a segmented dump is a standalone rtpdump file
+    """
+    # the address in the rtpdump header and the SDP sidecar, where the packets may be replayed to
+    REPLAY_ADDRESS = ('127.0.0.1', 5004)
+
+    def __init__(self, file: str, kind: str, rtpParameters: dict, sdpFile: str = None,
+                 segmenter: RecordSegmenter = None):
+        """
+        :param rtpParameters: rtpParameters of the consumer, for the SDP sidecar
+        :param sdpFile: path of the SDP sidecar, default is file with a .sdp suffix
+        :param segmenter: splits the dump into segments instead of writing file
+        """
+        super().__init__()
+        self._file = file
+        self._sdpFile = sdpFile or f'{file.rsplit(".", 1)[0]}.sdp'
+        self._kind = kind
+        self._rtpParameters = rtpParameters
+        self._segmenter: Optional[RecordSegmenter] = segmenter
+        self._output = None
+        self._startTime: float = 0
+
+    def addReceiver(self, receiver: RTCRtpReceiver):
+        # RTCDtlsTransport hands the packets to this private method of the receiver(checked against aiortc 1.15)
+        handleRtpPacket = receiver._handle_rtp_packet
+
+        async def dumpAndHandleRtpPacket(packet: RtpPacket, arrival_time_ms: int):
+            self._writePacket(packet)
+            await handleRtpPacket(packet, arrival_time_ms=arrival_time_ms)
+
+        receiver._handle_rtp_packet = dumpAndHandleRtpPacket
+        tapEncodedFrames(receiver, lambda codec, frame: None)
+
+    async def start(self):
+        await super().start()
+        with open(self._sdpFile, 'w', encoding='utf-8') as sdpFile:
+            sdpFile.write(self.generateSdp())
+        self._openOutput()
+
+    async def stop(self):
+        await super().stop()
+        if self._output is not None:
+            self._output.close()
+            self._output = None
+            if self._segmenter is not None:
+                await self._segmenter.close()
+
+    def _openOutput(self):
+        self._output = self._segmenter.openSegment() if self._segmenter is not None else open(self._file, 'wb')
+        self._startTime = time.time()
+        address, port = RtpDumpRecorder.REPLAY_ADDRESS
+        self._output.write(f'#!rtpplay1.0 {address}/{port}\n'.encode('ascii'))
+        seconds = int(self._startTime)
+        self._output.write(struct.pack('!IIIHH', seconds, int((self._startTime - seconds) * 1e6), 0, 0, 0))
+
+    def generateSdp(self) -> str:
+        address, port = RtpDumpRecorder.REPLAY_ADDRESS
+        codecs = self._rtpParameters.get('codecs', [])
+        media = {
+            'type': self._kind,
+            'port': port,
+            'protocol': 'RTP/AVP',
+            'payloads': ' '.join(str(codec['payloadType']) for codec in codecs),
+            'rtp': [],
+            'fmtp': [],
+            'direction': 'recvonly'
+        }
+        for codec in codecs:
+            rtp = {'payload': codec['payloadType'], 'codec': codec['mimeType'].split('/')[1],
+                   'rate': codec['clockRate']}
+            if codec.get('channels', 1) > 1:
+                rtp['encoding'] = codec['channels']
+            media['rtp'].append(rtp)
+            if codec.get('parameters'):
+                media['fmtp'].append({'payload': codec['payloadType'], 'config': ';'.join(
+                    f'{key}={value}' for key, value in codec['parameters'].items())})
+        return sdp_transform.write({
+            'version': 0,
+            'origin': {'username': '-', 'sessionId': 0, 'sessionVersion': 0, 'netType': 'IN', 'ipVer': 4,
+                       'address': address},
+            'name': 'smcdk recording',
+            'connection': {'version': 4, 'ip': address},
+            'timing': {'start': 0, 'stop': 0},
+            'media': [media]
+        })
+
+    def _writePacket(self, packet: RtpPacket):
+        if not self._started or self._stopped or self._output is None:
+            return
+        try:
+            if self._segmenter is not None and self._segmenter.shouldRotate():
+                self._output.close()
+                self._openOutput()
+            data = packet.serialize()
+            offsetMs = int((time.time() - self._startTime) * 1000)
+            self._output.write(struct.pack('!HHI', len(data) + 8, len(data), offsetMs))
+            self._output.write(data)
+        except Exception as error:
+            logger.error('failed to record into %s, stop recording: %r', self._file, error)
+            self._stopped = True
+            return
+        self.framesWritten += 1
+        self.bytesWritten += len(data)
@@ -0,0 +1,115 @@
+from typing import Dict, List, Optional
+
+from aiortc import MediaStreamTrack
+from aiortc.contrib.media import MediaPlayer, MediaRelay
+
+from smcdk.log import Logger
+
+# logger of module level
+logger = Logger.getLogger(__name__)
+
+
+class _MediaSource:
+    __slots__ = ('mediaFilePath', 'player', 'relay', 'refCount', 'numSubscriptions')
+
+    def __init__(self, mediaFilePath: str, player: MediaPlayer):
+        self.mediaFilePath = mediaFilePath
+        self.player = player
+        self.relay = MediaRelay()
+        # live proxy tracks handed out to the subscribers
+        self.refCount: int = 0
+        self.numSubscriptions: int = 0
+
+    @property
+    def sourceTracks(self) -> List[MediaStreamTrack]:
+        return [track for track in (self.player.audio, self.player.video) if track is not None]
+
+
+class MediaSourceSubscription:
+    """
+    the relayed audio and video tracks(or None) of a shared media source, as returned by MediaPlayer
+    """
+
+    def __init__(self, audio: Optional[MediaStreamTrack], video: Optional[MediaStreamTrack]):
+        self.audio = audio
+        self.video = video
+
+    def close(self):
+        """
+        stop the relayed tracks, the source closes once no subscriber has a live track of it
+        """
+        for track in (self.audio, self.video):
+            if track is not None:
+                track.stop()
+
+
+class MediaSourceRegistry:
+    """
+    process-wide registry of the decoded media sources keyed by media file path:
+    each file is demuxed and decoded once, by a single MediaPlayer, and its frames are relayed to every
+    subscribing producer track, the player is stopped when the last relayed track ends
+    all the subscribers of a source must run on the same event loop
+    """
+
+    def __init__(self, buffered: bool = True):
+        """
+        :param buffered: whether each relayed track queues the frames it has not received yet,
+            else it only keeps the latest one
+        """
+        self._buffered: bool = buffered
+        self._sources: Dict[str, _MediaSource] = {}
+
+    def acquire(self, mediaFilePath: str) -> MediaSourceSubscription:
+        """
+        a player factory for MultimediaRuntime.setPlayerFactory()
+
+        :return: new relayed tracks of the source, to be stopped(or closed by MediaSourceSubscription.close())
+            when no more needed
+        """
+        source = self._sources.get(mediaFilePath)
+        if source is None:
+            source = self._sources[mediaFilePath] = _MediaSource(mediaFilePath, MediaPlayer(mediaFilePath))
+            logger.debug('open media source %s', mediaFilePath)
+        source.numSubscriptions += 1
+        subscription = MediaSourceSubscription(audio=self._subscribe(source, source.player.audio),
+                                               video=self._subscribe(source, source.player.video))
+        if source.refCount == 0:
+            # neither audio nor video, nothing will ever release it
+            del self._sources[mediaFilePath]
+        return subscription
+
+    def _subscribe(self, source: _MediaSource, track: Optional[MediaStreamTrack]) -> Optional[MediaStreamTrack]:
+        if track is None:
+            return None
+        proxy = source.relay.subscribe(track, buffered=self._buffered)
+        source.refCount += 1
+        proxy.once('ended', lambda: self._release(source))
+        return proxy
+
+    def _release(self, source: _MediaSource):
+        source.refCount -= 1
+        if source.refCount > 0:
+            return
+        if self._sources.get(source.mediaFilePath) is source:
+            del self._sources[source.mediaFilePath]
+        logger.debug('close media source %s', source.mediaFilePath)
+        # stopping the player's tracks ends its decoding thread and the relay's reading task
+        for track in source.sourceTracks:
+            track.stop()
+
+    def __contains__(self, mediaFilePath: str) -> bool:
+        return mediaFilePath in self._sources
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def stats(self) -> dict:
+        """
+        :return: {mediaFilePath: {'refCount': live relayed tracks, 'subscriptions': total subscriptions}}
+        """
+        return {mediaFilePath: {'refCount': source.refCount, 'subscriptions': source.numSubscriptions}
+                for mediaFilePath, source in self._sources.items()}
+
+
+# The process-wide registry shared by every MultimediaRuntime and MediasoupClientHost.
+mediaSourceRegistry = MediaSourceRegistry()
@@ -1,13 +1,20 @@
 import asyncio
 import logging
-
-from smcdk.api.mediasoup_signaler import MediasoupSignalerInterface, ProtooSignaler, MessageType, Request
+import time
+from collections import deque
+from typing import Optional
+
+from smcdk.api.media_source_registry import mediaSourceRegistry
+from smcdk.api.mediasoup_signaler import MediasoupSignalerInterface, ProtooSignaler, MessageType, Request, \
+    Notification
+from smcdk.api.message_router import MessageRouter
 from smcdk.api.multimedia_runtime import MultimediaRuntime
 from smcdk.api.notification_listener import BandwidthNotificationListener, PeerNotificationListener, \
     ProducerNotificationListener, ConsumerNotificationListener, DataConsumerNotificationListener
 from smcdk.api.request_listener import ConsumerRequestListener, DataConsumerRequestListener
 from smcdk.api.room_peer import Room, Peer, PeerAppData
 from smcdk.log import Logger
+from smcdk.rtp_structs import modelDict
 
 # logger of module level
 logger = Logger.getLogger(__name__)
@@ -56,6 +63,23 @@ class MediasoupClient:
         '''
         self._loop = None
         self._loopTasks = []
+        # seconds spent by each phase of the last joinRoom
+        self._joinTimings: dict = {}
+        # set once the last joinRoom has joined, created on the running loop
+        self._joinedEvent: Optional[asyncio.Event] = None
+        # newConsumer requests arriving within this window(in seconds) are consumed in a single negotiation
+        self._consumeBatchWindow: float = 0.02
+        self._consumeBatchMaxSize: int = 50
+        # releasing the consumers closed by the server
+        self._releaseTasks: set = set()
+        # negotiate the newConsumer and newDataConsumer requests in tasks, not in the server event loop
+        self._negotiateInBackground: bool = False
+        # negotiating newConsumer and newDataConsumer requests handed off by the server event loop
+        self._negotiationTasks: set = set()
+        # <(notification message, negotiation tasks it waits for)>, in arrival order
+        self._heldNotifications: deque = deque()
+        # dispatching the held notifications whose negotiations are done
+        self._flushTask: Optional[asyncio.Task] = None
         '''
         request listeners
         '''
@@ -98,6 +122,25 @@ class MediasoupClient:
         self._notificationListeners = [self._bandwidthNotificationListener, self._peerNotificationListener,
                                        self._producerNotificationListener, self._consumerNotificationListener,
                                        self._dataConsumerNotificationListener]
+        '''
+        message routing tables
+        '''
+        self._messageRouter: MessageRouter = MessageRouter(responseHandler=self._signaler.setResponse)
+        self._messageRouter.addRequestRoute(MessageType.SERVER_REQURST_newConsumer.value, self._routeNewConsumer)
+        self._messageRouter.addRequestRoute(MessageType.SERVER_REQURST_newDataConsumer.value,
+                                            self._routeNewDataConsumer)
+        # the closed consumers are released first, whichever handler the notification is routed to
+        self._releaseRoutes = {
+            MessageType.SERVER_NOTIFICATION_consumerClosed.value:
+                lambda message: self._multimediaRuntime.closeConsumer(message['data']['consumerId']),
+            MessageType.SERVER_NOTIFICATION_dataConsumerClosed.value:
+                lambda message: self._multimediaRuntime.closeDataConsumer(message['data']['dataConsumerId']),
+            MessageType.SERVER_NOTIFICATION_peerClosed.value:
+                lambda message: self._multimediaRuntime.closePeerConsumers(message['data']['peerId'])
+        }
+        for notificationListener in self._notificationListeners:
+            for method in notificationListener.METHODS:
+                self._addNotificationRoute(method, notificationListener.enqueueNowait)
 
     # async def joinSingleRoom(self, roomAddressInfo: dict, peerInfo: dict,
     #                          producerConfig: dict,
@@ -120,6 +163,10 @@ class MediasoupClient:
                     to check if ssl verification is needed before establish connection to server,
                     the default value is True, that means ssl verification is needed
                 'roomId': 'the room's id, required',
+                'pipelinedJoin':
+                    bool, issue the independent signaling requests of joining concurrently,
+                    createWebRtcTransport of both directions together, and join as soon as recvTransport exists,
+                    default is True
             }
         :param peerInfo:
             {
@@ -140,16 +187,62 @@ class MediasoupClient:
             {
                 'autoProduce': bool, default is True
                 'mediaFilePath': str, the full path of media file, required
+                'shareMediaSource':
+                    bool, decode the media file once for every client of the process playing it,
+                    see media_source_registry, default is False
+                'passthrough':
+                    bool, send the encoded packets of the media file(VP8, H264, Opus, PCMA or PCMU) as they are,
+                    without decoding and re-encoding them, its codecs must be supported by the router,
+                    default is False
             }
         :param consumerConfig:
             {
                 'autoConsume': bool, default is True
                 'recordDirectoryPath': str, the root path of to-record media files, required
+                'consumeBatchWindow':
+                    float, seconds to wait for further newConsumer requests, so that they are all consumed
+                    within a single SDP negotiation, 0 means no batching, default is 0.02
+                'consumeBatchMaxSize': int, the max number of newConsumer requests per batch, default is 50
+                'negotiateInBackground':
+                    bool, hand the newConsumer and newDataConsumer requests off to tasks, so that the server event
+                    loop keeps reading messages while they are negotiated, the handler merges the queued ones into
+                    a single SDP negotiation, the notifications received meanwhile are dispatched once the
+                    negotiations before them are done, default is False
+                'recordMode':
+                    str, or dict of kind('audio' or 'video') -> str, how the consumers are recorded,
+                    'transcode': decoded and encoded again into .mp3/.mp4 files,
+                    'container': the received encoded frames written as they are into .webm/.mkv/.ogg/.wav files,
+                    'rtp': the received RTP packets dumped into .rtp files(rtpdump) with .sdp sidecars,
+                    default is 'transcode'
+                'recordingPool':
+                    'thread', 'process' or a RecordingPool, encode and write the transcoded recordings on
+                    the process-wide pool of the mode or on the given one instead of the event loop,
+                    default is None, on the event loop
+                'recordQueueSize': int, the max frames queued per recording for the recording pool, default is 30
+                'recordDropPolicy':
+                    'drop-oldest' or 'drop-newest', which frame is dropped when the queue of a recording is full,
+                    default is 'drop-oldest'
+                'recordFilePathGenerator':
+                    function(mePeer, consumerId, producePeer, producerId, kind) returning
+                    (directory relative to recordDirectoryPath, file name, suffix) of a consumer's recording,
+                    the suffix only applies to the 'transcode' mode,
+                    default is (roomId, 'displayName(peerId)_kind(consumerId)', 'mp3' or 'mp4')
+                'recordSegmentDuration':
+                    float, split each recording into segments of that many seconds, e.g. name.00000.mp4,
+                    name.00001.mp4..., listed by name.manifest.json, see RecordSegmenter, default is None, no split
+                'recordSegmentSize':
+                    int, split each recording into segments of about that many bytes, default is None, no split,
+                    the segments are written through buffered files, flushed within the process-wide cap of
+                    open files segmented_recording.recordFileLimiter.maxOpenFiles, 64 by default
             }
         :return: None
         """
         logger.info('peer(id=%s, displayName=%s) join room(id=%s)', peerInfo['peerId'], peerInfo['displayName'],
                     roomAddressInfo['roomId'])
+        if self._joinedEvent is None:
+            self._joinedEvent = asyncio.Event()
+        else:
+            self._joinedEvent.clear()
 
         '''
         stuff room and peer part
@@ -174,30 +267,50 @@ class MediasoupClient:
             autoConsume=consumerConfig.get('autoConsume', True),
             recordDirectoryPath=consumerConfig.get(
                 'recordDirectoryPath'),
-            recordFilePathGenerator=consumerConfig.get('recordFilePathGenerator')
+            recordFilePathGenerator=consumerConfig.get('recordFilePathGenerator'),
+            passthrough=producerConfig.get('passthrough', False),
+            recordMode=consumerConfig.get('recordMode', 'transcode'),
+            recordingPool=consumerConfig.get('recordingPool'),
+            recordQueueSize=consumerConfig.get('recordQueueSize', 30),
+            recordDropPolicy=consumerConfig.get('recordDropPolicy', 'drop-oldest'),
+            recordSegmentDuration=consumerConfig.get('recordSegmentDuration'),
+            recordSegmentSize=consumerConfig.get('recordSegmentSize')
         )
+        if producerConfig.get('shareMediaSource', False):
+            self._multimediaRuntime.setPlayerFactory(mediaSourceRegistry.acquire)
+        self._consumeBatchWindow = consumerConfig.get('consumeBatchWindow', 0.02)
+        self._consumeBatchMaxSize = consumerConfig.get('consumeBatchMaxSize', 50)
+        self._negotiateInBackground = consumerConfig.get('negotiateInBackground', False)
         '''
         create connection to server by signaler
         '''
         self._loop = asyncio.get_running_loop()
+        self._joinTimings = {}
+        joinStartTime = time.perf_counter()
         logger.info('connectToRoom, serverAddress=%s, roomId=%s, peerId=%s', self._room.serverAddress,
                     self._room.roomId,
                     self._mePeer.peerId)
-        await self._signaler.connectToRoom(self._loop, self._room.serverAddress, self._room.roomId, self._mePeer.peerId,
-                                           roomAddressInfo['enableSslVerification'])
+        await self._timeJoinPhase('connectToRoom', self._signaler.connectToRoom(
+            self._loop, self._room.serverAddress, self._room.roomId, self._mePeer.peerId,
+            roomAddressInfo['enableSslVerification']))
         '''
         create loop tasks
         '''
         bandwidthNotificationLoop = self._loop.create_task(
-            self._bandwidthNotificationListener.runLoop(asyncio.Queue()), name='BandwidthNotificationListener')
+            self._bandwidthNotificationListener.runLoop(self._bandwidthNotificationListener.newQueue()),
+            name='BandwidthNotificationListener')
         peerNotificationLoop = self._loop.create_task(
-            self._peerNotificationListener.runLoop(asyncio.Queue()), name='PeerNotificationListener')
+            self._peerNotificationListener.runLoop(self._peerNotificationListener.newQueue()),
+            name='PeerNotificationListener')
         producerNotificationLoop = self._loop.create_task(
-            self._producerNotificationListener.runLoop(asyncio.Queue()), name='ProducerNotificationListener')
+            self._producerNotificationListener.runLoop(self._producerNotificationListener.newQueue()),
+            name='ProducerNotificationListener')
         consumerNotificationLoop = self._loop.create_task(
-            self._consumerNotificationListener.runLoop(asyncio.Queue()), name='ConsumerNotificationListener')
+            self._consumerNotificationListener.runLoop(self._consumerNotificationListener.newQueue()),
+            name='ConsumerNotificationListener')
         dataConsumerNotificationLoop = self._loop.create_task(
-            self._dataConsumerNotificationListener.runLoop(asyncio.Queue()), name='DataConsumerNotificationListener')
+            self._dataConsumerNotificationListener.runLoop(self._dataConsumerNotificationListener.newQueue()),
+            name='DataConsumerNotificationListener')
         severEventLoop = self._loop.create_task(self._serverEventLoop(), name='ServerEventListener')
         self._loopTasks = [severEventLoop, bandwidthNotificationLoop, peerNotificationLoop, producerNotificationLoop,
                            consumerNotificationLoop, dataConsumerNotificationLoop]
@@ -205,22 +318,43 @@ class MediasoupClient:
         load device
         signaling: getRouterRtpCapabilities
         '''
-        await self._loadDeviceByRouterRtpCapabilities()
+        await self._timeJoinPhase('loadDevice', self._loadDeviceByRouterRtpCapabilities())
         if not (self._multimediaRuntime.canProduce or self._multimediaRuntime.canConsume):
             return
-        '''
-        create sendTransport & recvTransport
-        signaling: createWebRtcTransport, twice for both direction
-        '''
-        if self._multimediaRuntime.canProduce:
-            await self._createSendTransport()
-        if self._multimediaRuntime.canConsume:
-            await self._createRecvTransport()
-        '''
-        formally join
-        signaling: join
-        '''
-        await self._joinFormally()
+        if roomAddressInfo.get('pipelinedJoin', True):
+            '''
+            create sendTransport & recvTransport concurrently, then formally join once recvTransport exists,
+            since the server creates consumers for the existing producers on join
+            signaling: createWebRtcTransport, twice for both direction, and join
+            '''
+            async def createRecvTransportAndJoin():
+                if self._multimediaRuntime.canConsume:
+                    await self._timeJoinPhase('createRecvTransport', self._createRecvTransport())
+                await self._timeJoinPhase('join', self._joinFormally())
+
+            joinCoroutines = [createRecvTransportAndJoin()]
+            if self._multimediaRuntime.canProduce:
+                joinCoroutines.append(self._timeJoinPhase('createSendTransport', self._createSendTransport()))
+            await asyncio.gather(*joinCoroutines)
+        else:
+            '''
+            create sendTransport & recvTransport
+            signaling: createWebRtcTransport, twice for both direction
+            '''
+            if self._multimediaRuntime.canProduce:
+                await self._timeJoinPhase('createSendTransport', self._createSendTransport())
+            if self._multimediaRuntime.canConsume:
+                await self._timeJoinPhase('createRecvTransport', self._createRecvTransport())
+            '''
+            formally join
+            signaling: join
+            '''
+            await self._timeJoinPhase('join', self._joinFormally())
+        self._joinTimings['total'] = time.perf_counter() - joinStartTime
+        self._joinedEvent.set()
+        logger.info('joined room(id=%s) in %.1f ms, phases: %s', self._room.roomId,
+                    self._joinTimings['total'] * 1000,
+                    ', '.join(f'{phase}={elapsed * 1000:.1f}ms' for phase, elapsed in self._joinTimings.items()))
         '''
         produce(push media stream to the server) automatically if needed 
         '''
@@ -236,6 +370,113 @@ class MediasoupClient:
         await asyncio.gather(severEventLoop, bandwidthNotificationLoop, peerNotificationLoop, producerNotificationLoop,
                              consumerNotificationLoop, dataConsumerNotificationLoop, return_exceptions=True)
 
+    @property
+    def joinTimings(self) -> dict:
+        """
+        seconds spent by each phase of the last joinRoom: connectToRoom, loadDevice, createSendTransport,
+        createRecvTransport, join and total, phases overlap in pipelined join
+        """
+        return dict(self._joinTimings)
+
+    @property
+    def room(self) -> Room:
+        return self._room
+
+    @property
+    def multimediaRuntime(self) -> MultimediaRuntime:
+        return self._multimediaRuntime
+
+    @property
+    def loopTasks(self) -> list:
+        """
+        the long-lived tasks of the current room: server event loop and notification listener loops
+        """
+        return list(self._loopTasks)
+
+    async def waitJoined(self):
+        """
+        wait until the pending joinRoom has joined the room, i.e. before it starts producing
+        """
+        if self._joinedEvent is None:
+            self._joinedEvent = asyncio.Event()
+        await self._joinedEvent.wait()
+
+    def registerRequestHandler(self, method: str, handler):
+        """
+        handle the server requests of the given protoo method, replacing the built-in handling if any
+
+        :param handler: async function(request: Request), awaited by the server event loop before the next message,
+            it responds to the request through the signaler
+        """
+
+        async def route(message: dict):
+            await handler(Request(message['id'], message['method'], message['data']))
+
+        self._messageRouter.addRequestRoute(method, route)
+
+    def registerNotificationHandler(self, method: str, handler):
+        """
+        handle the server notifications of the given protoo method, replacing the built-in listener if any
+
+        :param handler: function(notification: Notification), called by the server event loop, must not block
+        """
+        self._addNotificationRoute(
+            method, lambda message: handler(Notification(None, message['method'], message['data'])))
+
+    def _addNotificationRoute(self, method: str, handler):
+        releaseRoute = self._releaseRoutes.get(method)
+        if releaseRoute is None:
+            self._messageRouter.addNotificationRoute(method, handler)
+            return
+
+        def releaseAndRoute(message: dict):
+            task = asyncio.ensure_future(releaseRoute(message))
+            self._releaseTasks.add(task)
+            task.add_done_callback(self._releaseTasks.discard)
+            return handler(message)
+
+        self._messageRouter.addNotificationRoute(method, releaseAndRoute)
+
+    async def waitReleased(self):
+        """
+        wait until the consumers, dataConsumers and peers closed by the server so far are released,
+        and the requests negotiating in background are done
+        """
+        while self._releaseTasks or self._negotiationTasks or self._flushTask is not None:
+            await asyncio.gather(*self._releaseTasks, *self._negotiationTasks,
+                                 *([self._flushTask] if self._flushTask is not None else []), return_exceptions=True)
+
+    def dispatchStats(self) -> dict:
+        """
+        count and dispatch latency histogram of the received messages per type and method, see MessageRouter.stats()
+        """
+        return self._messageRouter.stats()
+
+    def notificationQueueStats(self) -> dict:
+        """
+        queueStats() of each notification listener, indexed by the listener's class name
+        """
+        return {type(listener).__name__: listener.queueStats() for listener in self._notificationListeners}
+
+    def negotiationStats(self) -> dict:
+        """
+        queue wait time and offer/answer duration of the send and recv handlers, see NegotiationQueue.stats()
+        """
+        return self._multimediaRuntime.negotiationStats()
+
+    def recorderStats(self) -> dict:
+        """
+        queue depth and frame counters of each recording on a recording pool, indexed by consumerId
+        """
+        return self._multimediaRuntime.recorderStats()
+
+    async def _timeJoinPhase(self, phase: str, coroutine):
+        startTime = time.perf_counter()
+        try:
+            return await coroutine
+        finally:
+            self._joinTimings[phase] = time.perf_counter() - startTime
+
     def play(self):
         if self._loop is not None:
             return self._loop.create_task(self._produce(), name='PlayerCoroutine')
@@ -256,6 +497,7 @@ class MediasoupClient:
             # for notificationListeners in self._notificationListeners:
             #     notificationListeners.resetQueue(asyncio.Queue)
 
+        await self.waitReleased()
         await self._multimediaRuntime.close(stopTaskFunc)
         self._room.serverAddress = None
         self._room.roomId = None
@@ -294,7 +536,7 @@ class MediasoupClient:
 
         async def onProduce(kind: str, rtpParameters, appData: dict):
             requestIdToProduce = await self._signaler.produce(self._multimediaRuntime.sendTransportId, kind,
-                                                              rtpParameters.dict(exclude_none=True), appData)
+                                                              modelDict(rtpParameters, exclude_none=True), appData)
             logger.info('signal request: produce, requestId=%s', requestIdToProduce)
             response_ = await self._signaler.getResponse(requestIdToProduce)
             return response_.data['id']
@@ -387,6 +629,52 @@ class MediasoupClient:
         await self._consumerRequestListener.onNewConsumer(self._signaler.responseToNewConsumer(requestId), message,
                                                           otherPeer)
 
+    async def _consumeMany(self, messages: list):
+        if len(messages) == 1:
+            await self._consume(messages[0])
+            return
+        if not self._multimediaRuntime.canConsume or not self._multimediaRuntime.autoConsume:
+            return
+        if self._multimediaRuntime.recvTransportId is None:
+            await self._createRecvTransport()
+        consumerInfos = [{
+            'consumerId': message.data['id'],
+            'producePeer': self._mePeer.room.getPeerByPeerId(message.data['peerId']),
+            'producerId': message.data['producerId'],
+            'kind': message.data['kind'],
+            'rtpParameters': message.data['rtpParameters']
+        } for message in messages]
+        await self._multimediaRuntime.consumeMany(self._mePeer, consumerInfos)
+        # respond in the same order as the requests arrived
+        for message in messages:
+            otherPeer = self._room.getPeerByPeerId(message.data['peerId'])
+            self._room.bindConsumerIdToPeer(message.data['id'], otherPeer)
+            await self._consumerRequestListener.onNewConsumer(
+                self._signaler.responseToNewConsumer(message.requestId), message, otherPeer)
+
+    async def _collectNewConsumerBatch(self, message: dict) -> tuple:
+        """
+        gather the newConsumer requests following the given one within the batch window
+
+        :return: (list of newConsumer Request, task receiving the next message or None)
+        """
+        batch = [Request(message['id'], message['method'], message['data'])]
+        if self._consumeBatchWindow <= 0:
+            return batch, None
+        while len(batch) < self._consumeBatchMaxSize:
+            receiveTask = self._loop.create_task(self._signaler.receiveMessage())
+            done, _ = await asyncio.wait({receiveTask}, timeout=self._consumeBatchWindow)
+            if not done:
+                # keep waiting for it at the server event loop, never lose a message
+                return batch, receiveTask
+            nextMessage = receiveTask.result()
+            if not (nextMessage.get('request')
+                    and nextMessage['method'] == MessageType.SERVER_REQURST_newConsumer.value):
+                return batch, receiveTask
+            logger.info('receive request, requestId=%d, method=%s', nextMessage['id'], nextMessage['method'])
+            batch.append(Request(nextMessage['id'], nextMessage['method'], nextMessage['data']))
+        return batch, None
+
     async def _consumeData(self, message: Request):
         if self._multimediaRuntime.recvTransportId is None:
             await self._createRecvTransport()
@@ -411,41 +699,71 @@ class MediasoupClient:
                                                                   otherPeer)
 
     async def _serverEventLoop(self):
-        while True:
-            message = await self._signaler.receiveMessage()
-            if message.get('response'):
-                logger.info('receive response for requestId: %d', message['id'])
-                logger.debug('response details: ok=%s, data=%s', message['data'])
-                self._signaler.setResponse(message)
-            elif message.get('request'):
-                logger.info('receive request, requestId=%d, method=%s', message['id'], message['method'])
-                if message['method'] == MessageType.SERVER_REQURST_newConsumer.value:
-                    # don't use: asyncio.create_task(self._consume(...))
-                    # to prevent that consumer's notification precede it‘s request
-                    await self._consume(Request(message['id'], message['method'], message['data']))
-                elif message['method'] == MessageType.SERVER_REQURST_newDataConsumer.value:
-                    await self._consumeData(Request(message['id'], message['method'], message['data']))
-                else:
-                    logger.error('unhandled request: %s' + message)
-            elif message.get('notification'):
-                logger.info('receive notification, method=%s', message['method'])
-                if message['method'] in {MessageType.SERVER_NOTIFICATION_downlinkBwe.value}:
-                    await self._bandwidthNotificationListener.enqueue(message)
-                elif message['method'] in {MessageType.SERVER_NOTIFICATION_activeSpeaker.value,
-                                           MessageType.SERVER_NOTIFICATION_newPeer.value,
-                                           MessageType.SERVER_NOTIFICATION_peerDisplayNameChanged.value,
-                                           MessageType.SERVER_NOTIFICATION_peerClosed.value}:
-                    await self._peerNotificationListener.enqueue(message)
-                elif message['method'] in {MessageType.SERVER_NOTIFICATION_producerScore.value}:
-                    await self._producerNotificationListener.enqueue(message)
-                elif message['method'] in {MessageType.SERVER_NOTIFICATION_consumerScore.value,
-                                           MessageType.SERVER_NOTIFICATION_consumerLayersChanged.value,
-                                           MessageType.SERVER_NOTIFICATION_consumerPaused.value,
-                                           MessageType.SERVER_NOTIFICATION_consumerResumed.value,
-                                           MessageType.SERVER_NOTIFICATION_consumerClosed.value}:
-                    await self._consumerNotificationListener.enqueue(message)
-                elif message['method'] in {MessageType.SERVER_NOTIFICATION_dataConsumerClosed.value}:
-                    await self._dataConsumerNotificationListener.enqueue(message)
+        # a message receiving task left over by newConsumer batching
+        pendingReceiveTask = None
+        try:
+            while True:
+                if pendingReceiveTask is None:
+                    message = await self._signaler.receiveMessage()
                 else:
-                    logger.error('unhandled notification: %s' + message)
-            # bypass other no-exists message type
+                    message = await pendingReceiveTask
+                    pendingReceiveTask = None
+                pendingReceiveTask = await self._dispatchServerMessage(message)
+        finally:
+            if pendingReceiveTask is not None:
+                pendingReceiveTask.cancel()
+
+    async def _dispatchServerMessage(self, message: dict):
+        """
+        :return: the task receiving the next message if it is already in progress, else None
+        """
+        if message.get('notification') and (self._heldNotifications or self._negotiationTasks):
+            # it may be about a consumer still negotiating, keep it behind
+            self._heldNotifications.append((message, tuple(self._negotiationTasks)))
+            return None
+        return await self._messageRouter.dispatch(message)
+
+    async def _routeNewConsumer(self, message: dict):
+        batch, pendingReceiveTask = await self._collectNewConsumerBatch(message)
+        if self._negotiateInBackground:
+            if self._multimediaRuntime.canConsume and self._multimediaRuntime.recvTransportId is None:
+                await self._createRecvTransport()
+            self._handOffNegotiation(self._consumeMany(batch))
+        else:
+            # don't use: asyncio.create_task(self._consume(...))
+            # to prevent that consumer's notification precede it‘s request
+            await self._consumeMany(batch)
+        return pendingReceiveTask
+
+    async def _routeNewDataConsumer(self, message: dict):
+        if self._negotiateInBackground:
+            if self._multimediaRuntime.recvTransportId is None:
+                await self._createRecvTransport()
+            self._handOffNegotiation(self._consumeData(Request(message['id'], message['method'], message['data'])))
+        else:
+            await self._consumeData(Request(message['id'], message['method'], message['data']))
+
+    def _handOffNegotiation(self, coroutine):
+        # the tasks reach the negotiation queue of the handler in the order they are created
+        task = self._loop.create_task(coroutine)
+        self._negotiationTasks.add(task)
+        task.add_done_callback(self._onNegotiationDone)
+
+    def _onNegotiationDone(self, task: asyncio.Task):
+        self._negotiationTasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error('failed to negotiate in background: %r', task.exception())
+        if self._heldNotifications and self._flushTask is None:
+            self._flushTask = self._loop.create_task(self._flushHeldNotifications())
+
+    async def _flushHeldNotifications(self):
+        try:
+            while self._heldNotifications:
+                message, negotiationTasks = self._heldNotifications[0]
+                if not all(task.done() for task in negotiationTasks):
+                    # flushed again when they are done
+                    return
+                self._heldNotifications.popleft()
+                await self._messageRouter.dispatch(message)
+        finally:
+            self._flushTask = None
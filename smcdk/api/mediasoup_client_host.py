@@ -0,0 +1,257 @@
+import asyncio
+import contextvars
+import logging
+import sys
+from typing import Callable, Dict, Optional
+
+from smcdk.log import Logger
+from .media_source_registry import mediaSourceRegistry
+from .mediasoup_client import MediasoupClient
+
+# logger of module level
+logger = Logger.getLogger(__name__)
+
+# id of the hosted client the current task works for, inherited by the tasks it creates
+currentClientId: contextvars.ContextVar = contextvars.ContextVar('smcdkClientId', default=None)
+
+
+class ClientIdLogFilter(logging.Filter):
+    """
+    prefixes the log messages emitted on behalf of a hosted client with its id,
+    a single filter shared by all the clients instead of a logger per client
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        clientId = currentClientId.get()
+        if clientId is not None and not getattr(record, 'clientId', None):
+            record.clientId = clientId
+            record.msg = f'[{clientId}] {record.msg}'
+        return True
+
+
+class _HostedClient:
+    __slots__ = ('client', 'task', 'joined', 'error')
+
+    def __init__(self, client: MediasoupClient):
+        self.client = client
+        self.task: Optional[asyncio.Task] = None
+        self.joined: bool = False
+        self.error: Optional[BaseException] = None
+
+
+class MediasoupClientHost:
+    """
+    runs many MediasoupClient instances on the current event loop:
+    joins are staggered and bounded in concurrency, media sources and log handlers are shared,
+    and stats() reports per client tasks, memory and loop lag
+    device capabilities are shared by nativeCapabilitiesCache and ortcCache already
+    """
+
+    def __init__(self, joinInterval: float = 0.05, maxConcurrentJoins: int = 10, shareMediaSources: bool = True,
+                 tagLogs: bool = True, lagProbeInterval: float = 0.5):
+        """
+        :param joinInterval: min seconds between the start of two joins
+        :param maxConcurrentJoins: max number of clients joining at the same time
+        :param shareMediaSources: decode each media file once for all the clients playing it
+        :param tagLogs: prefix the smcdk log messages with the client id
+        :param lagProbeInterval: seconds between two event loop lag probes
+        """
+        self._joinInterval: float = joinInterval
+        self._joinSemaphore: Optional[asyncio.Semaphore] = None
+        self._maxConcurrentJoins: int = maxConcurrentJoins
+        self._nextJoinTime: float = 0
+        self._shareMediaSources: bool = shareMediaSources
+        self._logFilter: Optional[ClientIdLogFilter] = None
+        if tagLogs:
+            self._logFilter = ClientIdLogFilter()
+            self._installLogFilter()
+        self._lagProbeInterval: float = lagProbeInterval
+        self._lagProbeTask: Optional[asyncio.Task] = None
+        self._lastLag: float = 0
+        self._maxLag: float = 0
+        self._totalLag: float = 0
+        self._numLagProbes: int = 0
+        self._clients: Dict[str, _HostedClient] = {}
+
+    def _installLogFilter(self):
+        # every smcdk module logger owns its handlers, see Logger.getLogger()
+        for name, smcdkLogger in list(logging.Logger.manager.loggerDict.items()):
+            if name.startswith('smcdk') and isinstance(smcdkLogger, logging.Logger):
+                for handler in smcdkLogger.handlers:
+                    if self._logFilter not in handler.filters:
+                        handler.addFilter(self._logFilter)
+
+    def addClient(self, clientId: str, clientFactory: Callable[[], MediasoupClient] = MediasoupClient) \
+            -> MediasoupClient:
+        """
+        :param clientFactory: creates the client, e.g. with its own signaler and listeners
+        """
+        if clientId in self._clients:
+            raise Exception(f'duplicate clientId: {clientId}')
+        client = clientFactory()
+        if self._shareMediaSources:
+            client.multimediaRuntime.setPlayerFactory(mediaSourceRegistry.acquire)
+        self._clients[clientId] = _HostedClient(client)
+        return client
+
+    def getClient(self, clientId: str) -> MediasoupClient:
+        return self._clients[clientId].client
+
+    @property
+    def clientIds(self) -> list:
+        return list(self._clients.keys())
+
+    def join(self, clientId: str, roomAddressInfo: dict, peerInfo: dict, producerConfig: dict,
+             consumerConfig: dict) -> asyncio.Task:
+        """
+        schedule MediasoupClient.joinRoom of the given client behind the pending joins
+
+        :return: the task running the client until it exits the room
+        """
+        hostedClient = self._clients[clientId]
+        if hostedClient.task is not None and not hostedClient.task.done():
+            raise Exception(f'client {clientId} is already in a room')
+        self._start()
+        hostedClient.joined = False
+        hostedClient.error = None
+        hostedClient.task = asyncio.get_running_loop().create_task(
+            self._runClient(clientId, hostedClient, roomAddressInfo, peerInfo, producerConfig, consumerConfig),
+            name=f'HostedClient({clientId})')
+        return hostedClient.task
+
+    async def waitJoined(self, clientId: str = None):
+        """
+        wait until the given client, or every client being run, has joined or failed
+        """
+        hostedClients = [self._clients[clientId]] if clientId is not None else list(self._clients.values())
+        for hostedClient in hostedClients:
+            if hostedClient.task is None:
+                continue
+            joinedTask = asyncio.ensure_future(hostedClient.client.waitJoined())
+            await asyncio.wait({hostedClient.task, joinedTask}, return_when=asyncio.FIRST_COMPLETED)
+            # _runClient may not have resumed yet to record it
+            hostedClient.joined = hostedClient.joined or joinedTask.done()
+            joinedTask.cancel()
+
+    async def leave(self, clientId: str):
+        hostedClient = self._clients[clientId]
+        client = hostedClient.client
+        if client.room.roomId is not None:
+            await client.exitRoom(client.room.roomId)
+        if hostedClient.task is not None and not hostedClient.task.done():
+            hostedClient.task.cancel()
+            await asyncio.gather(hostedClient.task, return_exceptions=True)
+
+    async def removeClient(self, clientId: str):
+        await self.leave(clientId)
+        del self._clients[clientId]
+
+    async def close(self):
+        await asyncio.gather(*[self.leave(clientId) for clientId in list(self._clients.keys())],
+                             return_exceptions=True)
+        if self._lagProbeTask is not None:
+            self._lagProbeTask.cancel()
+            await asyncio.gather(self._lagProbeTask, return_exceptions=True)
+            self._lagProbeTask = None
+
+    def stats(self) -> dict:
+        """
+        {
+            'clients', 'joined', 'failed', 'tasks': total tasks of the hosted clients, 'loopTasks': all loop tasks,
+            'maxRssBytes': peak resident memory of the process, None if unknown,
+            'maxRssBytesPerClientAvg': maxRssBytes divided by the current number of clients, a rough average only:
+                the peak may predate the clients, and it is spread over fewer of them as clients leave,
+            'loopLag': {'last', 'max', 'mean'} in seconds,
+            'perClient': {clientId: {'joined', 'tasks', 'joinSeconds', 'error'}}
+        }
+        """
+        perClient = {}
+        for clientId, hostedClient in self._clients.items():
+            numTasks = sum(1 for task in hostedClient.client.loopTasks if not task.done())
+            if hostedClient.task is not None and not hostedClient.task.done():
+                numTasks += 1
+            perClient[clientId] = {
+                'joined': hostedClient.joined,
+                'tasks': numTasks,
+                'joinSeconds': hostedClient.client.joinTimings.get('total'),
+                'error': repr(hostedClient.error) if hostedClient.error is not None else None
+            }
+        maxRssBytes = self._maxRssBytes()
+        return {
+            'clients': len(self._clients),
+            'joined': sum(1 for info in perClient.values() if info['joined']),
+            'failed': sum(1 for info in perClient.values() if info['error'] is not None),
+            'tasks': sum(info['tasks'] for info in perClient.values()),
+            'loopTasks': len(asyncio.all_tasks()),
+            'maxRssBytes': maxRssBytes,
+            'maxRssBytesPerClientAvg': maxRssBytes // len(self._clients) if maxRssBytes and self._clients else None,
+            'sharedMediaSources': len(mediaSourceRegistry) if self._shareMediaSources else 0,
+            'loopLag': {
+                'last': self._lastLag,
+                'max': self._maxLag,
+                'mean': self._totalLag / self._numLagProbes if self._numLagProbes else 0
+            },
+            'perClient': perClient
+        }
+
+    def _start(self):
+        if self._joinSemaphore is None:
+            self._joinSemaphore = asyncio.Semaphore(self._maxConcurrentJoins)
+        if self._lagProbeTask is None and self._lagProbeInterval > 0:
+            self._lagProbeTask = asyncio.get_running_loop().create_task(self._probeLoopLag(),
+                                                                        name='LoopLagProbe')
+        if self._logFilter is not None:
+            # pick up the loggers of the modules imported since
+            self._installLogFilter()
+
+    async def _runClient(self, clientId: str, hostedClient: _HostedClient, roomAddressInfo: dict, peerInfo: dict,
+                         producerConfig: dict, consumerConfig: dict):
+        currentClientId.set(clientId)
+        client = hostedClient.client
+        loop = asyncio.get_running_loop()
+        async with self._joinSemaphore:
+            # stagger the joins, thundering herds overload the server and the local loop alike
+            now = loop.time()
+            startTime = max(now, self._nextJoinTime)
+            self._nextJoinTime = startTime + self._joinInterval
+            if startTime > now:
+                await asyncio.sleep(startTime - now)
+            joinTask = asyncio.ensure_future(client.joinRoom(roomAddressInfo, peerInfo, producerConfig,
+                                                             consumerConfig))
+            joinedTask = asyncio.ensure_future(client.waitJoined())
+            try:
+                await asyncio.wait({joinTask, joinedTask}, return_when=asyncio.FIRST_COMPLETED)
+            except asyncio.CancelledError:
+                joinTask.cancel()
+                raise
+            finally:
+                hostedClient.joined = joinedTask.done()
+                joinedTask.cancel()
+        try:
+            await joinTask
+        except asyncio.CancelledError:
+            joinTask.cancel()
+            raise
+        except Exception as error:
+            hostedClient.error = error
+            logger.error('client %s failed: %r', clientId, error)
+
+    async def _probeLoopLag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expectedTime = loop.time() + self._lagProbeInterval
+            await asyncio.sleep(self._lagProbeInterval)
+            self._lastLag = max(loop.time() - expectedTime, 0)
+            self._maxLag = max(self._maxLag, self._lastLag)
+            self._totalLag += self._lastLag
+            self._numLagProbes += 1
+
+    @staticmethod
+    def _maxRssBytes() -> Optional[int]:
+        try:
+            import resource
+        except ImportError:
+            return None
+        maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return maxRss if sys.platform == 'darwin' else maxRss * 1024
@@ -0,0 +1,285 @@
+import asyncio
+import functools
+import itertools
+import multiprocessing
+import os
+import threading
+from multiprocessing.connection import Connection
+from typing import Callable, Dict, List, Optional, Tuple
+
+from smcdk.log import Logger
+from .mediasoup_client import MediasoupClient
+from .mediasoup_client_host import MediasoupClientHost
+
+# logger of module level
+logger = Logger.getLogger(__name__)
+
+
+def _readConnection(conn: Connection, loop: asyncio.AbstractEventLoop, onMessage: Callable):
+    # blocking reads off the loop thread, None tells the connection is closed
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            message = None
+        try:
+            loop.call_soon_threadsafe(onMessage, message)
+        except RuntimeError:
+            # the loop is closed
+            return
+        if message is None:
+            return
+
+
+async def _serveWorker(conn: Connection, clientFactory: Callable[[], MediasoupClient], hostOptions: dict):
+    loop = asyncio.get_running_loop()
+    host = MediasoupClientHost(**hostOptions)
+    stopped = loop.create_future()
+
+    async def handle(command: str, args: tuple):
+        if command == 'join':
+            clientId, roomAddressInfo, peerInfo, producerConfig, consumerConfig = args
+            if clientId not in host.clientIds:
+                host.addClient(clientId, clientFactory)
+            host.join(clientId, roomAddressInfo, peerInfo, producerConfig, consumerConfig)
+            await host.waitJoined(clientId)
+            clientStats = host.stats()['perClient'][clientId]
+            if clientStats['error'] is not None:
+                raise Exception(clientStats['error'])
+            return clientStats
+        elif command == 'leave':
+            await host.removeClient(args[0])
+        elif command == 'play':
+            if host.getClient(args[0]).play() is None:
+                raise Exception(f'client {args[0]} is not in a room')
+        elif command == 'stats':
+            return host.stats()
+        elif command == 'stop':
+            await host.close()
+            stopped.set_result(None)
+        else:
+            raise Exception(f'unknown command: {command}')
+
+    async def respond(requestId: int, command: str, args: tuple):
+        try:
+            result = await handle(command, args)
+            conn.send((requestId, True, result))
+        except Exception as error:
+            conn.send((requestId, False, repr(error)))
+
+    def onMessage(message):
+        if message is None:
+            # the supervisor is gone
+            if not stopped.done():
+                loop.create_task(host.close()).add_done_callback(
+                    lambda _: stopped.done() or stopped.set_result(None))
+            return
+        requestId, command, args = message
+        loop.create_task(respond(requestId, command, args), name=f'WorkerCommand({command})')
+
+    threading.Thread(target=_readConnection, args=(conn, loop, onMessage), name='SupervisorReader',
+                     daemon=True).start()
+    await stopped
+
+
+def _workerMain(conn: Connection, clientFactory: Callable[[], MediasoupClient], hostOptions: dict):
+    asyncio.run(_serveWorker(conn, clientFactory, hostOptions))
+
+
+class _Worker:
+    __slots__ = ('index', 'process', 'conn', 'clientIds', 'loopLag')
+
+    def __init__(self, index: int, process: multiprocessing.Process, conn: Connection):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.clientIds: set = set()
+        # the last loop lag(in seconds) reported by the worker's host
+        self.loopLag: float = 0
+
+
+class MediasoupClientSupervisor:
+    """
+    shards MediasoupClient instances across worker processes, each running a MediasoupClientHost on its own loop,
+    so that the RTP/SRTP, codec and DTLS work of the clients spreads over the CPU cores,
+    the control API(join, leave, play, stats) is forwarded to the workers over pipes
+    """
+
+    def __init__(self, numWorkers: int = None, clientFactory: Callable[[], MediasoupClient] = MediasoupClient,
+                 hostOptions: dict = None, maxLoopLag: float = 0.1, rebalanceInterval: float = 5,
+                 startMethod: str = 'spawn'):
+        """
+        :param numWorkers: number of worker processes, default is the number of CPUs
+        :param clientFactory: creates the clients in the workers, must be picklable, e.g. a module level function
+        :param hostOptions: keyword arguments of each worker's MediasoupClientHost
+        :param maxLoopLag: seconds of loop lag above which clients are moved away from a worker, 0 to never move
+        :param rebalanceInterval: seconds between two loop lag checks
+        :param startMethod: multiprocessing start method of the workers
+        """
+        self._numWorkers: int = numWorkers or os.cpu_count() or 1
+        self._clientFactory = clientFactory
+        self._hostOptions: dict = dict(hostOptions) if hostOptions else {}
+        self._maxLoopLag: float = maxLoopLag
+        self._rebalanceInterval: float = rebalanceInterval
+        self._context = multiprocessing.get_context(startMethod)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers: List[_Worker] = []
+        self._requestIds = itertools.count(1)
+        # requestId -> (worker, future of the response)
+        self._pendingRequests: Dict[int, Tuple[_Worker, asyncio.Future]] = {}
+        self._clientWorkers: Dict[str, _Worker] = {}
+        # joinRoom arguments of each client, to join it again on another worker
+        self._joinArgs: Dict[str, tuple] = {}
+        self._rebalanceTask: Optional[asyncio.Task] = None
+        self.movedClients: int = 0
+
+    @property
+    def numWorkers(self) -> int:
+        return self._numWorkers
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        for index in range(self._numWorkers):
+            parentConn, childConn = self._context.Pipe()
+            process = self._context.Process(target=_workerMain, args=(childConn, self._clientFactory,
+                                                                      self._hostOptions),
+                                            name=f'MediasoupClientWorker-{index}', daemon=True)
+            process.start()
+            childConn.close()
+            worker = _Worker(index, process, parentConn)
+            self._workers.append(worker)
+            threading.Thread(target=_readConnection,
+                             args=(parentConn, self._loop, functools.partial(self._onWorkerMessage, worker)),
+                             name=f'WorkerReader-{index}', daemon=True).start()
+        if self._maxLoopLag > 0:
+            self._rebalanceTask = self._loop.create_task(self._rebalanceLoop(), name='SupervisorRebalance')
+
+    async def join(self, clientId: str, roomAddressInfo: dict, peerInfo: dict, producerConfig: dict,
+                   consumerConfig: dict, workerIndex: int = None) -> dict:
+        """
+        join the room with a new client on the given worker, or on the least loaded one
+
+        :return: the client's stats once it has joined, see MediasoupClientHost.stats()
+        """
+        if clientId in self._clientWorkers:
+            raise Exception(f'duplicate clientId: {clientId}')
+        worker = self._workers[workerIndex] if workerIndex is not None else self._leastLoadedWorker()
+        args = (clientId, roomAddressInfo, peerInfo, producerConfig, consumerConfig)
+        self._clientWorkers[clientId] = worker
+        self._joinArgs[clientId] = args
+        worker.clientIds.add(clientId)
+        try:
+            return await self._request(worker, 'join', args)
+        except BaseException:
+            try:
+                await self._forget(clientId, leave=True)
+            except Exception as error:
+                logger.warning('cleanup of client %s failed: %r', clientId, error)
+            raise
+
+    async def leave(self, clientId: str):
+        await self._forget(clientId, leave=True)
+
+    async def play(self, clientId: str):
+        await self._request(self._workerOf(clientId), 'play', (clientId,))
+
+    async def stats(self) -> dict:
+        """
+        :return: {'workers': [MediasoupClientHost.stats() of each worker], 'clients', 'movedClients'}
+        """
+        workerStats = await asyncio.gather(*[self._request(worker, 'stats', ()) for worker in self._workers])
+        for worker, stats in zip(self._workers, workerStats):
+            worker.loopLag = stats['loopLag']['last']
+        return {'workers': list(workerStats), 'clients': len(self._clientWorkers), 'movedClients': self.movedClients}
+
+    async def close(self):
+        if self._rebalanceTask is not None:
+            self._rebalanceTask.cancel()
+            await asyncio.gather(self._rebalanceTask, return_exceptions=True)
+            self._rebalanceTask = None
+        await asyncio.gather(*[self._request(worker, 'stop', ()) for worker in self._workers
+                               if worker.process.is_alive()], return_exceptions=True)
+        for worker in self._workers:
+            worker.conn.close()
+            await self._loop.run_in_executor(None, worker.process.join, 5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self._workers = []
+        self._clientWorkers.clear()
+        self._joinArgs.clear()
+
+    def _workerOf(self, clientId: str) -> _Worker:
+        worker = self._clientWorkers.get(clientId)
+        if worker is None:
+            raise Exception(f'unknown clientId: {clientId}')
+        return worker
+
+    def _leastLoadedWorker(self, exclude: _Worker = None) -> _Worker:
+        # workers lagging above maxLoopLag come last
+        return min((worker for worker in self._workers if worker is not exclude),
+                   key=lambda worker: (0 < self._maxLoopLag < worker.loopLag, len(worker.clientIds), worker.loopLag))
+
+    async def _forget(self, clientId: str, leave: bool):
+        worker = self._clientWorkers.pop(clientId, None)
+        self._joinArgs.pop(clientId, None)
+        if worker is None:
+            return
+        worker.clientIds.discard(clientId)
+        if leave:
+            await self._request(worker, 'leave', (clientId,))
+
+    async def _request(self, worker: _Worker, command: str, args: tuple):
+        requestId = next(self._requestIds)
+        future = self._loop.create_future()
+        self._pendingRequests[requestId] = (worker, future)
+        try:
+            worker.conn.send((requestId, command, args))
+            return await future
+        finally:
+            self._pendingRequests.pop(requestId, None)
+
+    def _onWorkerMessage(self, worker: _Worker, message):
+        if message is None:
+            # the worker has exited, nobody will answer its pending requests
+            for pendingWorker, future in self._pendingRequests.values():
+                if pendingWorker is worker and not future.done():
+                    future.set_exception(Exception(f'worker {worker.index} has exited'))
+            return
+        requestId, ok, result = message
+        _, future = self._pendingRequests.get(requestId, (None, None))
+        if future is None or future.done():
+            return
+        if ok:
+            future.set_result(result)
+        else:
+            future.set_exception(Exception(result))
+
+    async def _rebalanceLoop(self):
+        while True:
+            await asyncio.sleep(self._rebalanceInterval)
+            try:
+                await self.stats()
+                await self._rebalance()
+            except Exception as error:
+                logger.error('rebalance failed: %r', error)
+
+    async def _rebalance(self):
+        """
+        move one client away from each worker lagging above maxLoopLag to the least loaded worker,
+        moving means leaving the room on the old worker and joining it again on the new one
+        """
+        if len(self._workers) < 2:
+            return
+        for worker in self._workers:
+            if worker.loopLag <= self._maxLoopLag or not worker.clientIds:
+                continue
+            target = self._leastLoadedWorker(exclude=worker)
+            if target.loopLag > self._maxLoopLag:
+                continue
+            clientId = next(iter(worker.clientIds))
+            args = self._joinArgs[clientId]
+            logger.info('move client %s from worker %d(loop lag %.3fs) to worker %d', clientId, worker.index,
+                        worker.loopLag, target.index)
+            await self._forget(clientId, leave=True)
+            await self.join(*args, workerIndex=target.index)
+            self.movedClients += 1
@@ -1,16 +1,35 @@
 import asyncio
-import json
 # for ProtooSignaler
 import random
 import ssl
 from abc import ABCMeta, abstractmethod
 from enum import Enum
-from typing import Dict
+from typing import Dict, Optional, Union
 
 import websockets
 
+from smcdk.log import Logger
+from smcdk.api.signaling_codec import SignalingCodec, createCodec
+
+# logger of module level
+logger = Logger.getLogger(__name__)
+
 
 class MediasoupSignalerInterface(metaclass=ABCMeta):
+    # codec of the signaling messages, created on first use if not set
+    _codec: Optional[SignalingCodec] = None
+
+    @property
+    def codec(self) -> SignalingCodec:
+        if self._codec is None:
+            self._codec = createCodec()
+        return self._codec
+
+    def setCodec(self, codec: Union[SignalingCodec, str]):
+        """
+        :param codec: a SignalingCodec, or the name of one, see signaling_codec.createCodec()
+        """
+        self._codec = createCodec(codec) if isinstance(codec, str) else codec
 
     @abstractmethod
     async def connectToRoom(self, loop, serverAddress, roomId, peerId, enableSslVerification: bool = True):
@@ -65,14 +84,65 @@ class MediasoupSignalerInterface(metaclass=ABCMeta):
         pass
 
 
-class ProtooSignaler(MediasoupSignalerInterface):
+class _PendingRequest:
+    __slots__ = ('method', 'future', 'deadline', 'awaited', 'timerHandle')
+
+    def __init__(self, method: str, future: asyncio.Future, deadline: float):
+        self.method = method
+        self.future = future
+        # loop time after which the request times out
+        self.deadline = deadline
+        # whether getResponse() is waiting for it
+        self.awaited = False
+        self.timerHandle: Optional[asyncio.TimerHandle] = None
 
-    def __init__(self):
+
+class ProtooSignaler(MediasoupSignalerInterface):
+    # protoo request ids are kept below 2^31 to be safe with any server side integer type
+    MAX_REQUEST_ID = 2 ** 31 - 1
+
+    def __init__(self, requestTimeout: float = 10, requestTimeouts: Dict[str, float] = None,
+                 codec: Union[SignalingCodec, str] = 'auto', offloadDecodeThreshold: Optional[int] = None):
+        """
+        :param requestTimeout: seconds to wait for the response of a request, default is 10
+        :param requestTimeouts: per method timeout overriding requestTimeout, e.g. {'join': 30}
+        :param codec: json codec of the messages, 'auto' picks the fastest installed of orjson, msgspec and json
+        :param offloadDecodeThreshold: messages of at least this many characters are decoded in the default
+            executor, so that big payloads (e.g. router rtp capabilities) don't stall the event loop;
+            None, the default, decodes everything inline
+        """
         self._loop = None
         self._ctx = None
         self._websocket = None
         self._roomUri = None
-        self._responses: Dict[int, asyncio.Future] = {}
+        self._requestTimeout: float = requestTimeout
+        self._requestTimeouts: Dict[str, float] = dict(requestTimeouts) if requestTimeouts else {}
+        # sequence of request ids, starting at a random point so that ids of successive sessions differ
+        self._nextRequestId: int = ProtooSignaler.generateRandomNumber() + 1
+        # requests waiting for (or holding a not yet collected) response, indexed by request id
+        self._responses: Dict[int, _PendingRequest] = {}
+        self.timedOutRequests: int = 0
+        self.setCodec(codec)
+        self._offloadDecodeThreshold: Optional[int] = offloadDecodeThreshold
+
+    @property
+    def inflightRequests(self) -> int:
+        """
+        the number of sent requests whose response has not been received yet
+        """
+        return sum(1 for pendingRequest in self._responses.values() if not pendingRequest.future.done())
+
+    def setRequestTimeout(self, timeout: float, method: str = None):
+        """
+        set the response timeout of the given method, or the default one if method is None
+        """
+        if method is None:
+            self._requestTimeout = timeout
+        else:
+            self._requestTimeouts[method] = timeout
+
+    def getRequestTimeout(self, method: str) -> float:
+        return self._requestTimeouts.get(method, self._requestTimeout)
 
     async def connectToRoom(self, loop: asyncio.AbstractEventLoop, serverAddress, roomId,
                             peerId, enableSslVerification: bool = True):  # todo: 格式化，并存储roomId
@@ -86,6 +156,14 @@ class ProtooSignaler(MediasoupSignalerInterface):
 
     async def closeCurrentConnection(self):
         self._websocket.close()
+        # nobody will answer them anymore
+        for requestId in list(self._responses.keys()):
+            pendingRequest = self._responses[requestId]
+            if not pendingRequest.future.done():
+                pendingRequest.future.set_exception(Exception("connection closed"))
+                # mark it retrieved in case nobody is waiting for it
+                pendingRequest.future.exception()
+            self._discardRequest(requestId)
         self._loop = None
 
     @staticmethod
@@ -170,17 +248,56 @@ class ProtooSignaler(MediasoupSignalerInterface):
             }
         })
 
+    def _allocateRequestId(self) -> int:
+        # monotonic sequence, skipping ids still in use after a wrap around
+        requestId = self._nextRequestId
+        while requestId in self._responses:
+            requestId = requestId + 1 if requestId < ProtooSignaler.MAX_REQUEST_ID else 1
+        self._nextRequestId = requestId + 1 if requestId < ProtooSignaler.MAX_REQUEST_ID else 1
+        return requestId
+
+    def _discardRequest(self, requestId: int):
+        pendingRequest = self._responses.pop(requestId, None)
+        if pendingRequest is not None and pendingRequest.timerHandle is not None:
+            pendingRequest.timerHandle.cancel()
+
+    def _expireRequest(self, requestId: int):
+        pendingRequest = self._responses.get(requestId)
+        if pendingRequest is None:
+            return
+        pendingRequest.timerHandle = None
+        if not pendingRequest.future.done():
+            self.timedOutRequests += 1
+            logger.warning('request timed out, requestId=%d, method=%s', requestId, pendingRequest.method)
+            pendingRequest.future.set_exception(asyncio.TimeoutError())
+            pendingRequest.future.exception()
+        # a response nobody asked for in time is dropped, otherwise getResponse() drops it
+        if not pendingRequest.awaited:
+            self._discardRequest(requestId)
+
     async def _send_request(self, requestParameters: dict) -> int:
-        requestParameters['id'] = ProtooSignaler.generateRandomNumber()
-        self._responses[requestParameters['id']] = self._loop.create_future()
-        await self._websocket.send(json.dumps(requestParameters))
-        return requestParameters['id']
+        requestId = self._allocateRequestId()
+        requestParameters['id'] = requestId
+        method = requestParameters['method']
+        timeout = self.getRequestTimeout(method)
+        pendingRequest = _PendingRequest(method, self._loop.create_future(), self._loop.time() + timeout)
+        pendingRequest.timerHandle = self._loop.call_later(timeout, self._expireRequest, requestId)
+        self._responses[requestId] = pendingRequest
+        try:
+            await self._websocket.send(self.codec.encode(requestParameters))
+        except BaseException:
+            self._discardRequest(requestId)
+            raise
+        return requestId
 
     async def _send_response(self, responseParameters: dict):
-        await self._websocket.send(json.dumps(responseParameters))
+        await self._websocket.send(self.codec.encode(responseParameters))
 
     async def receiveMessage(self):
-        return json.loads(await self._websocket.recv())
+        data = await self._websocket.recv()
+        if self._offloadDecodeThreshold is not None and len(data) >= self._offloadDecodeThreshold:
+            return await self._loop.run_in_executor(None, self.codec.decode, data)
+        return self.codec.decode(data)
 
     async def responseToNewConsumer(self, requestId: str):
         return await self._send_response({
@@ -199,15 +316,28 @@ class ProtooSignaler(MediasoupSignalerInterface):
         })
 
     def setResponse(self, message: dict):
-        self._responses[message['id']].set_result(message)
+        pendingRequest = self._responses.get(message['id'])
+        if pendingRequest is None or pendingRequest.future.done():
+            # timed out or closed before
+            logger.warning('drop response of unknown requestId: %s', message['id'])
+            return
+        # the timer keeps running, it drops the response if getResponse() is never called
+        pendingRequest.future.set_result(message)
 
     async def getResponse(self, requestId: int):
-        # print(f'getResponse: {requestId}')
+        pendingRequest = self._responses.get(requestId)
+        if pendingRequest is None:
+            raise Exception(f"unknown or expired requestId: {requestId}")
+        pendingRequest.awaited = True
         try:
-            message = await asyncio.wait_for(fut=self._responses[requestId], timeout=10)
+            message = await asyncio.wait_for(fut=asyncio.shield(pendingRequest.future),
+                                             timeout=max(pendingRequest.deadline - self._loop.time(), 0))
             return Response(requestId=message['id'], method=None, data=message['data'])
         except asyncio.TimeoutError:
             raise Exception("operation timed out")
+        finally:
+            # completed, timed out or cancelled, the request is over in any case
+            self._discardRequest(requestId)
 
 
 class MessageType(Enum):
@@ -0,0 +1,88 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from smcdk.log import Logger
+from smcdk.timing_stats import TimingStats
+
+# logger of module level
+logger = Logger.getLogger(__name__)
+
+
+class MessageRouter:
+    """
+    routes the messages received from the server through tables indexed by method,
+    built once from the registered handlers, and keeps per method counters and dispatch latency histograms
+    """
+    # upper bounds(in seconds) of the latency histogram buckets, the last bucket holds the rest
+    LATENCY_BUCKETS: Tuple[float, ...] = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+
+    def __init__(self, responseHandler: Callable[[dict], Any]):
+        """
+        :param responseHandler: receives every response, e.g. MediasoupSignalerInterface.setResponse
+        """
+        self._responseHandler = responseHandler
+        # method -> coroutine function receiving the request message,
+        # it may return the task receiving the next message if it is already in progress
+        self._requestRoutes: Dict[str, Callable[[dict], Awaitable[Any]]] = {}
+        # method -> function receiving the notification message, it must not block
+        self._notificationRoutes: Dict[str, Callable[[dict], Any]] = {}
+        # (message type, method) -> stats
+        self._stats: Dict[Tuple[str, Optional[str]], TimingStats] = {}
+
+    def addRequestRoute(self, method: str, handler: Callable[[dict], Awaitable[Any]]):
+        self._requestRoutes[method] = handler
+
+    def addNotificationRoute(self, method: str, handler: Callable[[dict], Any]):
+        self._notificationRoutes[method] = handler
+
+    def hasRoute(self, method: str) -> bool:
+        return method in self._requestRoutes or method in self._notificationRoutes
+
+    async def dispatch(self, message: dict):
+        """
+        :return: whatever the request handler returned, else None
+        """
+        startTime = time.perf_counter()
+        result = None
+        if message.get('response'):
+            messageType, method = 'response', None
+            logger.debug('receive response, requestId=%s, ok=%s', message['id'], message.get('ok'))
+            self._responseHandler(message)
+        elif message.get('request'):
+            messageType, method = 'request', message['method']
+            logger.info('receive request, requestId=%s, method=%s', message['id'], method)
+            handler = self._requestRoutes.get(method)
+            if handler is None:
+                logger.error('unhandled request: %s', message)
+            else:
+                result = await handler(message)
+        elif message.get('notification'):
+            messageType, method = 'notification', message['method']
+            logger.debug('receive notification, method=%s', method)
+            handler = self._notificationRoutes.get(method)
+            if handler is None:
+                logger.error('unhandled notification: %s', message)
+            else:
+                handler(message)
+        else:
+            # bypass other no-exists message type
+            return None
+        elapsed = time.perf_counter() - startTime
+        stats = self._stats.get((messageType, method))
+        if stats is None:
+            stats = self._stats[(messageType, method)] = TimingStats(MessageRouter.LATENCY_BUCKETS)
+        stats.record(elapsed)
+        return result
+
+    def stats(self) -> dict:
+        """
+        :return: {'request'|'notification'|'response': {method(None for responses): {
+            'count', 'totalSeconds', 'maxSeconds', 'buckets': [(upper bound in seconds or None, count)]}}}
+        """
+        result = {}
+        for (messageType, method), stats in self._stats.items():
+            result.setdefault(messageType, {})[method] = stats.dict()
+        return result
+
+    def resetStats(self):
+        self._stats.clear()
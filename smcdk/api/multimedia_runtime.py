@@ -1,20 +1,120 @@
 import os
-from typing import Union, Optional, Literal
+from collections import deque
+from typing import Union, Optional, Literal, List, Callable, Dict
 
+import av
 from aiortc import VideoStreamTrack
 from aiortc.contrib.media import MediaPlayer, MediaBlackhole, MediaRecorder
-from aiortc.mediastreams import AudioStreamTrack
+from aiortc.mediastreams import AudioStreamTrack, MediaStreamTrack
+
+try:
+    from av.bitstream import BitStreamFilterContext
+except ImportError:
+    # PyAV < 12 has no bitstream filters
+    BitStreamFilterContext = None
 
 from smcdk.consumer import Consumer
 from smcdk.data_consumer import DataConsumer
 from smcdk.device import Device
 from smcdk.handlers.aiortc_handler import AiortcHandler
+from smcdk.log import Logger
 from smcdk.producer import Producer
-from smcdk.rtp_parameters import RtpCapabilities
+from smcdk.rtp_parameters import RtpCapabilities, RtpCodecCapability
 from smcdk.sctp_parameters import SctpCapabilities, SctpStreamParameters
 from smcdk.transport import Transport
+from .consumer_registry import ConsumerEntry, ConsumerRegistry
+from .encoded_recorder import EncodedRecorder, EncodedFrameRecorder, RtpDumpRecorder, CONTAINER_CODECS, \
+    CONTAINER_SUFFIXES
+from .recording_pool import FrameDropPolicy, PooledMediaRecorder, RecordingPool, getDefaultRecordingPool
+from .segmented_recording import RecordSegmenter, SegmentedRecorder
 from .room_peer import Peer
 
+# logger of module level
+logger = Logger.getLogger(__name__)
+
+# codecs of the demuxed packets aiortc is able to packetize as they are, AVCC H264 once turned into Annex B
+PASSTHROUGH_MIME_TYPES: Dict[str, str] = {
+    'vp8': 'video/VP8',
+    'h264': 'video/H264',
+    'opus': 'audio/opus',
+    'pcm_alaw': 'audio/PCMA',
+    'pcm_mulaw': 'audio/PCMU'
+}
+
+
+def probeMediaCodecs(mediaFilePath: str) -> Dict[str, str]:
+    """
+    :return: {kind: mimeType} of the first audio and video streams of the media file,
+        raises if one of them can not be sent without re-encoding
+    """
+    mimeTypes = {}
+    with av.open(mediaFilePath) as container:
+        for stream in container.streams:
+            if stream.type not in ('audio', 'video') or stream.type in mimeTypes:
+                continue
+            codecName = stream.codec_context.name
+            mimeType = PASSTHROUGH_MIME_TYPES.get(codecName)
+            if mimeType is None or not mimeType.startswith(stream.type):
+                raise Exception(f'{stream.type} codec {codecName} of {mediaFilePath} can not be sent without '
+                                f're-encoding, supported codecs: {", ".join(PASSTHROUGH_MIME_TYPES)}')
+            if _isAvcc(stream) and BitStreamFilterContext is None:
+                raise Exception(f'H264 of {mediaFilePath} is in AVCC format, sending it without re-encoding '
+                                f'requires the bitstream filters of PyAV >= 12')
+            mimeTypes[stream.type] = mimeType
+    return mimeTypes
+
+
+def _isAvcc(stream) -> bool:
+    # MP4 and MKV keep H264 in AVCC format: length prefixed NAL units, SPS and PPS in the extradata
+    extradata = stream.codec_context.extradata
+    return stream.codec_context.name == 'h264' and extradata is not None and extradata[:1] == b'\x01'
+
+
+def _openAnnexBFilter(mediaFilePath: str) -> Optional['BitStreamFilterContext']:
+    """
+    :return: the filter turning the packets of the first video stream into Annex B, None if it is not AVCC H264
+    """
+    # the filter keeps a copy of the codec parameters, the container is no longer needed
+    with av.open(mediaFilePath) as container:
+        stream = container.streams.video[0]
+        if not _isAvcc(stream):
+            return None
+        return BitStreamFilterContext('h264_mp4toannexb', in_stream=stream)
+
+
+class AnnexBTrack(MediaStreamTrack):
+    """
+    turns the demuxed AVCC H264 packets of a track into Annex B ones, with SPS and PPS prepended to the key frames,
+    the only H264 aiortc is able to packetize
+    """
+    kind = 'video'
+
+    def __init__(self, track: MediaStreamTrack, annexBFilter: 'BitStreamFilterContext'):
+        """
+        :param track: the video track of a MediaPlayer(mediaFilePath, decode=False)
+        :param annexBFilter: see _openAnnexBFilter(mediaFilePath)
+        """
+        super(AnnexBTrack, self).__init__()
+        self._track: MediaStreamTrack = track
+        self._filter = annexBFilter
+        self._packets: deque = deque()
+
+    async def recv(self) -> av.Packet:
+        while not self._packets:
+            self._packets.extend(self._filter.filter(await self._track.recv()))
+        return self._packets.popleft()
+
+    def stop(self):
+        super(AnnexBTrack, self).stop()
+        self._track.stop()
+
+
+# how the consumers are recorded:
+# transcode: decoded and encoded again by MediaRecorder,
+# container: the encoded frames written into a container as they are, see EncodedFrameRecorder,
+# rtp: the RTP packets dumped along with an SDP sidecar, see RtpDumpRecorder
+RECORD_MODES = ('transcode', 'container', 'rtp')
+
 
 class MultimediaRuntime:
     def __init__(self):
@@ -28,7 +128,14 @@ class MultimediaRuntime:
         self._autoProduce: bool = True
         self._canProduce: bool = False
         self._player: MediaPlayer = None
+        # creates the player of mediaFilePath, anything with audio and video tracks
+        self._playerFactory: Callable[[str], MediaPlayer] = MediaPlayer
         self._mediaFilePath: str = None
+        # send the demuxed packets of the media file without decoding and re-encoding them
+        self._passthrough: bool = False
+        # kind -> mimeType of the media file, then kind -> codec to produce with, in passthrough mode
+        self._passthroughMimeTypes: Dict[str, str] = {}
+        self._passthroughCodecs: Dict[str, RtpCodecCapability] = {}
         self._videoTrack: VideoStreamTrack = None
         self._audioTrack: AudioStreamTrack = None
         self._tracks: list = []
@@ -36,13 +143,25 @@ class MultimediaRuntime:
         recvTransport and its consumers(include dataConsumers) part
         '''
         self._recvTransport: Transport = None
-        self._dataConsumers: list = []
-        self._consumers: list = []
+        # <dataConsumerId, DataConsumer>
+        self._dataConsumers: Dict[str, DataConsumer] = {}
+        # the consumers and their recorders, by consumerId and by peerId
+        self._consumerRegistry: ConsumerRegistry = ConsumerRegistry()
         self._autoConsume: bool = True
         self._canConsume: bool = True
         self._recordDirectoryPath = None
-        # self._recordFilePathGenerator:function
-        self._recorders: dict = {}
+        # kind -> one of RECORD_MODES
+        self._recordModes: Dict[str, str] = {'audio': 'transcode', 'video': 'transcode'}
+        # the pool encoding and writing the transcoded recordings off the event loop,
+        # None for MediaRecorder on the event loop
+        self._recordingPool: Optional[RecordingPool] = None
+        self._recordQueueSize: int = 30
+        self._recordDropPolicy: FrameDropPolicy = FrameDropPolicy.DROP_OLDEST
+        # function(mePeer, consumerId, producePeer, producerId, kind) -> (relativeDirectory, fileName, suffix)
+        self._recordFilePathGenerator: Callable[[Peer, str, Peer, str, str], tuple] = self._generateRecordFilePath
+        # split the recordings into segments of that many seconds or bytes, see RecordSegmenter
+        self._recordSegmentDuration: Optional[float] = None
+        self._recordSegmentSize: Optional[int] = None
 
     @property
     def autoProduce(self) -> bool:
@@ -61,38 +180,70 @@ class MultimediaRuntime:
         return self._canConsume
 
     def initializeProducerAndConsumerOptions(self, autoProduce: bool, mediaFilePath: str, autoConsume: bool,
-                                             recordDirectoryPath: str, recordFilePathGenerator):
+                                             recordDirectoryPath: str, recordFilePathGenerator,
+                                             passthrough: bool = False,
+                                             recordMode: Union[str, Dict[str, str]] = 'transcode',
+                                             recordingPool: Union[None, str, RecordingPool] = None,
+                                             recordQueueSize: int = 30,
+                                             recordDropPolicy: Union[str, FrameDropPolicy] = 'drop-oldest',
+                                             recordSegmentDuration: float = None, recordSegmentSize: int = None):
         """"""
         '''
         producer part
         '''
         self._autoProduce = autoProduce
         self._mediaFilePath = mediaFilePath
+        self._passthrough = passthrough
         self._canProduce = self._mediaFilePath is not None
         '''        
         consumer part 
         '''
         self._autoConsume = autoConsume
         self._recordDirectoryPath = recordDirectoryPath
-        # if recordFilePathGenerator:
-        #     self._recordFilePathGenerator = recordFilePathGenerator
-        # else:
-        #     self._recordFilePathGenerator = self._generateRecordFilePath
+        recordModes = recordMode if isinstance(recordMode, dict) else {'audio': recordMode, 'video': recordMode}
+        for kind, mode in recordModes.items():
+            if mode not in RECORD_MODES:
+                raise Exception(f'unknown record mode of {kind}: {mode}, supported modes: {", ".join(RECORD_MODES)}')
+        self._recordModes = {'audio': 'transcode', 'video': 'transcode', **recordModes}
+        self._recordingPool = getDefaultRecordingPool(recordingPool) if isinstance(recordingPool, str) \
+            else recordingPool
+        self._recordQueueSize = recordQueueSize
+        self._recordDropPolicy = FrameDropPolicy(recordDropPolicy)
+        self._recordFilePathGenerator = recordFilePathGenerator or self._generateRecordFilePath
+        self._recordSegmentDuration = recordSegmentDuration
+        self._recordSegmentSize = recordSegmentSize
         self._canConsume = self._recordDirectoryPath is not None
 
+    def setPlayerFactory(self, playerFactory: Callable[[str], MediaPlayer]):
+        """
+        :param playerFactory: function(mediaFilePath) returning an object with audio and video tracks(or None),
+            e.g. to share one decoded source among several runtimes, default is MediaPlayer
+        """
+        self._playerFactory = playerFactory
+
     def _preparePlayerEngine(self):
-        if self._mediaFilePath != '':
-            self._player = MediaPlayer(self._mediaFilePath)
+        if self._mediaFilePath != '' and self._passthrough:
+            self._passthroughMimeTypes = probeMediaCodecs(self._mediaFilePath)
+            # packets can not be shared by the player factory
+            self._player = MediaPlayer(self._mediaFilePath, decode=False)
+        elif self._mediaFilePath != '':
+            self._player = self._playerFactory(self._mediaFilePath)
         if self._player and self._player.video:
             self._videoTrack = self._player.video
+            if self._passthrough and self._passthroughMimeTypes.get('video') == 'video/H264':
+                annexBFilter = _openAnnexBFilter(self._mediaFilePath)
+                if annexBFilter is not None:
+                    self._videoTrack = AnnexBTrack(self._videoTrack, annexBFilter)
         elif self._mediaFilePath == '':
             self._videoTrack = VideoStreamTrack()
-        self._tracks.append(self._videoTrack)
+        if self._videoTrack:
+            self._tracks.append(self._videoTrack)
         if self._player and self._player.audio:
             self._audioTrack = self._player.audio
         elif self._mediaFilePath == '':
             self._audioTrack = AudioStreamTrack()
-        self._tracks.append(self._audioTrack)
+        if self._audioTrack:
+            self._tracks.append(self._audioTrack)
 
     async def loadDevice(self, routerRtpCapabilities: Union[RtpCapabilities, dict]):
         if len(self._tracks) == 0:
@@ -100,9 +251,21 @@ class MultimediaRuntime:
         self._device = Device(handlerFactory=AiortcHandler.createFactory(tracks=self._tracks))
         await self._device.load(routerRtpCapabilities)
         self._canProduce &= self._device.canProduce('audio') or self._device.canProduce('video')
+        self._passthroughCodecs = {kind: self._selectPassthroughCodec(kind, mimeType)
+                                   for kind, mimeType in self._passthroughMimeTypes.items()}
         # MediaBlackhole is always able to consume
         # self._canConsume = True
 
+    def _selectPassthroughCodec(self, kind: str, mimeType: str) -> RtpCodecCapability:
+        sendingCodecs = self._device.getSendingCodecs(kind)
+        codecs = [codec for codec in sendingCodecs if codec.mimeType.lower() == mimeType.lower()]
+        if not codecs:
+            raise Exception(f'{mimeType} of {self._mediaFilePath} is not negotiated with the router, '
+                            f'sending codecs: {[codec.mimeType for codec in sendingCodecs]}')
+        # aiortc packetizes H264 in non-interleaved mode
+        codecs.sort(key=lambda codec: codec.parameters.get('packetization-mode', 0) != 1)
+        return codecs[0]
+
     @property
     def rtpCapabilities(self) -> Optional[RtpCapabilities]:
         if self._device:
@@ -177,6 +340,7 @@ class MultimediaRuntime:
             videoProducer: Producer = await self._sendTransport.produce(
                 track=self._videoTrack,
                 stopTracks=False,
+                codec=self._passthroughCodecs.get('video'),
                 appData={}
             )
             self._producers.append(videoProducer)
@@ -184,6 +348,7 @@ class MultimediaRuntime:
             audioProducer: Producer = await self._sendTransport.produce(
                 track=self._audioTrack,
                 stopTracks=False,
+                codec=self._passthroughCodecs.get('audio'),
                 appData={}
             )
             self._producers.append(audioProducer)
@@ -200,32 +365,185 @@ class MultimediaRuntime:
             suffix = 'mp4'
         return roomId, f'{displayName}({peerId})_{kind}({consumerId})', suffix
 
-    async def consume(self, mePeer: Peer, consumerId: str,
-                      producePeer: Peer, producerId: str, kind: Literal['audio', 'video'], rtpParameters: dict):
-        recorder: Union[MediaBlackhole, MediaRecorder]
+    def _createRecorder(self, mePeer: Peer, consumerId: str, producePeer: Peer, producerId: str,
+                        kind: Literal['audio', 'video'], rtpParameters: dict) \
+            -> Union[MediaBlackhole, MediaRecorder, PooledMediaRecorder, SegmentedRecorder, EncodedRecorder]:
+        recorder: Union[MediaBlackhole, MediaRecorder, PooledMediaRecorder, SegmentedRecorder, EncodedRecorder]
         if self._recordDirectoryPath == '':
             recorder = MediaBlackhole()
         else:
-            relativeDirectory, fileName, suffix = self._generateRecordFilePath(mePeer, consumerId, producePeer,
-                                                                               producerId,
-                                                                               kind)
+            relativeDirectory, fileName, suffix = self._recordFilePathGenerator(mePeer, consumerId, producePeer,
+                                                                                producerId, kind)
+            recordMode = self._recordModes[kind]
+            mimeType = rtpParameters['codecs'][0]['mimeType']
+            if recordMode == 'container':
+                suffix = CONTAINER_SUFFIXES[CONTAINER_CODECS.get(mimeType.lower(), (None, 'matroska'))[1]]
+            elif recordMode == 'rtp':
+                suffix = 'rtp'
             recordFileParentPath = self._recordDirectoryPath + '/' + relativeDirectory
             if not os.path.exists(recordFileParentPath):
                 os.makedirs(recordFileParentPath)
             recordFilePath = recordFileParentPath + '/' + f'{fileName}.{suffix}'
-            recorder = MediaRecorder(file=recordFilePath)
-        self._recorders[producePeer.peerId] = {consumerId: recorder}
-
-        consumer: Consumer = await self._recvTransport.consume(
-            id=consumerId,
-            producerId=producerId,
-            kind=kind,
-            rtpParameters=rtpParameters
-        )
-        self._consumers.append(consumer)
-        recorder.addTrack(consumer.track)
+            segmenter = None
+            if self._recordSegmentDuration is not None or self._recordSegmentSize is not None:
+                segmenter = RecordSegmenter(recordFilePath, segmentDuration=self._recordSegmentDuration,
+                                            segmentSize=self._recordSegmentSize)
+            if recordMode == 'container':
+                recorder = EncodedFrameRecorder(file=recordFilePath, mimeType=mimeType, segmenter=segmenter)
+            elif recordMode == 'rtp':
+                recorder = RtpDumpRecorder(file=recordFilePath, kind=kind, rtpParameters=rtpParameters,
+                                           segmenter=segmenter)
+            elif segmenter is not None:
+                recorder = SegmentedRecorder(segmenter, self._createTranscodingRecorder)
+            else:
+                recorder = self._createTranscodingRecorder(recordFilePath)
+        self._consumerRegistry.add(consumerId, producePeer.peerId, producerId, kind, recorder)
+        return recorder
+
+    def _createTranscodingRecorder(self, file) -> Union[MediaRecorder, PooledMediaRecorder]:
+        """
+        :param file: path or SegmentFile
+        """
+        if self._recordingPool is None:
+            return MediaRecorder(file=file)
+        if self._recordingPool.mode == 'process' and not isinstance(file, str):
+            # the worker processes open the files themselves
+            file = file.name
+        return PooledMediaRecorder(file=file, pool=self._recordingPool, maxQueueSize=self._recordQueueSize,
+                                   dropPolicy=self._recordDropPolicy)
+
+    @staticmethod
+    def _attachRecorder(recorder: Union[MediaBlackhole, MediaRecorder, PooledMediaRecorder, SegmentedRecorder,
+                                        EncodedRecorder], consumer: Consumer):
+        if isinstance(recorder, EncodedRecorder):
+            # before the server resumes the consumer, so that no frame is decoded
+            recorder.addReceiver(consumer.rtpReceiver)
+        else:
+            recorder.addTrack(consumer.track)
+
+    def recorderStats(self) -> Dict[str, dict]:
+        """
+        :return: {consumerId: stats()} of the recorders on a recording pool or segmented
+        """
+        return {entry.consumerId: entry.recorder.stats() for entry in self._consumerRegistry
+                if isinstance(entry.recorder, (PooledMediaRecorder, SegmentedRecorder))}
+
+    def negotiationStats(self) -> Dict[str, dict]:
+        """
+        :return: {'send'|'recv': negotiationStats()} of the handlers of the transports created so far
+        """
+        return {direction: transport.handler.negotiationStats()
+                for direction, transport in (('send', self._sendTransport), ('recv', self._recvTransport))
+                if transport is not None}
+
+    @property
+    def consumerRegistry(self) -> ConsumerRegistry:
+        return self._consumerRegistry
+
+    async def closeConsumer(self, consumerId: str) -> bool:
+        """
+        release a consumer closed by the server: its transceiver and its recorder
+
+        :return: whether the consumer was still there
+        """
+        entry = self._consumerRegistry.remove(consumerId)
+        if entry is None:
+            return False
+        await self._releaseConsumer(entry)
+        return True
+
+    async def closePeerConsumers(self, peerId: str) -> int:
+        """
+        release the consumers of a closed peer
+
+        :return: number of released consumers
+        """
+        entries = self._consumerRegistry.removeByPeerId(peerId)
+        for entry in entries:
+            await self._releaseConsumer(entry)
+        return len(entries)
+
+    @staticmethod
+    async def _releaseConsumer(entry: ConsumerEntry):
+        # closing the consumer ends its track, then the recorder writes what it still has
+        try:
+            if entry.consumer is not None:
+                await entry.consumer.close()
+        except Exception as error:
+            logger.error('failed to close consumer(id=%s): %r', entry.consumerId, error)
+        await entry.recorder.stop()
+
+    async def closeDataConsumer(self, dataConsumerId: str) -> bool:
+        """
+        release a dataConsumer closed by the server: its data channel
+
+        :return: whether the dataConsumer was still there
+        """
+        dataConsumer = self._dataConsumers.pop(dataConsumerId, None)
+        if dataConsumer is None:
+            return False
+        try:
+            await dataConsumer.close()
+        except Exception as error:
+            logger.error('failed to close dataConsumer(id=%s): %r', dataConsumerId, error)
+        return True
+
+    async def consume(self, mePeer: Peer, consumerId: str,
+                      producePeer: Peer, producerId: str, kind: Literal['audio', 'video'], rtpParameters: dict):
+        recorder = self._createRecorder(mePeer, consumerId, producePeer, producerId, kind, rtpParameters)
+        try:
+            consumer: Consumer = await self._recvTransport.consume(
+                id=consumerId,
+                producerId=producerId,
+                kind=kind,
+                rtpParameters=rtpParameters
+            )
+        except Exception:
+            await self.closeConsumer(consumerId)
+            raise
+        self._consumerRegistry.get(consumerId).consumer = consumer
+        self._attachRecorder(recorder, consumer)
         await recorder.start()
 
+    async def consumeMany(self, mePeer: Peer, consumerInfos: List[dict]):
+        """
+        consume several producers within a single SDP negotiation
+
+        :param mePeer: current peer
+        :param consumerInfos:
+            [
+                {
+                    'consumerId': str,
+                    'producePeer': Peer,
+                    'producerId': str,
+                    'kind': 'audio' or 'video',
+                    'rtpParameters': dict
+                },
+                ...
+            ]
+        :return: None
+        """
+        recorders = [self._createRecorder(mePeer, info['consumerId'], info['producePeer'], info['producerId'],
+                                          info['kind'], info['rtpParameters'])
+                     for info in consumerInfos]
+        try:
+            consumers: List[Consumer] = await self._recvTransport.consumeMany([
+                {
+                    'id': info['consumerId'],
+                    'producerId': info['producerId'],
+                    'kind': info['kind'],
+                    'rtpParameters': info['rtpParameters']
+                } for info in consumerInfos
+            ])
+        except Exception:
+            for info in consumerInfos:
+                await self.closeConsumer(info['consumerId'])
+            raise
+        for consumer, recorder in zip(consumers, recorders):
+            self._consumerRegistry.get(consumer.id).consumer = consumer
+            self._attachRecorder(recorder, consumer)
+            await recorder.start()
+
     async def consumeData(self, dataConsumerId, dataProducerId, sctpStreamParameters, label, protocol, appData,
                           onMessageFunc):
         dataConsumer: DataConsumer = await self._recvTransport.consumeData(
@@ -236,17 +554,20 @@ class MultimediaRuntime:
             protocol=protocol,
             appData=appData
         )
-        self._dataConsumers.append(dataConsumer)
+        self._dataConsumers[dataConsumerId] = dataConsumer
 
         @dataConsumer.on('message')
         def onMessage(recvMessage):
             onMessageFunc(recvMessage)
 
     async def close(self, stopTaskLoopFunc):
-        for consumer in self._consumers:
-            await consumer.close()
-        for dataConsumer in self._dataConsumers:
+        entries = self._consumerRegistry.clear()
+        for entry in entries:
+            if entry.consumer is not None:
+                await entry.consumer.close()
+        for dataConsumer in self._dataConsumers.values():
             await dataConsumer.close()
+        self._dataConsumers.clear()
         for producer in self._producers:
             await producer.close()
 
@@ -257,9 +578,14 @@ class MultimediaRuntime:
         if self._recvTransport:
             await self._recvTransport.close()
 
-        for consumerIdToRecorderEntry in self._recorders.values():
-            for recorder in consumerIdToRecorderEntry.values():
-                await recorder.stop()
-
-        # no MediaPlayer.stop() api
-        # await self._player.stop()
+        for entry in entries:
+            await entry.recorder.stop()
+
+        # stopping the tracks stops the player, or releases the shared media source
+        for track in self._tracks:
+            if track is not None:
+                track.stop()
+        self._tracks = []
+        self._videoTrack = None
+        self._audioTrack = None
+        self._player = None
@@ -1,6 +1,9 @@
 import asyncio
 import logging
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from enum import Enum
+from typing import Dict, Optional, Tuple
 
 from smcdk.log import Logger
 from .mediasoup_listener import MediasoupListener
@@ -11,20 +14,229 @@ from .room_peer import Peer, PeerAppData
 logger = Logger.getLogger(__name__)
 
 
+class OverflowPolicy(Enum):
+    # never lose a notification, put() waits for room, put_nowait() accepts it beyond maxSize as overflowed,
+    # only for the producers which may wait, never for the server event loop(see QueuedNotificationListener)
+    BLOCK = 'block'
+    # discard the oldest pending notification to make room
+    DROP_OLDEST = 'drop-oldest'
+    # discard the incoming notification
+    DROP_NEWEST = 'drop-newest'
+    # keep only the latest notification per (method, key) of the coalesced methods,
+    # discard the oldest coalesced one to make room, other notifications are accepted as with BLOCK
+    COALESCE = 'coalesce'
+
+
+class NotificationQueue:
+    """
+    queue of Notification bounded by maxSize with an overflow policy, a newer coalesced notification
+    replaces the pending one of the same key in place, get() delivers at most maxRate notifications per second
+    """
+    # coalesced method -> data field identifying the notification's subject, None for a single subject
+    DEFAULT_KEY_FIELDS: Dict[str, Optional[str]] = {
+        MessageType.SERVER_NOTIFICATION_downlinkBwe.value: None,
+        MessageType.SERVER_NOTIFICATION_producerScore.value: 'producerId',
+        MessageType.SERVER_NOTIFICATION_consumerScore.value: 'consumerId'
+    }
+    # method closing a subject -> its data field, pending coalesced notifications of the subject are dropped
+    DEFAULT_CLOSE_FIELDS: Dict[str, str] = {
+        MessageType.SERVER_NOTIFICATION_consumerClosed.value: 'consumerId'
+    }
+    # max number of pending notifications by default
+    DEFAULT_MAX_SIZE: int = 1000
+
+    def __init__(self, maxSize: int = DEFAULT_MAX_SIZE, policy: OverflowPolicy = OverflowPolicy.BLOCK,
+                 maxRate: Optional[float] = None, keyFields: Dict[str, Optional[str]] = None,
+                 closeFields: Dict[str, str] = None):
+        """
+        :param maxSize: max number of pending notifications, 0 for no limit
+        :param policy: what to do with a notification arriving at a full queue
+        :param maxRate: max notifications delivered per second, None for no limit
+        :param keyFields: coalesced methods and their key field, default is DEFAULT_KEY_FIELDS
+        :param closeFields: closing methods and their key field, default is DEFAULT_CLOSE_FIELDS
+        """
+        self._maxSize: int = maxSize
+        self._policy: OverflowPolicy = OverflowPolicy(policy)
+        self._minInterval: float = 1 / maxRate if maxRate else 0
+        self._keyFields = NotificationQueue.DEFAULT_KEY_FIELDS if keyFields is None else dict(keyFields)
+        self._closeFields = NotificationQueue.DEFAULT_CLOSE_FIELDS if closeFields is None else dict(closeFields)
+        # (method, key) of coalesced notifications or a sequence number of the others -> Notification
+        self._entries: OrderedDict = OrderedDict()
+        self._sequence: int = 0
+        self._nonEmpty = asyncio.Event()
+        self._notFull = asyncio.Event()
+        self._notFull.set()
+        self._nextGetTime: float = 0
+        # the max depth ever reached
+        self.highWatermark: int = 0
+        # pending notifications replaced by a newer one of the same key
+        self.merged: int = 0
+        # notifications discarded by the overflow policy or since their subject was closed
+        self.dropped: int = 0
+        # notifications accepted beyond maxSize
+        self.overflowed: int = 0
+
+    @property
+    def policy(self) -> OverflowPolicy:
+        return self._policy
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxSize
+
+    def qsize(self) -> int:
+        return len(self._entries)
+
+    def empty(self) -> bool:
+        return not self._entries
+
+    def full(self) -> bool:
+        return 0 < self._maxSize <= len(self._entries)
+
+    def stats(self) -> dict:
+        return {'depth': len(self._entries), 'highWatermark': self.highWatermark, 'merged': self.merged,
+                'dropped': self.dropped, 'overflowed': self.overflowed}
+
+    def put_nowait(self, notification: Notification) -> bool:
+        """
+        never waits, whatever the policy
+
+        :return: False if the notification was discarded
+        """
+        method = notification.method
+        coalescing = self._policy is OverflowPolicy.COALESCE
+        if coalescing and method in self._keyFields:
+            keyField = self._keyFields[method]
+            key = (method, notification.data.get(keyField) if keyField is not None else None)
+            if key in self._entries:
+                self.merged += 1
+                self._entries[key] = notification
+                return True
+        else:
+            if coalescing and method in self._closeFields:
+                closeField = self._closeFields[method]
+                self._dropClosed(closeField, notification.data.get(closeField))
+            self._sequence += 1
+            key = self._sequence
+        if self.full():
+            if self._policy is OverflowPolicy.DROP_NEWEST:
+                self.dropped += 1
+                return False
+            if self._policy is OverflowPolicy.DROP_OLDEST:
+                self._entries.popitem(last=False)
+                self.dropped += 1
+            elif coalescing and self._dropOldestCoalesced():
+                self.dropped += 1
+            else:
+                self.overflowed += 1
+        self._entries[key] = notification
+        self.highWatermark = max(self.highWatermark, len(self._entries))
+        self._nonEmpty.set()
+        if self.full():
+            self._notFull.clear()
+        return True
+
+    async def put(self, notification: Notification) -> bool:
+        if self._policy is OverflowPolicy.BLOCK:
+            while self.full():
+                await self._notFull.wait()
+        return self.put_nowait(notification)
+
+    def get_nowait(self) -> Notification:
+        if not self._entries:
+            raise asyncio.QueueEmpty()
+        _, notification = self._entries.popitem(last=False)
+        if not self.full():
+            self._notFull.set()
+        return notification
+
+    async def get(self) -> Notification:
+        loop = asyncio.get_running_loop()
+        if self._minInterval:
+            delay = self._nextGetTime - loop.time()
+            # coalesced notifications arriving meanwhile are merged into the pending ones
+            if delay > 0:
+                await asyncio.sleep(delay)
+        while not self._entries:
+            self._nonEmpty.clear()
+            await self._nonEmpty.wait()
+        self._nextGetTime = loop.time() + self._minInterval
+        return self.get_nowait()
+
+    def _dropOldestCoalesced(self) -> bool:
+        for key in self._entries:
+            if isinstance(key, tuple):
+                del self._entries[key]
+                return True
+        return False
+
+    def _dropClosed(self, closeField: str, closedId):
+        for key in [key for key in self._entries
+                    if isinstance(key, tuple) and key[1] == closedId and self._keyFields[key[0]] == closeField]:
+            del self._entries[key]
+            self.dropped += 1
+
+
+# Its queue is fed by the server event loop with enqueueNowait(), which never
+# waits: the loop also reads the responses the listener may be waiting for.
+# So the queue never blocks(OverflowPolicy.BLOCK), it coalesces by default.
 class QueuedNotificationListener(MediasoupListener, metaclass=ABCMeta):
+    # the notification methods routed to this listener
+    METHODS: Tuple[str, ...] = ()
+    # overflow policy of the queue by default
+    DEFAULT_POLICY: OverflowPolicy = OverflowPolicy.COALESCE
 
     def __init__(self, mePeer: Peer):
         super(QueuedNotificationListener, self).__init__(mePeer)
-        self._notificationQueue: asyncio.Queue = None
+        self._notificationQueue: NotificationQueue = None
+        self._queueOptions: dict = {'policy': QueuedNotificationListener.DEFAULT_POLICY}
 
     def setQueue(self, notificationQueue):
         self._notificationQueue = notificationQueue
 
+    def setQueuePolicy(self, maxSize: int = NotificationQueue.DEFAULT_MAX_SIZE,
+                       policy: OverflowPolicy = DEFAULT_POLICY, maxRate: Optional[float] = None,
+                       keyFields: Dict[str, Optional[str]] = None, closeFields: Dict[str, str] = None):
+        """
+        bound the notification queue, takes effect from the next newQueue(),
+        see NotificationQueue for the arguments, but OverflowPolicy.BLOCK which would block the server event loop
+        """
+        if OverflowPolicy(policy) is OverflowPolicy.BLOCK:
+            raise Exception('the notification queue is fed by the server event loop, it can not block')
+        self._queueOptions = {'maxSize': maxSize, 'policy': policy, 'maxRate': maxRate, 'keyFields': keyFields,
+                              'closeFields': closeFields}
+
+    def setCoalescing(self, enabled: bool = True, maxRate: Optional[float] = None,
+                      keyFields: Dict[str, Optional[str]] = None, closeFields: Dict[str, str] = None,
+                      maxSize: int = NotificationQueue.DEFAULT_MAX_SIZE):
+        """
+        keep only the latest of the high frequency notifications per subject instead of each of them,
+        takes effect from the next newQueue(), see NotificationQueue for the arguments
+        """
+        if enabled:
+            self.setQueuePolicy(maxSize, OverflowPolicy.COALESCE, maxRate, keyFields, closeFields)
+        else:
+            self.setQueuePolicy(maxSize, OverflowPolicy.DROP_OLDEST, maxRate)
+
+    def newQueue(self) -> NotificationQueue:
+        """
+        :return: a new notification queue of the configured policy, to be passed to runLoop()
+        """
+        return NotificationQueue(**self._queueOptions)
+
     async def enqueue(self, message):
         # print('equeue: ', end=',')
         # print(asyncio.get_running_loop())
         await self._notificationQueue.put(Notification(None, message['method'], message['data']))
 
+    def enqueueNowait(self, message) -> bool:
+        """
+        enqueue without ever waiting, whatever the overflow policy, for the server event loop
+
+        :return: False if the notification was discarded
+        """
+        return self._notificationQueue.put_nowait(Notification(None, message['method'], message['data']))
+
     async def dequeue(self):
         # print('dequeue: ', end=',')
         # print(asyncio.get_running_loop())
@@ -34,6 +246,20 @@ class QueuedNotificationListener(MediasoupListener, metaclass=ABCMeta):
     def queueSize(self):
         return self._notificationQueue.qsize()
 
+    def mergedCount(self) -> int:
+        return getattr(self._notificationQueue, 'merged', 0)
+
+    def droppedCount(self) -> int:
+        return getattr(self._notificationQueue, 'dropped', 0)
+
+    def queueStats(self) -> dict:
+        """
+        depth, highWatermark, merged, dropped and overflowed counters of the current queue
+        """
+        if isinstance(self._notificationQueue, NotificationQueue):
+            return self._notificationQueue.stats()
+        return {'depth': self.queueSize(), 'highWatermark': None, 'merged': 0, 'dropped': 0, 'overflowed': 0}
+
     def resetQueue(self, notificationQueue):
         self._notificationQueue = notificationQueue
 
@@ -43,6 +269,8 @@ class QueuedNotificationListener(MediasoupListener, metaclass=ABCMeta):
 
 
 class BandwidthNotificationListener(QueuedNotificationListener):
+    METHODS = (MessageType.SERVER_NOTIFICATION_downlinkBwe.value,)
+
     def __init__(self, mePeer: Peer):
         super(BandwidthNotificationListener, self).__init__(mePeer)
 
@@ -63,6 +291,11 @@ class BandwidthNotificationListener(QueuedNotificationListener):
 
 
 class PeerNotificationListener(QueuedNotificationListener):
+    METHODS = (MessageType.SERVER_NOTIFICATION_activeSpeaker.value,
+               MessageType.SERVER_NOTIFICATION_newPeer.value,
+               MessageType.SERVER_NOTIFICATION_peerDisplayNameChanged.value,
+               MessageType.SERVER_NOTIFICATION_peerClosed.value)
+
     def __init__(self, mePeer: Peer):
         super(PeerNotificationListener, self).__init__(mePeer)
 
@@ -105,6 +338,8 @@ class PeerNotificationListener(QueuedNotificationListener):
 
 
 class ProducerNotificationListener(QueuedNotificationListener):
+    METHODS = (MessageType.SERVER_NOTIFICATION_producerScore.value,)
+
     def __init__(self, mePeer: Peer):
         super(ProducerNotificationListener, self).__init__(mePeer)
 
@@ -125,6 +360,12 @@ class ProducerNotificationListener(QueuedNotificationListener):
 
 
 class ConsumerNotificationListener(QueuedNotificationListener):
+    METHODS = (MessageType.SERVER_NOTIFICATION_consumerScore.value,
+               MessageType.SERVER_NOTIFICATION_consumerLayersChanged.value,
+               MessageType.SERVER_NOTIFICATION_consumerPaused.value,
+               MessageType.SERVER_NOTIFICATION_consumerResumed.value,
+               MessageType.SERVER_NOTIFICATION_consumerClosed.value)
+
     def __init__(self, mePeer: Peer):
         super(ConsumerNotificationListener, self).__init__(mePeer)
 
@@ -145,6 +386,7 @@ class ConsumerNotificationListener(QueuedNotificationListener):
                 await self.onConsumerResumed(message, otherPeer)
             elif message.method == MessageType.SERVER_NOTIFICATION_consumerClosed.value:
                 await self.onConsumerClosed(message, otherPeer)
+                self.mePeer.room.unbindConsumerIdToPeer(message.data['consumerId'], otherPeer)
             else:
                 pass
 
@@ -166,6 +408,8 @@ class ConsumerNotificationListener(QueuedNotificationListener):
 
 
 class DataConsumerNotificationListener(QueuedNotificationListener):
+    METHODS = (MessageType.SERVER_NOTIFICATION_dataConsumerClosed.value,)
+
     def __init__(self, mePeer: Peer):
         super(DataConsumerNotificationListener, self).__init__(mePeer)
 
@@ -178,6 +422,7 @@ class DataConsumerNotificationListener(QueuedNotificationListener):
             if message.method == MessageType.SERVER_NOTIFICATION_dataConsumerClosed.value:
                 otherPeer = self.mePeer.room.getPeerByDataConsumerId(message.data['dataConsumerId'])
                 await self.onDataConsumerClosed(message, otherPeer)
+                self.mePeer.room.unbindDataConsumerIdToPeer(message.data['dataConsumerId'], otherPeer)
             else:
                 pass
 
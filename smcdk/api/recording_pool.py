@@ -0,0 +1,430 @@
+import asyncio
+import collections
+import itertools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import Enum
+from multiprocessing.connection import Connection
+from typing import Deque, Dict, List, Optional, Tuple, Union
+
+import av
+from aiortc import MediaStreamTrack
+from aiortc.mediastreams import MediaStreamError
+
+from smcdk.log import Logger
+
+# logger of module level
+logger = Logger.getLogger(__name__)
+
+
+class FrameDropPolicy(Enum):
+    # drop the oldest queued frame to make room for the new one
+    DROP_OLDEST = 'drop-oldest'
+    # drop the new frame
+    DROP_NEWEST = 'drop-newest'
+
+
+class _RecordingWriter:
+    """
+    the encoding and muxing part of aiortc's MediaRecorder, run off the event loop
+    """
+
+    def __init__(self, file: str, format: Optional[str], options: Optional[dict], kinds: List[str]):
+        self._container = av.open(file=file, format=format, mode='w', options=options)
+        self._streams = {}
+        self._started = set()
+        formatName = self._container.format.name
+        for kind in kinds:
+            if kind == 'audio':
+                if formatName in ('wav', 'alsa', 'pulse'):
+                    codecName = 'pcm_s16le'
+                elif formatName == 'mp3':
+                    codecName = 'mp3'
+                elif formatName in ('ogg', 'opus', 'webm'):
+                    codecName = 'libopus'
+                else:
+                    codecName = 'aac'
+                self._streams[kind] = self._container.add_stream(codecName)
+            else:
+                if formatName == 'image2':
+                    stream = self._container.add_stream('png', rate=30)
+                    stream.pix_fmt = 'rgb24'
+                elif formatName == 'webm':
+                    stream = self._container.add_stream('libvpx', rate=30)
+                    stream.pix_fmt = 'yuv420p'
+                else:
+                    stream = self._container.add_stream('libx264', rate=30)
+                    stream.pix_fmt = 'yuv420p'
+                self._streams[kind] = stream
+
+    def write(self, kind: str, frame: Union[av.AudioFrame, av.VideoFrame]):
+        stream = self._streams[kind]
+        if kind not in self._started:
+            # adjust the output size to match the first frame
+            if kind == 'video':
+                stream.width = frame.width
+                stream.height = frame.height
+            self._started.add(kind)
+        for packet in stream.encode(frame):
+            self._container.mux(packet)
+
+    def close(self):
+        for kind in self._started:
+            for packet in self._streams[kind].encode(None):
+                self._container.mux(packet)
+        self._container.close()
+
+
+def _dumpFrame(frame: Union[av.AudioFrame, av.VideoFrame]) -> tuple:
+    """
+    :return: a picklable state of the frame, see _loadFrame()
+    """
+    if isinstance(frame, av.VideoFrame):
+        if frame.format.name != 'yuv420p':
+            frame = frame.reformat(format='yuv420p')
+        planes = [b''.join(bytes(memoryview(plane)[row * plane.line_size:row * plane.line_size + plane.width])
+                           for row in range(plane.height)) for plane in frame.planes]
+        return 'video', frame.width, frame.height, planes, frame.pts, frame.time_base
+    numBytes = frame.samples * frame.format.bytes * (1 if frame.format.is_planar else len(frame.layout.channels))
+    planes = [bytes(memoryview(plane)[:numBytes]) for plane in frame.planes]
+    return 'audio', frame.format.name, frame.layout.name, frame.samples, frame.sample_rate, planes, frame.pts, \
+        frame.time_base
+
+
+def _loadFrame(state: tuple) -> Union[av.AudioFrame, av.VideoFrame]:
+    if state[0] == 'video':
+        _, width, height, planes, pts, timeBase = state
+        frame = av.VideoFrame(width, height, 'yuv420p')
+        for plane, data in zip(frame.planes, planes):
+            padding = b'\x00' * (plane.line_size - plane.width)
+            plane.update(b''.join(data[row * plane.width:(row + 1) * plane.width] + padding
+                                  for row in range(plane.height)) + bytes(plane.buffer_size
+                                                                          - plane.line_size * plane.height))
+    else:
+        _, formatName, layoutName, samples, sampleRate, planes, pts, timeBase = state
+        frame = av.AudioFrame(format=formatName, layout=layoutName, samples=samples)
+        frame.sample_rate = sampleRate
+        for plane, data in zip(frame.planes, planes):
+            plane.update(data + bytes(plane.buffer_size - len(data)))
+    frame.pts = pts
+    frame.time_base = timeBase
+    return frame
+
+
+def _recordingWorkerMain(conn: Connection):
+    # recorderId -> writer, the recorders with a failed writer are kept with their error
+    writers: Dict[int, _RecordingWriter] = {}
+    errors: Dict[int, str] = {}
+    while True:
+        try:
+            command = conn.recv()
+        except (EOFError, OSError):
+            break
+        if command is None:
+            break
+        operation, recorderId, *args = command
+        try:
+            if recorderId in errors and operation != 'close':
+                continue
+            if operation == 'open':
+                writers[recorderId] = _RecordingWriter(*args)
+            elif operation == 'write':
+                kind, frameState = args
+                writers[recorderId].write(kind, _loadFrame(frameState))
+            elif operation == 'close':
+                writer = writers.pop(recorderId, None)
+                if writer is not None:
+                    writer.close()
+                conn.send((recorderId, errors.pop(recorderId, None)))
+        except Exception as error:
+            writers.pop(recorderId, None)
+            errors[recorderId] = repr(error)
+            if operation == 'close':
+                conn.send((recorderId, errors.pop(recorderId)))
+    for writer in writers.values():
+        writer.close()
+
+
+class _RecordingWorker:
+    """
+    a process running the writers of the recorders assigned to it, fed over a pipe
+    """
+
+    def __init__(self, index: int, context):
+        parentConn, childConn = context.Pipe()
+        self.process = context.Process(target=_recordingWorkerMain, args=(childConn,),
+                                       name=f'RecordingWorker-{index}', daemon=True)
+        self.process.start()
+        childConn.close()
+        self.conn: Connection = parentConn
+        self.numRecorders: int = 0
+        # several pool threads may send at the same time
+        self._sendLock = threading.Lock()
+        # recorderId -> future of the close acknowledgment
+        self._pendingCloses: Dict[int, Future] = {}
+        threading.Thread(target=self._readAcks, name=f'RecordingWorkerReader-{index}', daemon=True).start()
+
+    def send(self, command: tuple):
+        with self._sendLock:
+            self.conn.send(command)
+
+    def close(self, recorderId: int, timeout: float) -> Optional[str]:
+        future = self._pendingCloses[recorderId] = Future()
+        self.send(('close', recorderId))
+        return future.result(timeout)
+
+    def _readAcks(self):
+        while True:
+            try:
+                recorderId, error = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            future = self._pendingCloses.pop(recorderId, None)
+            if future is not None:
+                future.set_result(error)
+        for future in list(self._pendingCloses.values()):
+            future.set_exception(Exception('recording worker has exited'))
+
+    def stop(self, timeout: float):
+        try:
+            self.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class _RemoteWriter:
+    """
+    a writer running in a recording worker process, the frames are sent over its pipe
+    """
+    _recorderIds = itertools.count(1)
+
+    def __init__(self, worker: _RecordingWorker, file: str, format: Optional[str], options: Optional[dict],
+                 kinds: List[str], closeTimeout: float):
+        self._worker = worker
+        self._recorderId = next(_RemoteWriter._recorderIds)
+        self._closeTimeout = closeTimeout
+        worker.numRecorders += 1
+        worker.send(('open', self._recorderId, os.path.abspath(file), format, options, kinds))
+
+    def write(self, kind: str, frame: Union[av.AudioFrame, av.VideoFrame]):
+        self._worker.send(('write', self._recorderId, kind, _dumpFrame(frame)))
+
+    def close(self):
+        self._worker.numRecorders -= 1
+        error = self._worker.close(self._recorderId, self._closeTimeout)
+        if error is not None:
+            raise Exception(error)
+
+
+class RecordingPool:
+    """
+    runs the encoding and the file writes of PooledMediaRecorder instances off the event loop:
+    on a pool of threads, or on worker processes each owning the files of the recorders assigned to it
+    """
+
+    def __init__(self, mode: str = 'thread', numWorkers: int = None, startMethod: str = 'spawn',
+                 closeTimeout: float = 30):
+        """
+        :param mode: 'thread' or 'process'
+        :param numWorkers: number of threads or processes, default is the number of CPUs
+        :param startMethod: multiprocessing start method of the worker processes
+        :param closeTimeout: max seconds to wait for a worker process to close a recording
+        """
+        if mode not in ('thread', 'process'):
+            raise Exception(f'unknown recording pool mode: {mode}')
+        self._mode: str = mode
+        self._numWorkers: int = numWorkers or os.cpu_count() or 1
+        self._startMethod: str = startMethod
+        self._closeTimeout: float = closeTimeout
+        # in process mode, its threads only send the frames to the worker processes
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._workers: List[_RecordingWorker] = []
+        self._lock = threading.Lock()
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._numWorkers, thread_name_prefix='Recording')
+            return self._executor
+
+    def createWriter(self, file: str, format: Optional[str], options: Optional[dict], kinds: List[str]):
+        """
+        called on a thread of the executor
+        """
+        if self._mode == 'thread':
+            return _RecordingWriter(file, format, options, kinds)
+        with self._lock:
+            if not self._workers:
+                context = multiprocessing.get_context(self._startMethod)
+                self._workers = [_RecordingWorker(index, context) for index in range(self._numWorkers)]
+            worker = min(self._workers, key=lambda worker: worker.numRecorders)
+            return _RemoteWriter(worker, file, format, options, kinds, self._closeTimeout)
+
+    def shutdown(self):
+        """
+        the recorders must be stopped before
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+            for worker in self._workers:
+                worker.stop(self._closeTimeout)
+            self._workers = []
+
+
+# the process-wide pools of each mode, created on first use
+_defaultRecordingPools: Dict[str, RecordingPool] = {}
+
+
+def getDefaultRecordingPool(mode: str) -> RecordingPool:
+    pool = _defaultRecordingPools.get(mode)
+    if pool is None:
+        pool = _defaultRecordingPools[mode] = RecordingPool(mode)
+    return pool
+
+
+class PooledMediaRecorder:
+    """
+    a drop-in replacement of aiortc's MediaRecorder encoding and writing on a RecordingPool:
+    the frames received on the event loop are queued, up to maxQueueSize per recorder,
+    and written by a single pool job at a time, when the queue is full a frame is dropped instead of
+    stalling the loop
+    """
+
+    def __init__(self, file: str, format: str = None, options: dict = None, pool: RecordingPool = None,
+                 maxQueueSize: int = 30, dropPolicy: Union[FrameDropPolicy, str] = FrameDropPolicy.DROP_OLDEST):
+        """
+        :param pool: default is the process-wide thread pool
+        :param maxQueueSize: max frames queued for the pool
+        :param dropPolicy: which frame to drop when the queue is full
+        """
+        self._file = file
+        self._format = format
+        self._options = options
+        self._pool: RecordingPool = pool or getDefaultRecordingPool('thread')
+        self._maxQueueSize: int = maxQueueSize
+        self._dropPolicy: FrameDropPolicy = FrameDropPolicy(dropPolicy)
+        self._tracks: List[MediaStreamTrack] = []
+        self._tasks: List[asyncio.Task] = []
+        self._writer = None
+        self._error: Optional[BaseException] = None
+        # (kind, frame) queued for the pool, appended on the loop and popped by the pool job
+        self._queue: Deque[Tuple[str, Union[av.AudioFrame, av.VideoFrame]]] = collections.deque()
+        # guards the queue state shared with the pool threads and serializes the writer
+        self._queueLock = threading.Lock()
+        self._writerLock = threading.Lock()
+        self._draining: bool = False
+        self._stopped: bool = False
+        self.maxQueueDepth: int = 0
+        self.droppedFrames: int = 0
+        self.writtenFrames: int = 0
+
+    def addTrack(self, track: MediaStreamTrack):
+        self._tracks.append(track)
+
+    async def start(self):
+        if self._tasks:
+            return
+        kinds = sorted({track.kind for track in self._tracks})
+        self._writer = await asyncio.get_running_loop().run_in_executor(
+            self._pool.executor, self._pool.createWriter, self._file, self._format, self._options, kinds)
+        self._tasks = [asyncio.ensure_future(self._runTrack(track)) for track in self._tracks]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._writer is not None and not self._stopped:
+            self._stopped = True
+            # after the frames still queued
+            await asyncio.get_running_loop().run_in_executor(self._pool.executor, self._close)
+
+    @property
+    def queueDepth(self) -> int:
+        return len(self._queue)
+
+    def stats(self) -> dict:
+        """
+        :return: {'queueDepth', 'maxQueueDepth', 'droppedFrames', 'writtenFrames', 'error'}
+        """
+        return {
+            'queueDepth': len(self._queue),
+            'maxQueueDepth': self.maxQueueDepth,
+            'droppedFrames': self.droppedFrames,
+            'writtenFrames': self.writtenFrames,
+            'error': repr(self._error) if self._error is not None else None
+        }
+
+    async def _runTrack(self, track: MediaStreamTrack):
+        while True:
+            try:
+                frame = await track.recv()
+            except MediaStreamError:
+                return
+            self._enqueue(track.kind, frame)
+
+    def _enqueue(self, kind: str, frame):
+        with self._queueLock:
+            if self._stopped or self._error is not None:
+                return
+            if len(self._queue) >= self._maxQueueSize:
+                self.droppedFrames += 1
+                if self._dropPolicy == FrameDropPolicy.DROP_NEWEST:
+                    return
+                self._queue.popleft()
+            self._queue.append((kind, frame))
+            self.maxQueueDepth = max(self.maxQueueDepth, len(self._queue))
+            if self._draining:
+                return
+            self._draining = True
+        self._pool.executor.submit(self._drain)
+
+    def _drain(self):
+        while not self._writeNext(stopDraining=True):
+            pass
+
+    def _writeNext(self, stopDraining: bool) -> bool:
+        """
+        pop and write the next frame, within the writer lock so that the frames are written in order
+
+        :return: whether the queue was empty
+        """
+        with self._writerLock:
+            with self._queueLock:
+                if not self._queue:
+                    if stopDraining:
+                        self._draining = False
+                    return True
+                kind, frame = self._queue.popleft()
+            if self._error is not None:
+                return False
+            try:
+                self._writer.write(kind, frame)
+                self.writtenFrames += 1
+            except Exception as error:
+                self._error = error
+                logger.error('failed to record into %s, stop recording: %r', self._file, error)
+            return False
+
+    def _close(self):
+        while not self._writeNext(stopDraining=False):
+            pass
+        with self._writerLock:
+            try:
+                self._writer.close()
+            except Exception as error:
+                self._error = self._error or error
+                logger.error('failed to close the recording %s: %r', self._file, error)
@@ -144,23 +144,23 @@ class Room:
     def getPeerByProducerId(self, producerId: str) -> Peer:
         return self._producerIdToPeerMap[producerId]
 
-    def getPeerByConsumerId(self, consumerId: str) -> Peer:
-        return self._consumerIdToPeerMap[consumerId]
+    def getPeerByConsumerId(self, consumerId: str) -> Optional[Peer]:
+        return self._consumerIdToPeerMap.get(consumerId)
 
     def bindConsumerIdToPeer(self, consumerId: str, peer: Peer):
         self._consumerIdToPeerMap[consumerId] = peer
 
-    def unbindConsumerIdToPeer(self, consumerId: str, peer: Peer):
-        del self._consumerIdToPeerMap[consumerId]
+    def unbindConsumerIdToPeer(self, consumerId: str, peer: Peer = None):
+        self._consumerIdToPeerMap.pop(consumerId, None)
 
-    def getPeerByDataConsumerId(self, dataConsumerId: str) -> Peer:
-        return self._dataConsumerIdToPeerMap[dataConsumerId]
+    def getPeerByDataConsumerId(self, dataConsumerId: str) -> Optional[Peer]:
+        return self._dataConsumerIdToPeerMap.get(dataConsumerId)
 
     def bindDataConsumerIdToPeer(self, consumerId: str, peer: Peer):
         self._dataConsumerIdToPeerMap[consumerId] = peer
 
-    def unbindDataConsumerIdToPeer(self, consumerId: str, peer: Peer):
-        del self._dataConsumerIdToPeerMap[consumerId]
+    def unbindDataConsumerIdToPeer(self, consumerId: str, peer: Peer = None):
+        self._dataConsumerIdToPeerMap.pop(consumerId, None)
 
     def getPeerByPeerId(self, peerId: str) -> Optional[Peer]:
         if self._peerIdToPeerMap.get(peerId):
@@ -176,10 +176,8 @@ class Room:
         self._peerIdToPeerMap[peerId] = newPeer
         return newPeer
 
-    def removePeer(self, peerId: str):
-        toRemovePeer = self._peerIdToPeerMap[peerId]
-        del self._peerIdToPeerMap[peerId]
-        return toRemovePeer
+    def removePeer(self, peerId: str) -> Optional[Peer]:
+        return self._peerIdToPeerMap.pop(peerId, None)
 
     def __str__(self):
         return 'Room(' \
@@ -0,0 +1,379 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+
+from aiortc import MediaStreamTrack
+
+from smcdk.log import Logger
+
+# logger of module level
+logger = Logger.getLogger(__name__)
+
+
+class RecordFileLimiter:
+    """
+    bounds the number of recording files open at the same time: a SegmentFile only holds an OS file
+    between its open and close calls of a flush, the flushes beyond maxOpenFiles wait for a slot
+    """
+
+    def __init__(self, maxOpenFiles: int = 64, fsyncInterval: float = 5):
+        """
+        :param maxOpenFiles: max files open at the same time
+        :param fsyncInterval: min seconds between two fsync of a file, the closing flush is always synced
+        """
+        self._maxOpenFiles: int = maxOpenFiles
+        self.fsyncInterval: float = fsyncInterval
+        self._condition = threading.Condition()
+        self._openFiles: int = 0
+        self.maxOpenFilesReached: int = 0
+        self.flushes: int = 0
+        self.fsyncs: int = 0
+
+    @property
+    def maxOpenFiles(self) -> int:
+        return self._maxOpenFiles
+
+    @maxOpenFiles.setter
+    def maxOpenFiles(self, maxOpenFiles: int):
+        with self._condition:
+            self._maxOpenFiles = maxOpenFiles
+            self._condition.notify_all()
+
+    @property
+    def openFiles(self) -> int:
+        return self._openFiles
+
+    def acquire(self):
+        with self._condition:
+            while self._openFiles >= self._maxOpenFiles:
+                self._condition.wait()
+            self._openFiles += 1
+            self.maxOpenFilesReached = max(self.maxOpenFilesReached, self._openFiles)
+
+    def release(self):
+        with self._condition:
+            self._openFiles -= 1
+            self._condition.notify()
+
+    def stats(self) -> dict:
+        return {
+            'openFiles': self._openFiles,
+            'maxOpenFiles': self._maxOpenFiles,
+            'maxOpenFilesReached': self.maxOpenFilesReached,
+            'flushes': self.flushes,
+            'fsyncs': self.fsyncs
+        }
+
+
+# The process-wide limiter shared by the SegmentFile of every recording
+recordFileLimiter = RecordFileLimiter()
+# The process-wide threads flushing the SegmentFile of the segmented recordings and writing their manifests,
+# so that neither the fsync nor the wait for a slot of the limiter ever blocks the event loop
+recordFileExecutor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='smcdk-record-file')
+
+
+class SegmentFile:
+    """
+    a seekable, write-only file object for av.open() and the recorders, buffering the writes in memory:
+    the buffer is written to disk, within a slot of the RecordFileLimiter, once it reaches flushSize bytes
+    or is older than flushInterval seconds, the writes before the flushed end(e.g. a muxer patching its header)
+    are applied on the next flush
+    """
+
+    def __init__(self, name: str, flushSize: int = 1 << 20, flushInterval: float = 1,
+                 limiter: RecordFileLimiter = None, executor: Executor = None):
+        """
+        :param executor: runs the flushes one after another instead of the writing thread, None to flush in place
+        """
+        self.name: str = name
+        self.mode: str = 'wb'
+        self._flushSize: int = flushSize
+        self._flushInterval: float = flushInterval
+        self._limiter: RecordFileLimiter = limiter or recordFileLimiter
+        # bytes from _flushedSize on, not on disk yet
+        self._buffer = bytearray()
+        self._flushedSize: int = 0
+        # (offset, data) written before _flushedSize
+        self._patches: list = []
+        self._position: int = 0
+        self._created: bool = False
+        self._lastFlushTime: float = time.monotonic()
+        self._lastFsyncTime: float = time.monotonic()
+        # flushed without fsync since
+        self._unsynced: bool = False
+        self._executor: Optional[Executor] = executor
+        # the last flush run by the executor, the next one waits for it
+        self._lastFlush: Optional[Future] = None
+        # the error of a flush run by the executor, raised to the writer
+        self._error: Optional[Exception] = None
+        self.closed: bool = False
+
+    @property
+    def size(self) -> int:
+        return self._flushedSize + len(self._buffer)
+
+    def readable(self) -> bool:
+        return False
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self._position = offset
+        return self._position
+
+    def write(self, data) -> int:
+        if self._error is not None:
+            raise self._error
+        data = bytes(data)
+        position = self._position
+        if position < self._flushedSize:
+            head = data[:self._flushedSize - position]
+            self._patches.append((position, head))
+            data = data[len(head):]
+            position += len(head)
+        if data:
+            offset = position - self._flushedSize
+            if offset > len(self._buffer):
+                self._buffer.extend(bytes(offset - len(self._buffer)))
+            self._buffer[offset:offset + len(data)] = data
+            position += len(data)
+        written = position - self._position
+        self._position = position
+        if len(self._buffer) >= self._flushSize or time.monotonic() - self._lastFlushTime >= self._flushInterval:
+            self._flush(sync=False)
+        return written
+
+    def flush(self):
+        pass
+
+    def close(self) -> Optional[Future]:
+        """
+        :return: the future of the closing flush if run by the executor, else None once flushed
+        """
+        if self.closed:
+            return self._lastFlush
+        self._flush(sync=True)
+        self.closed = True
+        return self._lastFlush
+
+    def _flush(self, sync: bool):
+        self._lastFlushTime = time.monotonic()
+        buffer, patches, offset = bytes(self._buffer), self._patches, self._flushedSize
+        self._flushedSize += len(buffer)
+        self._buffer.clear()
+        self._patches = []
+        if self._executor is None:
+            self._writeToDisk(buffer, patches, offset, sync, self._lastFlushTime)
+        else:
+            self._lastFlush = self._executor.submit(self._writeToDiskAfter, self._lastFlush, buffer, patches, offset,
+                                                    sync, self._lastFlushTime)
+
+    def _writeToDiskAfter(self, previousFlush: Optional[Future], buffer: bytes, patches: list, offset: int,
+                          sync: bool, flushTime: float):
+        # the executor runs the flushes in the order they were submitted, the previous one already runs
+        if previousFlush is not None:
+            wait([previousFlush])
+        if self._error is not None:
+            return
+        try:
+            self._writeToDisk(buffer, patches, offset, sync, flushTime)
+        except Exception as error:
+            logger.error('failed to flush %s: %r', self.name, error)
+            self._error = error
+
+    def _writeToDisk(self, buffer: bytes, patches: list, offset: int, sync: bool, flushTime: float):
+        # a file never written is not even created, e.g. when written by a recording worker process instead
+        if not buffer and not patches and not (sync and self._unsynced):
+            return
+        sync = sync or flushTime - self._lastFsyncTime >= self._limiter.fsyncInterval
+        self._limiter.acquire()
+        try:
+            with open(self.name, 'r+b' if self._created else 'wb') as file:
+                self._created = True
+                for patchOffset, data in patches:
+                    file.seek(patchOffset)
+                    file.write(data)
+                file.seek(offset)
+                file.write(buffer)
+                file.flush()
+                if sync:
+                    os.fsync(file.fileno())
+                    self._lastFsyncTime = flushTime
+                    self._limiter.fsyncs += 1
+                self._unsynced = not sync
+        finally:
+            self._limiter.release()
+        self._limiter.flushes += 1
+
+
+class RecordSegmenter:
+    """
+    splits a recording file, e.g. dir/name.mp4, into segments dir/name.00000.mp4, dir/name.00001.mp4...
+    listed by a manifest dir/name.manifest.json, rewritten as each segment ends:
+        {
+            'segments': [{'file': str, 'startTime': float, 'endTime': float, 'bytes': int}, ...],
+            'complete': bool, whether the recording was stopped
+        }
+    the segment files are flushed, closed and listed by the executor, never by the caller's thread
+    """
+
+    def __init__(self, filePath: str, segmentDuration: float = None, segmentSize: int = None,
+                 limiter: RecordFileLimiter = None, executor: Executor = None):
+        """
+        :param segmentDuration: seconds per segment, None for no time limit
+        :param segmentSize: bytes per segment, None for no size limit
+        :param executor: default is recordFileExecutor
+        """
+        self._basePath, self._suffix = os.path.splitext(filePath)
+        self.manifestPath: str = f'{self._basePath}.manifest.json'
+        self._segmentDuration: Optional[float] = segmentDuration
+        self._segmentSize: Optional[int] = segmentSize
+        self._limiter: RecordFileLimiter = limiter or recordFileLimiter
+        self._executor: Executor = executor or recordFileExecutor
+        self._file: Optional[SegmentFile] = None
+        self._startTime: float = 0
+        self.segments: List[dict] = []
+        # the last manifest write, the next one waits for it
+        self._lastManifestWrite: Optional[Future] = None
+
+    def openSegment(self) -> SegmentFile:
+        """
+        end the current segment if any, and open the next one, without waiting for the former to be closed
+        """
+        self._closeSegment(complete=False)
+        self._file = SegmentFile(f'{self._basePath}.{len(self.segments):05d}{self._suffix}', limiter=self._limiter,
+                                 executor=self._executor)
+        self._startTime = time.time()
+        return self._file
+
+    def shouldRotate(self) -> bool:
+        if self._file is None:
+            return False
+        if self._segmentDuration is not None and time.time() - self._startTime >= self._segmentDuration:
+            return True
+        return self._segmentSize is not None and self.bytesWritten() >= self._segmentSize
+
+    def bytesWritten(self) -> int:
+        """
+        bytes of the current segment, written through its SegmentFile or by another process to its path
+        """
+        if self._file is None:
+            return 0
+        if self._file.size or not os.path.exists(self._file.name):
+            return self._file.size
+        return os.path.getsize(self._file.name)
+
+    async def close(self):
+        """
+        end the current segment if any, and wait until every segment is closed and the manifest complete
+        """
+        if self._file is not None:
+            self._closeSegment(complete=True)
+        else:
+            self._submitManifestWrite(None, complete=True)
+        await asyncio.wrap_future(self._lastManifestWrite)
+
+    def _closeSegment(self, complete: bool):
+        if self._file is None:
+            return
+        size = self.bytesWritten()
+        closing = self._file.close()
+        self.segments.append({'file': os.path.basename(self._file.name), 'startTime': self._startTime,
+                              'endTime': time.time(), 'bytes': size})
+        self._file = None
+        self._submitManifestWrite(closing, complete)
+
+    def _submitManifestWrite(self, closing: Optional[Future], complete: bool):
+        self._lastManifestWrite = self._executor.submit(self._writeManifestAfter, self._lastManifestWrite, closing,
+                                                        list(self.segments), complete)
+
+    def _writeManifestAfter(self, previousWrite: Optional[Future], closing: Optional[Future], segments: List[dict],
+                            complete: bool):
+        # submitted after the previous write and the closing flush, which already run
+        wait([future for future in (previousWrite, closing) if future is not None])
+        try:
+            # replaced at once, so that a crash leaves either manifest
+            temporaryPath = f'{self.manifestPath}.tmp'
+            with open(temporaryPath, 'w', encoding='utf-8') as file:
+                json.dump({'segments': segments, 'complete': complete}, file, indent=2)
+            os.replace(temporaryPath, self.manifestPath)
+        except Exception as error:
+            logger.error('failed to write %s: %r', self.manifestPath, error)
+
+
+class SegmentedRecorder:
+    """
+    records tracks into the segments of a RecordSegmenter, a new recorder per segment(e.g. MediaRecorder),
+    rotated as soon as the segmenter says so: the frames received meanwhile wait in the tracks
+    """
+
+    def __init__(self, segmenter: RecordSegmenter, recorderFactory: Callable[[SegmentFile], object],
+                 checkInterval: float = 1):
+        """
+        :param recorderFactory: function(segment file) returning a recorder with addTrack(), start() and stop()
+        :param checkInterval: seconds between two checks of the segmenter
+        """
+        self._segmenter = segmenter
+        self._recorderFactory = recorderFactory
+        self._checkInterval: float = checkInterval
+        self._tracks: List[MediaStreamTrack] = []
+        self._recorder = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def segmenter(self) -> RecordSegmenter:
+        return self._segmenter
+
+    def addTrack(self, track: MediaStreamTrack):
+        self._tracks.append(track)
+
+    async def start(self):
+        if self._recorder is not None:
+            return
+        await self._startSegment()
+        self._task = asyncio.ensure_future(self._rotate())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._recorder is not None:
+            await self._recorder.stop()
+            self._recorder = None
+            await self._segmenter.close()
+
+    def stats(self) -> dict:
+        """
+        :return: stats() of the current recorder if any, with the number of segments
+        """
+        stats = self._recorder.stats() if hasattr(self._recorder, 'stats') else {}
+        return {**stats, 'segments': len(self._segmenter.segments) + int(self._recorder is not None)}
+
+    async def _startSegment(self):
+        self._recorder = self._recorderFactory(self._segmenter.openSegment())
+        for track in self._tracks:
+            self._recorder.addTrack(track)
+        await self._recorder.start()
+
+    async def _rotate(self):
+        while True:
+            await asyncio.sleep(self._checkInterval)
+            if self._segmenter.shouldRotate():
+                await self._recorder.stop()
+                await self._startSegment()
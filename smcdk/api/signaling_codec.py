@@ -0,0 +1,95 @@
+import json
+from abc import ABCMeta, abstractmethod
+from typing import Dict, Type, Union
+
+from smcdk.log import Logger
+
+# logger of module level
+logger = Logger.getLogger(__name__)
+
+
+class SignalingCodec(metaclass=ABCMeta):
+    """
+    encodes/decodes the json messages of the signaling channel,
+    encode() returns str since protoo servers ignore binary websocket frames
+    """
+    name: str = ''
+
+    @abstractmethod
+    def encode(self, message: dict) -> str:
+        pass
+
+    @abstractmethod
+    def decode(self, data: Union[str, bytes]) -> dict:
+        pass
+
+
+class StdlibJsonCodec(SignalingCodec):
+    name = 'json'
+
+    def __init__(self):
+        # compact separators, the same output as the other codecs and fewer bytes on the wire
+        self._encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        self._decoder = json.JSONDecoder()
+
+    def encode(self, message: dict) -> str:
+        return self._encoder.encode(message)
+
+    def decode(self, data: Union[str, bytes]) -> dict:
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode('utf-8')
+        return self._decoder.decode(data)
+
+
+class OrjsonCodec(SignalingCodec):
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._dumps = orjson.dumps
+        self._loads = orjson.loads
+
+    def encode(self, message: dict) -> str:
+        return self._dumps(message).decode('utf-8')
+
+    def decode(self, data: Union[str, bytes]) -> dict:
+        return self._loads(data)
+
+
+class MsgspecJsonCodec(SignalingCodec):
+    name = 'msgspec'
+
+    def __init__(self):
+        import msgspec
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def encode(self, message: dict) -> str:
+        return self._encoder.encode(message).decode('utf-8')
+
+    def decode(self, data: Union[str, bytes]) -> dict:
+        return self._decoder.decode(data)
+
+
+CODECS: Dict[str, Type[SignalingCodec]] = {
+    OrjsonCodec.name: OrjsonCodec,
+    MsgspecJsonCodec.name: MsgspecJsonCodec,
+    StdlibJsonCodec.name: StdlibJsonCodec
+}
+
+
+def createCodec(name: str = 'auto') -> SignalingCodec:
+    """
+    :param name: one of CODECS, or 'auto' for the fastest installed one (orjson, msgspec, then json)
+    """
+    if name != 'auto':
+        if name not in CODECS:
+            raise ValueError(f'unknown signaling codec: {name}, expected one of {list(CODECS)} or auto')
+        return CODECS[name]()
+    for codecClass in CODECS.values():
+        try:
+            return codecClass()
+        except ImportError:
+            logger.debug('signaling codec %s is not available', codecClass.name)
+    # not reached, StdlibJsonCodec has no optional dependency
+    return StdlibJsonCodec()
@@ -1,5 +1,5 @@
 from .parser import parse, parseParams, parseImageAttributes, parseSimulcastStreamList
-from .writer import write, defaultOuterOrder, defaultInnerOrder
+from .writer import write, writeSession, writeMedia, defaultOuterOrder, defaultInnerOrder
 
 
 class sdp_transform:
@@ -23,3 +23,11 @@ class sdp_transform:
     @staticmethod
     def write(session: dict, outerOrder: list = defaultOuterOrder, innerOrder: list = defaultInnerOrder):
         return write(session, outerOrder, innerOrder)
+
+    @staticmethod
+    def writeSession(session: dict, outerOrder: list = defaultOuterOrder):
+        return writeSession(session, outerOrder)
+
+    @staticmethod
+    def writeMedia(mLine: dict, innerOrder: list = defaultInnerOrder):
+        return writeMedia(mLine, innerOrder)
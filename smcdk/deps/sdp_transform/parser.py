@@ -4,7 +4,16 @@ from functools import reduce
 from .grammar import grammar
 
 
+_NUMBER_LEADS = frozenset('+-.iInN')
+
+
 def toIntIfInt(v):
+    # fast paths for the common cases, without raising any exception
+    if v.isdigit() and v.isascii():
+        return int(v)
+    lead = v.lstrip()[:1]
+    if not lead or not (lead.isdigit() or lead in _NUMBER_LEADS):
+        return v
     try:
         return int(v)
     except ValueError:
@@ -42,15 +51,112 @@ def parseReg(obj, location, content):
     if obj.get('push'):
         location[obj.get('push')].append(keyLocation)
 
+class CompiledRule:
+    """
+    a grammar entry with its regex compiled and its lookups resolved once,
+    so that parse() does a single match per line
+    """
+    __slots__ = ('reg', 'push', 'name', 'names', 'needsBlank')
+
+    def __init__(self, obj: dict):
+        self.reg = obj['reg'] if isinstance(obj['reg'], re.Pattern) else re.compile(obj['reg'])
+        self.push = obj.get('push')
+        self.name = obj.get('name')
+        self.names = obj.get('names')
+        self.needsBlank = bool(self.name and self.names)
+
+    def apply(self, match, location: dict):
+        if self.push:
+            keyLocation = {}
+        elif self.needsBlank:
+            keyLocation = location.get(self.name)
+            if not keyLocation:
+                keyLocation = location[self.name] = {}
+        else:
+            keyLocation = location
+
+        if self.name and not self.names:
+            keyLocation[self.name] = toIntIfInt(match[1])
+        else:
+            for i, name in enumerate(self.names):
+                value = match[i + 1]
+                if value is not None:
+                    keyLocation[name] = toIntIfInt(value)
+
+        if self.push:
+            pushed = location.get(self.push)
+            if not pushed:
+                pushed = location[self.push] = []
+            pushed.append(keyLocation)
+
+
+_LITERAL_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-:')
+_QUANTIFIERS = frozenset('*?+{')
+
+
+def _literalPrefixes(pattern: str) -> list:
+    """
+    the literal texts a line must start with to be matched by the pattern,
+    [''] if the pattern can't be keyed (it then competes for every line)
+    """
+    if pattern.startswith('^'):
+        pattern = pattern[1:]
+    if pattern.startswith('('):
+        end = pattern.find(')')
+        alternatives = pattern[1:end].split('|') if end > 0 else []
+        if alternatives and all(alternative and set(alternative) <= _LITERAL_CHARS for alternative in alternatives):
+            return alternatives
+        return ['']
+    i = 0
+    while i < len(pattern) and pattern[i] in _LITERAL_CHARS:
+        i += 1
+    if i < len(pattern) and pattern[i] in _QUANTIFIERS:
+        i -= 1
+    return [pattern[:max(i, 0)]]
+
+
+def _canStartWith(prefix: str, key: str, hasColon: bool) -> bool:
+    # the line is exactly 'key' or starts with 'key:'
+    if not hasColon:
+        return key.startswith(prefix)
+    head = key + ':'
+    return head.startswith(prefix) or prefix.startswith(head)
+
+
+def _candidateRules(key: str, hasColon: bool) -> list:
+    return [rule for prefixes, rule in _attributeRules
+            if any(_canStartWith(prefix, key, hasColon) for prefix in prefixes)]
+
+
+# <field, [CompiledRule]> in grammar order
+compiledGrammar = {field: [CompiledRule(obj) for obj in objs] for field, objs in grammar.items()}
+
+# ([literal prefix], CompiledRule) for every 'a=' rule, in grammar order
+_attributeRules = [(_literalPrefixes(rule.reg.pattern), rule) for rule in compiledGrammar['a']]
+
+# <(attribute name, has ':'), [CompiledRule]>, prebuilt for every attribute known by the grammar,
+# each list keeps grammar order, so the first matching rule is the same one a full scan would find
+attributeIndex = {}
+for _prefixes, _ in _attributeRules:
+    for _prefix in _prefixes:
+        if _prefix.endswith(':'):
+            _key = (_prefix[:-1], True)
+        else:
+            _key = (_prefix, False)
+        if _key[0] and _key not in attributeIndex:
+            attributeIndex[_key] = _candidateRules(*_key)
+
+
 def parse(sdp: str) -> dict:
     session = {}
     media = []
     location = session
-    lines = [line for line in sdp.splitlines(
-    ) if re.match(r'^([a-z])=(.*)', line)]
-    for l in lines:
-        field = l[0]
-        content = l[2:]
+    for line in sdp.splitlines():
+        # same filter as matching r'^([a-z])=(.*)'
+        if len(line) < 2 or line[1] != '=' or not 'a' <= line[0] <= 'z':
+            continue
+        field = line[0]
+        content = line[2:]
 
         if field == 'm':
             media.append({
@@ -58,10 +164,21 @@ def parse(sdp: str) -> dict:
                 'fmtp': []
             })
             location = media[-1]
-        
-        for obj in grammar.get(field,[]):
-            if re.match(obj['reg'], content):
-                parseReg(obj, location, content)
+
+        if field == 'a':
+            colon = content.find(':')
+            key = (content, False) if colon == -1 else (content[:colon], True)
+            rules = attributeIndex.get(key)
+            if rules is None:
+                # attribute unknown by the grammar, rare enough to not be cached
+                rules = _candidateRules(*key)
+        else:
+            rules = compiledGrammar.get(field, ())
+
+        for rule in rules:
+            match = rule.reg.match(content)
+            if match:
+                rule.apply(match, location)
                 break
 
     session['media'] = media
@@ -18,6 +18,91 @@ def makeLine(field, obj, location):
     return string % tuple(args)
 
 
+class CompiledEmitter:
+    """
+    a grammar entry with its line prefix and format resolved once, and makeLine() picked for its shape,
+    so that write() formats only the entries whose key is present, same output as makeLine()
+    """
+    __slots__ = ('push', 'name', 'names', 'template', 'prefix', 'formatFunc', 'makeLine')
+
+    def __init__(self, field: str, obj: dict):
+        self.push = obj.get('push')
+        self.name = obj.get('name')
+        self.names = tuple(obj['names']) if obj.get('names') else None
+        self.prefix = field + '='
+        if callable(obj['format']):
+            self.formatFunc = obj['format']
+            self.template = None
+            self.makeLine = self._makeFormattedLine
+        else:
+            self.formatFunc = None
+            self.template = self.prefix + obj['format']
+            if self.names is None:
+                self.makeLine = self._makeValueLine
+            elif self.name:
+                self.makeLine = self._makeNestedLine
+            else:
+                self.makeLine = self._makeLine
+
+    def _makeValueLine(self, location: dict) -> str:
+        return self.template % (location[self.name],)
+
+    def _makeNestedLine(self, location: dict) -> str:
+        values = location[self.name]
+        return self.template % tuple([values[name] for name in self.names if values.get(name) is not None])
+
+    def _makeLine(self, location: dict) -> str:
+        return self.template % tuple([location[name] for name in self.names if location.get(name) is not None])
+
+    def _makeFormattedLine(self, location: dict) -> str:
+        template = self.prefix + self.formatFunc(location if self.push else location[self.name])
+        if self.names is None:
+            return template % (location[self.name],)
+        values = location[self.name] if self.name else location
+        return template % tuple([values[name] for name in self.names if values.get(name) is not None])
+
+
+# <field, [CompiledEmitter]> in grammar order
+compiledGrammar = {field: [CompiledEmitter(field, obj) for obj in objs] for field, objs in grammar.items()}
+
+_mLineEmitter = compiledGrammar['m'][0]
+
+# <tuple of fields, <key, [(rank, push, makeLine)]>>, rank being the position of the line in a full grammar scan
+_compiledOrders = {}
+
+
+def _compileOrder(order: list) -> dict:
+    orderKey = tuple(order)
+    keyIndex = _compiledOrders.get(orderKey)
+    if keyIndex is None:
+        keyIndex = {}
+        rank = 0
+        for field in orderKey:
+            for emitter in compiledGrammar[field]:
+                key = emitter.name or emitter.push
+                if key:
+                    keyIndex.setdefault(key, []).append((rank, emitter.push, emitter.makeLine))
+                rank += 1
+        _compiledOrders[orderKey] = keyIndex
+    return keyIndex
+
+
+def _appendLines(location: dict, keyIndex: dict, lines: list):
+    # visit the keys present only, then emit them in grammar order, ranks are unique
+    present = []
+    for key, value in location.items():
+        if value is not None:
+            emitters = keyIndex.get(key)
+            if emitters is not None:
+                present.extend(emitters)
+    present.sort()
+    for _, push, makeLine in present:
+        if push:
+            lines.extend(map(makeLine, location[push]))
+        else:
+            lines.append(makeLine(location))
+
+
 defaultOuterOrder = [
   'v', 'o', 's', 'i',
   'u', 'e', 'p', 'c',
@@ -26,6 +111,18 @@ defaultOuterOrder = [
 
 defaultInnerOrder = ['i', 'c', 'b', 'a']
 
+def _sessionLines(session: dict, outerOrder: list) -> list:
+    sdp = []
+    _appendLines(session, _compileOrder(outerOrder), sdp)
+    return sdp
+
+def _mediaLines(mLine: dict, innerOrder: list, sdp: list = None) -> list:
+    if sdp is None:
+        sdp = []
+    sdp.append(_mLineEmitter.makeLine(mLine))
+    _appendLines(mLine, _compileOrder(innerOrder), sdp)
+    return sdp
+
 def write(session: dict, outerOrder: list=defaultOuterOrder, innerOrder:list=defaultInnerOrder):
     if session.get('version') == None:
         session['version'] = 0 # 'v=0' must be there (only defined version atm)
@@ -34,37 +131,31 @@ def write(session: dict, outerOrder: list=defaultOuterOrder, innerOrder:list=def
 
     for media in session.get('media',[]):
         if media.get('payloads') == None:
-            media.payloads = ''
-    
-    sdp = []
+            media['payloads'] = ''
 
-    # loop through outerOrder for matching properties on session
-    for field in outerOrder:
-        for obj in grammar[field]:
-            if obj.get('name'):
-                if obj['name'] in session.keys():
-                    if session.get(obj['name']) != None:
-                        sdp.append(makeLine(field, obj, session))
-            elif obj.get('push'):
-                if obj['push'] in session.keys():
-                    if session.get(obj['push']) != None:
-                        for el in session.get(obj['push']):
-                            sdp.append(makeLine(field, obj, el))
-    
-    # then for each media line, follow the innerOrder
+    sdp = _sessionLines(session, outerOrder)
+
+    # then for each media line
     for mLine in session.get('media', []):
-        sdp.append(makeLine('m', grammar['m'][0], mLine))
-
-        for field in innerOrder:
-            for obj in grammar[field]:
-                if obj.get('name'):
-                    if obj['name'] in mLine.keys():
-                        if mLine.get(obj['name']) != None:
-                            sdp.append(makeLine(field, obj, mLine))
-                elif obj.get('push'):
-                    if obj['push'] in mLine.keys():
-                        if mLine.get(obj['push']) != None:
-                            for el in mLine.get(obj['push']):
-                                sdp.append(makeLine(field, obj, el))
+        _mediaLines(mLine, innerOrder, sdp)
 
     return '\r\n'.join(sdp)
+
+def writeSession(session: dict, outerOrder: list=defaultOuterOrder) -> str:
+    """
+    write the session level lines only, session['media'] is ignored
+    """
+    if session.get('version') == None:
+        session['version'] = 0
+    if session.get('name') == None:
+        session['name'] = ' '
+    return '\r\n'.join(_sessionLines(session, outerOrder))
+
+def writeMedia(mLine: dict, innerOrder: list=defaultInnerOrder) -> str:
+    """
+    write the lines of a single media section, from its m= line on,
+    write() output equals writeSession() and every writeMedia() joined by '\\r\\n'
+    """
+    if mLine.get('payloads') == None:
+        mLine['payloads'] = ''
+    return '\r\n'.join(_mediaLines(mLine, innerOrder))
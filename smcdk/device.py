@@ -9,8 +9,8 @@ import logging
 from pyee import AsyncIOEventEmitter
 from aiortc import RTCIceServer
 from .handlers.handler_interface import HandlerInterface
-from .ortc import ExtendedRtpCapabilities, getExtendedRtpCapabilities, canSend, getRecvRtpCapabilities
-from .rtp_parameters import RtpCapabilities
+from .ortc import ExtendedRtpCapabilities, canSend, isRtxCodec, ortcCache
+from .rtp_parameters import RtpCapabilities, RtpCodecCapability, RtcpFeedback
 from .sctp_parameters import SctpCapabilities, SctpParameters
 from .errors import InvalidStateError
 from .transport import InternalTransportOptions, Transport
@@ -84,14 +84,15 @@ class Device:
         handler: HandlerInterface = self._handlerFactory()
         nativeRtpCapabilities = await handler.getNativeRtpCapabilities()
         logging.debug(f'Device load() | got native RTP capabilities:{nativeRtpCapabilities}')
-        # Get extended RTP capabilities.
-        self._extendedRtpCapabilities = getExtendedRtpCapabilities(nativeRtpCapabilities, routerRtpCapabilities)
+        # Get extended RTP capabilities, negotiated once for every Device loaded
+        # with the same capabilities.
+        self._extendedRtpCapabilities = ortcCache.getExtendedRtpCapabilities(nativeRtpCapabilities, routerRtpCapabilities)
         logging.debug(f'Device load() | got extended RTP capabilities:{self._extendedRtpCapabilities}')
         # Check whether we can produce audio/video.
         self._canProduceByKind['audio'] = canSend('audio', self._extendedRtpCapabilities)
         self._canProduceByKind['video'] = canSend('video', self._extendedRtpCapabilities)
         # Generate our receiving RTP capabilities for receiving media.
-        self._recvRtpCapabilities = getRecvRtpCapabilities(self._extendedRtpCapabilities)
+        self._recvRtpCapabilities = ortcCache.getRecvRtpCapabilities(self._extendedRtpCapabilities)
         logging.debug(f'Device load() | got receiving RTP capabilities:{self._recvRtpCapabilities}')
         # Generate our SCTP capabilities.
         self._sctpCapabilities = await handler.getNativeSctpCapabilities()
@@ -111,6 +112,25 @@ class Device:
             raise TypeError(f'invalid kind {kind}')
         return self._canProduceByKind[kind]
     
+    # Codecs the Device can send for the given kind, in order of preference,
+    # RTX excluded. One of them can be given to Transport.produce().
+    # @raise {InvalidStateError} if not loaded.
+    def getSendingCodecs(self, kind: Literal['video', 'audio']) -> List[RtpCodecCapability]:
+        if not self._loaded:
+            raise InvalidStateError('not loaded')
+        return [
+            RtpCodecCapability(
+                kind=kind,
+                mimeType=codec.mimeType,
+                clockRate=codec.clockRate,
+                channels=codec.channels,
+                parameters=codec.parameters,
+                rtcpFeedback=[RtcpFeedback(type=fb.type, parameter=fb.parameter) for fb in codec.rtcpFeedback]
+            )
+            for codec in ortcCache.getSendingRtpParameters(kind, self._extendedRtpCapabilities).codecs
+            if not isRtxCodec(codec)
+        ]
+
     # Creates a Transport for sending media.
     # @raise {InvalidStateError} if not loaded.
     # @raise {TypeError} if wrong arguments.
@@ -1,22 +1,25 @@
 import sys
 if sys.version_info >= (3, 8):
-    from typing import Dict, Literal, List, Optional, Any
+    from typing import Dict, Literal, List, Optional, Any, Union
 else:
-    from typing import Dict, List, Optional, Any
+    from typing import Dict, List, Optional, Any, Union
     from typing_extensions import Literal
 
 import logging
-from aiortc import RTCIceServer, RTCPeerConnection, RTCSessionDescription, RTCRtpTransceiver, MediaStreamTrack
+from aiortc import RTCIceServer, RTCPeerConnection, RTCSessionDescription, RTCRtpTransceiver, RTCRtpReceiver, MediaStreamTrack
 from ..deps.sdp_transform import sdp_transform
 from .sdp import common_utils
 from .sdp.remote_sdp import RemoteSdp
 from .sdp.unified_plan_utils import addLegacySimulcast, getRtpEncodings
 from .sdp.common_utils import applyCodecParameters, extractDtlsParameters
 from .handler_interface import HandlerInterface
-from ..ortc import ExtendedRtpCapabilities
-from ..rtp_parameters import MediaKind, RtpParameters, RtpCapabilities, RtpCodecCapability, RtpEncodingParameters, RtcpParameters
+from .native_capabilities_cache import nativeCapabilitiesCache
+from .negotiation_queue import NegotiationQueue
+from ..ortc import ExtendedRtpCapabilities, ortcCache
+from ..rtp_parameters import MediaKind, RtpParameters, RtpCapabilities, RtpCodecCapability, RtpEncodingParameters
+from ..rtp_structs import RtpParametersStruct, RtpEncodingParametersStruct, RtcpParametersStruct
 from ..sctp_parameters import SctpCapabilities, SctpParameters, SctpStreamParameters
-from ..ortc import getSendingRtpParameters, getSendingRemoteRtpParameters, reduceCodecs
+from ..ortc import reduceCodecs
 from ..scalability_modes import parse as smParse
 from ..models.transport import IceCandidate, IceParameters, DtlsParameters, DtlsRole
 from ..models.handler_interface import HandlerRunOptions, HandlerSendOptions, HandlerSendResult, HandlerSendDataChannelResult, HandlerReceiveDataChannelResult, HandlerReceiveOptions, HandlerReceiveResult, HandlerReceiveDataChannelOptions
@@ -34,20 +37,29 @@ class AiortcHandler(HandlerInterface):
         # Remote SDP handler.
         self._remoteSdp: Optional[RemoteSdp] = None
         # Generic sending RTP parameters for audio and video.
-        self._sendingRtpParametersByKind: Dict[str, RtpParameters] = {}
+        self._sendingRtpParametersByKind: Dict[str, RtpParametersStruct] = {}
         # Generic sending RTP parameters for audio and video suitable for the SDP
         # remote answer.
-        self._sendingRemoteRtpParametersByKind: Dict[str, RtpParameters] = {}
+        self._sendingRemoteRtpParametersByKind: Dict[str, RtpParametersStruct] = {}
         # RTCPeerConnection instance.
         self._pc: Optional[RTCPeerConnection] = None
         # Map of RTCTransceivers indexed by MID.
         self._mapMidTransceiver: Dict[str, RTCRtpTransceiver] = {}
+        # Receiving MID value counter. Incremented for each new receiving transceiver, so that
+        # the MIDs of the stopped ones, removed from the map, are never handed out again.
+        self._nextRecvLocalId = 0
+        # Transceivers of the closed receiving media sections indexed by kind, reused
+        # with their MID by the next receiving media sections of the same kind.
+        self._closedRecvTransceiversByKind: Dict[str, List[RTCRtpTransceiver]] = {}
         # Whether a DataChannel m=application section has been created.
         self._hasDataChannelMediaSection = False
         # Sending DataChannel id value counter. Incremented for each new DataChannel.
         self._nextSendSctpStreamId = 0
         # Got transport local and remote parameters.
         self._transportReady = False
+        # Serializes the operations running offer/answer on the RTCPeerConnection,
+        # the adjacent receiving ones share a single round.
+        self._negotiationQueue = NegotiationQueue()
         self._tracks = tracks
 
     @classmethod
@@ -75,12 +87,26 @@ class AiortcHandler(HandlerInterface):
     async def close(self):
         logging.debug('close()')
 
+        self._negotiationQueue.close()
         if self._pc:
             await self._pc.close()
 
+    def negotiationStats(self) -> dict:
+        """
+        queue wait time per operation and duration of the offer/answer rounds, see NegotiationQueue.stats()
+        """
+        return self._negotiationQueue.stats()
+
     async def getNativeRtpCapabilities(self) -> RtpCapabilities:
         logging.debug('getNativeRtpCapabilities()')
+        # The offer only depends on aiortc itself and the kinds of the tracks,
+        # so it is negotiated once per process.
+        return await nativeCapabilitiesCache.getRtpCapabilities(
+            self._nativeCapabilitiesKey(),
+            self._createNativeRtpCapabilities
+        )
 
+    async def _createNativeRtpCapabilities(self) -> RtpCapabilities:
         pc = RTCPeerConnection()
         for track in self._tracks:
             pc.addTrack(track)
@@ -97,6 +123,17 @@ class AiortcHandler(HandlerInterface):
     
     async def getNativeSctpCapabilities(self) -> SctpCapabilities:
         logging.debug('getNativeSctpCapabilities()')
+        return await nativeCapabilitiesCache.getSctpCapabilities(
+            self._nativeCapabilitiesKey(),
+            self._createNativeSctpCapabilities
+        )
+
+    def _nativeCapabilitiesKey(self):
+        # Subclasses may negotiate differently, so they get their own entries.
+        return nativeCapabilitiesCache.makeKey(f'{self.name}:{type(self).__qualname__}',
+                                               [track.kind for track in self._tracks])
+
+    async def _createNativeSctpCapabilities(self) -> SctpCapabilities:
         return SctpCapabilities.parse_obj({
             'numStreams': SCTP_NUM_STREAMS
         })
@@ -134,13 +171,14 @@ class AiortcHandler(HandlerInterface):
             dtlsParameters=options.dtlsParameters,
             sctpParameters=options.sctpParameters
         )
+        # NOTE: copy them before modifying, e.g. the codec options modify the codec parameters.
         self._sendingRtpParametersByKind = {
-            'audio': getSendingRtpParameters('audio', options.extendedRtpCapabilities),
-            'video': getSendingRtpParameters('video', options.extendedRtpCapabilities)
+            kind: ortcCache.getSendingRtpParameters(kind, options.extendedRtpCapabilities)
+            for kind in ('audio', 'video')
         }
         self._sendingRemoteRtpParametersByKind = {
-            'audio': getSendingRemoteRtpParameters('audio', options.extendedRtpCapabilities),
-            'video': getSendingRemoteRtpParameters('video', options.extendedRtpCapabilities)
+            kind: ortcCache.getSendingRemoteRtpParameters(kind, options.extendedRtpCapabilities)
+            for kind in ('audio', 'video')
         }
         self._pc = RTCPeerConnection()
 
@@ -163,31 +201,41 @@ class AiortcHandler(HandlerInterface):
     
     async def restartIce(self, iceParameters):
         logging.debug('restartIce()')
+        if self._direction == 'send':
+            await self._negotiationQueue.run('restartIce', iceParameters, self._negotiateSend)
+        else:
+            await self._negotiationQueue.run('restartIce', iceParameters, self._negotiateRecv, mergeable=True)
+
+    async def _negotiateSend(self, operations: List[tuple]) -> List[Any]:
+        # The sending operations are not merged, each one creates its own offer.
+        results = []
+        for name, item in operations:
+            if name == 'send':
+                results.append(await self._send(item))
+            elif name == 'sendDataChannel':
+                results.append(await self._sendDataChannel(*item))
+            elif name == 'stopSending':
+                results.append(await self._stopSending(item))
+            elif name == 'restartIce':
+                results.append(await self._restartSendIce(item))
+            else:
+                raise Exception(f'unknown sending operation {name}')
+        return results
+
+    async def _restartSendIce(self, iceParameters):
         self._remoteSdp.updateIceParameters(iceParameters)
         if not self._transportReady:
             return
-        if self._direction == 'send':
-            # NOTE: aiortc RTCPeerConnection createOffer do not have iceRestart options
-            offer = await self._pc.createOffer()
-            logging.debug(f'restartIce() | calling pc.setLocalDescription() [offer:{offer}]')
-            await self._pc.setLocalDescription(offer)
-            answer: RTCSessionDescription = RTCSessionDescription(
-                type='answer',
-                sdp=self._remoteSdp.getSdp()
-            )
-            logging.debug(f'restartIce() | calling pc.setRemoteDescription() [answer:{answer}]')
-            await self._pc.setRemoteDescription(answer)
-        else:
-            offer: RTCSessionDescription = RTCSessionDescription(
-                type='offer',
-                sdp=self._remoteSdp.getSdp()
-            )
-            logging.debug(f'restartIce() | calling pc.setRemoteDescription() [offer:{offer}]')
-            await self._pc.setRemoteDescription(offer)
-            answer = await self._pc.createAnswer()
-            logging.debug(f'restartIce() | calling pc.setLocalDescription() [answer:{answer}]')
-            await self._pc.setLocalDescription(answer)
-        
+        offer = await self._pc.createOffer()
+        logging.debug(f'restartIce() | calling pc.setLocalDescription() [offer:{offer}]')
+        await self._pc.setLocalDescription(offer)
+        answer: RTCSessionDescription = RTCSessionDescription(
+            type='answer',
+            sdp=self._remoteSdp.getSdp()
+        )
+        logging.debug(f'restartIce() | calling pc.setRemoteDescription() [answer:{answer}]')
+        await self._pc.setRemoteDescription(answer)
+
     async def getTransportStats(self):
         return self._pc.getStats()
 
@@ -206,17 +254,22 @@ class AiortcHandler(HandlerInterface):
         )
         self._assertSendDirection()
         logging.debug(f'send() [kind:{options.track.kind}, track.id:{options.track.id}]')
-        if options.encodings:
-            for idx in range(len(options.encodings)):
-                options.encodings[idx].rid = f'r{idx}'
+        return await self._negotiationQueue.run('send', options, self._negotiateSend)
+
+    async def _send(self, options: HandlerSendOptions) -> HandlerSendResult:
+        encodings: List[RtpEncodingParametersStruct] = [
+            RtpEncodingParametersStruct.fromModel(encoding) for encoding in options.encodings]
+        for idx in range(len(encodings)):
+            encodings[idx].rid = f'r{idx}'
 
-        sendingRtpParameters: RtpParameters = self._sendingRtpParametersByKind[options.track.kind].copy(deep=True)
+        sendingRtpParameters: RtpParametersStruct = self._sendingRtpParametersByKind[options.track.kind].copy()
         sendingRtpParameters.codecs = reduceCodecs(sendingRtpParameters.codecs, options.codec)
 
-        sendingRemoteRtpParameters: RtpParameters = self._sendingRemoteRtpParametersByKind[options.track.kind].copy(deep=True)
+        sendingRemoteRtpParameters: RtpParametersStruct = self._sendingRemoteRtpParametersByKind[options.track.kind].copy()
         sendingRemoteRtpParameters.codecs = reduceCodecs(sendingRemoteRtpParameters.codecs, options.codec)
 
-        mediaSectionIdx = self.remoteSdp.getNextMediaSectionIdx()
+        # NOTE: aiortc never reuses the m-line of a stopped transceiver, the new one is appended.
+        mediaSectionIdx = self.remoteSdp.getNextMediaSectionIdx(reuseClosed=False)
         transceiver = self.pc.addTransceiver(options.track, direction='sendonly')
 
         offer: RTCSessionDescription  = await self.pc.createOffer()
@@ -226,11 +279,11 @@ class AiortcHandler(HandlerInterface):
             await self._setupTransport(localDtlsRole='server', localSdpDict=localSdpDict)
         # Special case for VP9 with SVC.
         hackVp9Svc = False
-        if options.encodings:
-            layers=smParse(options.encodings[0].scalabilityMode if options.encodings[0].scalabilityMode else '')
+        if encodings:
+            layers=smParse(encodings[0].scalabilityMode if encodings[0].scalabilityMode else '')
         else:
             layers=smParse('')
-        if len(options.encodings) == 1 and layers.spatialLayers > 1 and sendingRtpParameters.codecs[0].mimeType.lower() == 'video/vp9':
+        if len(encodings) == 1 and layers.spatialLayers > 1 and sendingRtpParameters.codecs[0].mimeType.lower() == 'video/vp9':
             logging.debug('send() | enabling legacy simulcast for VP9 SVC')
             hackVp9Svc = True
             localSdpDict = sdp_transform.parse
@@ -255,26 +308,26 @@ class AiortcHandler(HandlerInterface):
         logging.debug(f"send() | get offerMediaDict {offerMediaDict} \n from localSdpDict {localSdpDict['media']} index {mediaSectionIdx.idx}")
         # Set RTCP CNAME.
         if sendingRtpParameters.rtcp == None:
-            sendingRtpParameters.rtcp = RtcpParameters()
+            sendingRtpParameters.rtcp = RtcpParametersStruct()
         sendingRtpParameters.rtcp.cname = common_utils.getCname(offerMediaDict)
         # Set RTP encodings by parsing the SDP offer if no encodings are given.
-        if not options.encodings:
+        if not encodings:
             sendingRtpParameters.encodings = getRtpEncodings(offerMediaDict)
         # Set RTP encodings by parsing the SDP offer and complete them with given
         # one if just a single encoding has been given.
-        elif len(options.encodings) == 1:
+        elif len(encodings) == 1:
             newEncodings = getRtpEncodings(offerMediaDict)
-            if newEncodings and options.encodings[0]:
+            if newEncodings and encodings[0]:
                 firstEncodingDict: dict = newEncodings[0].dict()
-                optionsEncodingDict: dict = options.encodings[0].dict()
+                optionsEncodingDict: dict = encodings[0].dict()
                 firstEncodingDict.update(optionsEncodingDict)
-                newEncodings[0] = RtpEncodingParameters(**firstEncodingDict)
+                newEncodings[0] = RtpEncodingParametersStruct.fromDict(firstEncodingDict)
                 if hackVp9Svc:
                     newEncodings = [newEncodings[0]]
             sendingRtpParameters.encodings = newEncodings
         # Otherwise if more than 1 encoding are given use them verbatim.
         else:
-            sendingRtpParameters.encodings = options.encodings
+            sendingRtpParameters.encodings = encodings
         # If VP8 or H264 and there is effective simulcast, add scalabilityMode to
         # each encoding.
         if len(sendingRtpParameters.encodings) > 1 and (sendingRtpParameters.codecs[0].mimeType.lower() == 'video/vp8' or sendingRtpParameters.codecs[0].mimeType.lower() == 'video/h264'):
@@ -298,30 +351,35 @@ class AiortcHandler(HandlerInterface):
         self._mapMidTransceiver[localId] = transceiver
         return HandlerSendResult(
             localId=localId,
-            rtpParameters=sendingRtpParameters,
+            rtpParameters=sendingRtpParameters.toModel(),
             rtpSender=transceiver.sender
         )
 
     async def stopSending(self, localId):
-        pass
-        # self._assertSendDirection()
-        # logging.debug(f'stopSending() [localId:{localId}]')
-        # transceiver = self._mapMidTransceiver.get(localId)
-        # if not transceiver:
-        #     raise Exception('associated RTCRtpTransceiver not found')
-        # transceiver.sender.replaceTrack()
-        # # TODO:RTCPeerConnection do not have removeTrack()
-        # self._pc.removeTrack(transceiver.sender)
-        # self._remoteSdp.closeMediaSection(transceiver.mid)
-        # offer = await self._pc.createOffer()
-        # logging.debug(f'stopSending() | calling pc.setLocalDescription() [offer:{offer}]')
-        # await self._pc.localDescription(offer)
-        # answer: RTCSessionDescription = RTCSessionDescription(
-        #     type='answer',
-        #     sdp=self._remoteSdp.getSdp()
-        # )
-        # logging.debug(f'stopSending() | calling pc.setRemoteDescription() [answer:{answer}]')
-        # await self._pc.setRemoteDescription(answer)
+        self._assertSendDirection()
+        logging.debug(f'stopSending() [localId:{localId}]')
+        transceiver = self._mapMidTransceiver.pop(localId, None)
+        if not transceiver:
+            raise Exception('associated RTCRtpTransceiver not found')
+        await self._negotiationQueue.run('stopSending', transceiver, self._negotiateSend)
+
+    async def _stopSending(self, transceiver: RTCRtpTransceiver):
+        # NOTE: RTCPeerConnection do not have removeTrack(), which would make the transceiver
+        # inactive and detach its track.
+        transceiver.direction = 'inactive'
+        # Stop reading and encoding the track, and the RTP and RTCP of the sender. The track
+        # itself belongs to the producer.
+        await transceiver.sender.stop()
+        self.remoteSdp.closeMediaSection(transceiver.mid)
+        offer: RTCSessionDescription = await self.pc.createOffer()
+        logging.debug(f'stopSending() | calling pc.setLocalDescription() [offer:{offer}]')
+        await self.pc.setLocalDescription(offer)
+        answer: RTCSessionDescription = RTCSessionDescription(
+            type='answer',
+            sdp=self.remoteSdp.getSdp()
+        )
+        logging.debug(f'stopSending() | calling pc.setRemoteDescription() [answer:{answer}]')
+        await self.pc.setRemoteDescription(answer)
     
     async def replaceTrack(self, localId, track=None):
         self._assertSendDirection()
@@ -379,16 +437,21 @@ class AiortcHandler(HandlerInterface):
         )
         self._assertSendDirection()
         logging.debug('sendDataChannel()')
+        # The id is taken when called, so that the ids follow the calls even if they are queued.
+        dataChannelId = self._nextSendSctpStreamId
+        # Increase next id.
+        self._nextSendSctpStreamId = (self._nextSendSctpStreamId + 1) % SCTP_NUM_STREAMS.get('MIS', 1)
+        return await self._negotiationQueue.run('sendDataChannel', (options, dataChannelId), self._negotiateSend)
+
+    async def _sendDataChannel(self, options: SctpStreamParameters, dataChannelId: int) -> HandlerSendDataChannelResult:
         dataChannel = self.pc.createDataChannel(
             label=options.label,
             maxPacketLifeTime=options.maxPacketLifeTime,
             ordered=options.ordered,
             protocol=options.protocol,
             negotiated=True,
-            id=self._nextSendSctpStreamId
+            id=dataChannelId
         )
-        # Increase next id.
-        self._nextSendSctpStreamId = (self._nextSendSctpStreamId + 1) % SCTP_NUM_STREAMS.get('MIS', 1)
         # If this is the first DataChannel we need to create the SDP answer with
         # m=application section.
         if not self._hasDataChannelMediaSection:
@@ -423,72 +486,30 @@ class AiortcHandler(HandlerInterface):
         self,
         trackId: str,
         kind: MediaKind,
-        rtpParameters: RtpParameters
+        rtpParameters: Union[RtpParametersStruct, RtpParameters]
     ) -> HandlerReceiveResult:
+        if isinstance(rtpParameters, RtpParameters):
+            rtpParameters = RtpParametersStruct.fromModel(rtpParameters)
         options = HandlerReceiveOptions(
             trackId=trackId,
             kind=kind,
             rtpParameters=rtpParameters
         )
+        results = await self.receiveMany([options])
+        return results[0]
+
+    async def receiveMany(self, optionsList: List[HandlerReceiveOptions]) -> List[HandlerReceiveResult]:
         self._assertRecvDirection()
-        logging.debug(f'receive() [trackId:{options.trackId}, kind:{options.kind}]')
-        localId = options.rtpParameters.mid if options.rtpParameters.mid != None else str(len(self._mapMidTransceiver))
-        self.remoteSdp.receive(
-            mid=localId,
-            kind=options.kind,
-            offerRtpParameters=options.rtpParameters,
-            streamId=options.rtpParameters.rtcp.cname,
-            trackId=options.trackId
-        )
-        offer: RTCSessionDescription = RTCSessionDescription(
-            type='offer',
-            sdp=self.remoteSdp.getSdp()
-        )
-        logging.debug(f'receive() | calling pc.setRemoteDescription() [offer:{offer}]')
-        await self.pc.setRemoteDescription(offer)
-        answer: RTCSessionDescription = await self.pc.createAnswer()
-        localSdpDict = sdp_transform.parse(answer.sdp)
-        answerMediaDict = [m for m in localSdpDict.get('media') if str(m.get('mid')) == localId][0]
-        # May need to modify codec parameters in the answer based on codec
-        # parameters in the offer.
-        applyCodecParameters(offerRtpParameters=options.rtpParameters, answerMediaDict=answerMediaDict)
-        answer = RTCSessionDescription(
-            type='answer',
-            sdp=sdp_transform.write(localSdpDict)
-        )
-        if not self._transportReady:
-            await self._setupTransport(localDtlsRole='client', localSdpDict=localSdpDict)
-        logging.debug(f'receive() | calling pc.setLocalDescription() [answer:{answer}]')
-        await self.pc.setLocalDescription(answer)
-        transceivers = [t for t in self.pc.getTransceivers() if t.mid == localId]
-        if not transceivers:
-            raise Exception('new RTCRtpTransceiver not found')
-        # Store in the map.
-        transceiver = transceivers[0]
-        self._mapMidTransceiver[localId] = transceiver
+        logging.debug(f'receiveMany() [trackIds:{[options.trackId for options in optionsList]}]')
+        return await self._negotiationQueue.run('receive', optionsList, self._negotiateRecv, mergeable=True)
 
-        return HandlerReceiveResult(
-            localId=localId,
-            track=transceiver.receiver.track,
-            rtpReceiver=transceiver.receiver
-        )
-        
     async def stopReceiving(self, localId: str):
         self._assertRecvDirection()
         logging.debug(f'stopReceiving() [localId:{localId}]')
-        transceiver = self._mapMidTransceiver.get(localId)
+        transceiver = self._mapMidTransceiver.pop(localId, None)
         if not transceiver:
             raise Exception('associated RTCRtpTransceiver not found')
-        self.remoteSdp.closeMediaSection(transceiver.mid)
-        offer: RTCSessionDescription = RTCSessionDescription(
-            type='offer',
-            sdp=self.remoteSdp.getSdp()
-        )
-        logging.debug(f'stopReceiving() | calling pc.setRemoteDescription() [offer:{offer}]')
-        await self.pc.setRemoteDescription(offer)
-        answer = await self.pc.createAnswer()
-        logging.debug(f'stopReceiving() | calling pc.setLocalDescription() [answer:{answer}]')
-        await self.pc.setLocalDescription(answer)
+        await self._negotiationQueue.run('stopReceiving', transceiver, self._negotiateRecv, mergeable=True)
     
     async def getReceiverStats(self, localId: str):
         self._assertRecvDirection()
@@ -510,34 +531,151 @@ class AiortcHandler(HandlerInterface):
         )
         self._assertRecvDirection()
         logging.debug(f'[receiveDataChannel() [options:{options.sctpStreamParameters}]]')
-        dataChannel = self.pc.createDataChannel(
-            label=options.label,
-            maxPacketLifeTime=options.sctpStreamParameters.maxPacketLifeTime,
-            maxRetransmits=options.sctpStreamParameters.maxRetransmits,
-            ordered=options.sctpStreamParameters.ordered,
-            protocol=options.protocol,
-            negotiated=True,
-            id=options.sctpStreamParameters.streamId
-        )
+        return await self._negotiationQueue.run('receiveDataChannel', options, self._negotiateRecv, mergeable=True)
 
-        # If this is the first DataChannel we need to create the SDP offer with
-        # m=application section.
-        if not self._hasDataChannelMediaSection:
-            self.remoteSdp.receiveSctpAssociation()
-            offer: RTCSessionDescription = RTCSessionDescription(
-                type='offer',
-                sdp=self.remoteSdp.getSdp()
-            )
-            logging.debug(f'receiveDataChannel() | calling pc.setRemoteDescription() [offer:{offer}]')
-            await self.pc.setRemoteDescription(offer)
-            answer = await self.pc.createAnswer()
-            if not self._transportReady:
-                localSdpDict = sdp_transform.parse(answer.sdp)
-                await self._setupTransport(localDtlsRole='client', localSdpDict=localSdpDict)
-            logging.debug(f'receiveDataChannel() | calling pc.setRemoteDescription() [answer:{answer}]')
-            await self.pc.setLocalDescription(answer)
-            self._hasDataChannelMediaSection = True
-        return HandlerReceiveDataChannelResult(dataChannel=dataChannel)
+    async def _negotiateRecv(self, operations: List[tuple]) -> List[Any]:
+        # Apply the remote SDP changes of all the operations, then a single
+        # offer/answer round for all of them.
+        pendingResults: List[Any] = []
+        needsNegotiation = False
+        hasDataChannelMediaSection = self._hasDataChannelMediaSection
+        # Closed transceivers taken for reuse in this round.
+        reusedTransceivers: List[RTCRtpTransceiver] = []
+        try:
+            for name, item in operations:
+                if name == 'receive':
+                    localIds: List[str] = []
+                    for options in item:
+                        logging.debug(f'receiveMany() [trackId:{options.trackId}, kind:{options.kind}]')
+                        reuseMid = None
+                        if options.rtpParameters.mid != None:
+                            localId = options.rtpParameters.mid
+                        elif self._closedRecvTransceiversByKind.get(options.kind):
+                            # Reuse a closed media section of the same kind and its transceiver.
+                            transceiver = self._closedRecvTransceiversByKind[options.kind].pop(0)
+                            reusedTransceivers.append(transceiver)
+                            self._renewReceiver(transceiver)
+                            localId = reuseMid = transceiver.mid
+                        else:
+                            localId = str(self._nextRecvLocalId)
+                            self._nextRecvLocalId += 1
+                        self.remoteSdp.receive(
+                            mid=localId,
+                            kind=options.kind,
+                            offerRtpParameters=options.rtpParameters,
+                            streamId=options.rtpParameters.rtcp.cname,
+                            trackId=options.trackId,
+                            reuseMid=reuseMid
+                        )
+                        localIds.append(localId)
+                    pendingResults.append(localIds)
+                    needsNegotiation = True
+                elif name == 'stopReceiving':
+                    # Whether the media section is closed, so that it can be reused.
+                    pendingResults.append(self.remoteSdp.closeMediaSection(item.mid))
+                    needsNegotiation = True
+                elif name == 'receiveDataChannel':
+                    dataChannel = self.pc.createDataChannel(
+                        label=item.label,
+                        maxPacketLifeTime=item.sctpStreamParameters.maxPacketLifeTime,
+                        maxRetransmits=item.sctpStreamParameters.maxRetransmits,
+                        ordered=item.sctpStreamParameters.ordered,
+                        protocol=item.protocol,
+                        negotiated=True,
+                        id=item.sctpStreamParameters.streamId
+                    )
+                    # If this is the first DataChannel we need to create the SDP offer with
+                    # m=application section.
+                    if not hasDataChannelMediaSection:
+                        self.remoteSdp.receiveSctpAssociation()
+                        hasDataChannelMediaSection = True
+                        needsNegotiation = True
+                    pendingResults.append(HandlerReceiveDataChannelResult(dataChannel=dataChannel))
+                elif name == 'restartIce':
+                    self.remoteSdp.updateIceParameters(item)
+                    pendingResults.append(None)
+                    if self._transportReady:
+                        needsNegotiation = True
+                else:
+                    raise Exception(f'unknown receiving operation {name}')
+            if needsNegotiation:
+                await self._negotiateRecvRound(operations, pendingResults)
+        except Exception:
+            # Closed again, the media sections and transceivers are left for the next round.
+            for transceiver in reversed(reusedTransceivers):
+                self.remoteSdp.closeMediaSection(transceiver.mid)
+                self._closedRecvTransceiversByKind[transceiver.kind].insert(0, transceiver)
+            raise
+        self._hasDataChannelMediaSection = hasDataChannelMediaSection
+        transceiversByMid = None
+        results: List[Any] = []
+        for (name, item), pendingResult in zip(operations, pendingResults):
+            if name == 'stopReceiving':
+                # Stop the decoder of the receiver and the routing of its RTP packets.
+                await item.receiver.stop()
+                if pendingResult and self._canRenewReceiver(item):
+                    self._closedRecvTransceiversByKind.setdefault(item.kind, []).append(item)
+                results.append(None)
+                continue
+            if name != 'receive':
+                results.append(pendingResult)
+                continue
+            if transceiversByMid is None:
+                transceiversByMid = {t.mid: t for t in self.pc.getTransceivers()}
+            receiveResults: List[HandlerReceiveResult] = []
+            for localId in pendingResult:
+                transceiver = transceiversByMid.get(localId)
+                if not transceiver:
+                    raise Exception('new RTCRtpTransceiver not found')
+                # Store in the map.
+                self._mapMidTransceiver[localId] = transceiver
+                receiveResults.append(HandlerReceiveResult(
+                    localId=localId,
+                    track=transceiver.receiver.track,
+                    rtpReceiver=transceiver.receiver
+                ))
+            results.append(receiveResults)
+        return results
+
+    @staticmethod
+    def _canRenewReceiver(transceiver: RTCRtpTransceiver) -> bool:
+        # The private attribute written by _renewReceiver(), checked against aiortc 1.15. Without it
+        # the closed media section is not reused, the next consumer gets a fresh one.
+        return hasattr(transceiver, '_RTCRtpTransceiver__receiver')
+
+    @staticmethod
+    def _renewReceiver(transceiver: RTCRtpTransceiver):
+        # NOTE: aiortc receivers can not be started again once stopped, and there is no public api
+        # to replace the receiver of a transceiver. The new one gets its track from the next
+        # pc.setRemoteDescription() and is started by the next connection of the transports.
+        transceiver._RTCRtpTransceiver__receiver = RTCRtpReceiver(transceiver.kind, transceiver.receiver.transport)
+
+    async def _negotiateRecvRound(self, operations: List[tuple], pendingResults: List[Any]):
+        offer: RTCSessionDescription = RTCSessionDescription(
+            type='offer',
+            sdp=self.remoteSdp.getSdp()
+        )
+        logging.debug(f'_negotiateRecv() | calling pc.setRemoteDescription() [offer:{offer}]')
+        await self.pc.setRemoteDescription(offer)
+        answer: RTCSessionDescription = await self.pc.createAnswer()
+        localSdpDict = sdp_transform.parse(answer.sdp)
+        answerMediaDicts = {str(m.get('mid')): m for m in localSdpDict.get('media')}
+        for (name, item), pendingResult in zip(operations, pendingResults):
+            if name != 'receive':
+                continue
+            for options, localId in zip(item, pendingResult):
+                # May need to modify codec parameters in the answer based on codec
+                # parameters in the offer.
+                applyCodecParameters(offerRtpParameters=options.rtpParameters,
+                                     answerMediaDict=answerMediaDicts[localId])
+        answer = RTCSessionDescription(
+            type='answer',
+            sdp=sdp_transform.write(localSdpDict)
+        )
+        if not self._transportReady:
+            await self._setupTransport(localDtlsRole='client', localSdpDict=localSdpDict)
+        logging.debug(f'_negotiateRecv() | calling pc.setLocalDescription() [answer:{answer}]')
+        await self.pc.setLocalDescription(answer)
     
     async def _setupTransport(self, localDtlsRole: DtlsRole, localSdpDict: dict={}):
         if localSdpDict == {}:
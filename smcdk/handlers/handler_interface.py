@@ -107,6 +107,13 @@ class HandlerInterface(EnhancedEventEmitter):
     ) -> HandlerReceiveResult:
         pass
 
+    async def receiveMany(self, optionsList: List[HandlerReceiveOptions]) -> List[HandlerReceiveResult]:
+        """
+        receive several tracks within a single SDP negotiation,
+        results are in the same order as optionsList
+        """
+        pass
+
     async def stopReceiving(self, localId: str):
         pass
 
@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from importlib import metadata
+from typing import Dict, Optional, Tuple, Callable, Awaitable, Iterable
+
+from ..rtp_parameters import RtpCapabilities
+from ..sctp_parameters import SctpCapabilities
+
+
+def _packageVersion(name: str) -> str:
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return 'none'
+
+
+class NativeCapabilitiesCache:
+    """
+    process-wide cache of the native RTP and SCTP capabilities of the handlers,
+    so that only the first Device.load() of a process has to run a RTCPeerConnection offer,
+    entries are keyed by handler name, aiortc/av versions and the kinds of the handler's tracks,
+    optionally persisted as json files into a directory shared by processes
+    """
+
+    def __init__(self):
+        self._rtpCapabilities: Dict[Tuple, RtpCapabilities] = {}
+        self._sctpCapabilities: Dict[Tuple, SctpCapabilities] = {}
+        # Pending computations indexed by key, concurrent loads wait for them.
+        self._pending: Dict[Tuple, asyncio.Future] = {}
+        self._directoryPath: Optional[str] = None
+        self._versions: Tuple[str, str] = (_packageVersion('aiortc'), _packageVersion('av'))
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def directoryPath(self) -> Optional[str]:
+        return self._directoryPath
+
+    def enableDiskCache(self, directoryPath: str):
+        """
+        persist native RTP capabilities into the given directory, and read them from it on memory miss
+        """
+        os.makedirs(directoryPath, exist_ok=True)
+        self._directoryPath = directoryPath
+
+    def disableDiskCache(self):
+        self._directoryPath = None
+
+    def makeKey(self, handlerName: str, trackKinds: Iterable[str]) -> Tuple:
+        return (handlerName,) + self._versions + (tuple(sorted(trackKinds)),)
+
+    async def getRtpCapabilities(self, key: Tuple,
+                                 compute: Callable[[], Awaitable[RtpCapabilities]]) -> RtpCapabilities:
+        """
+        :return: a copy of the cached capabilities, compute and cache them on miss
+        """
+        rtpCapabilities = self._rtpCapabilities.get(key)
+        if rtpCapabilities is None and key in self._pending:
+            rtpCapabilities = await asyncio.shield(self._pending[key])
+        if rtpCapabilities is None:
+            rtpCapabilities = self._readFile(key)
+            if rtpCapabilities is not None:
+                self._rtpCapabilities[key] = rtpCapabilities
+        if rtpCapabilities is not None:
+            self.hits += 1
+            return rtpCapabilities.copy(deep=True)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            rtpCapabilities = await compute()
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved, nobody may be waiting for it.
+            future.exception()
+            raise
+        else:
+            future.set_result(rtpCapabilities)
+        finally:
+            del self._pending[key]
+        self._rtpCapabilities[key] = rtpCapabilities
+        self._writeFile(key, rtpCapabilities)
+        logging.debug(f'NativeCapabilitiesCache | cached native RTP capabilities [key:{key}]')
+        return rtpCapabilities.copy(deep=True)
+
+    async def getSctpCapabilities(self, key: Tuple,
+                                  compute: Callable[[], Awaitable[SctpCapabilities]]) -> SctpCapabilities:
+        sctpCapabilities = self._sctpCapabilities.get(key)
+        if sctpCapabilities is None:
+            sctpCapabilities = await compute()
+            self._sctpCapabilities[key] = sctpCapabilities
+        return sctpCapabilities.copy(deep=True)
+
+    def invalidate(self, key: Optional[Tuple] = None):
+        """
+        drop the given entry, or all entries if key is None, from memory and from the disk cache directory
+        """
+        if key is None:
+            keys = set(self._rtpCapabilities.keys()) | set(self._sctpCapabilities.keys())
+            self._rtpCapabilities.clear()
+            self._sctpCapabilities.clear()
+            if self._directoryPath:
+                for fileName in os.listdir(self._directoryPath):
+                    if fileName.startswith('native_capabilities_') and fileName.endswith('.json'):
+                        os.remove(os.path.join(self._directoryPath, fileName))
+        else:
+            keys = {key}
+            self._rtpCapabilities.pop(key, None)
+            self._sctpCapabilities.pop(key, None)
+            filePath = self._filePath(key)
+            if filePath and os.path.exists(filePath):
+                os.remove(filePath)
+        logging.debug(f'NativeCapabilitiesCache | invalidated [keys:{keys}]')
+
+    def _filePath(self, key: Tuple) -> Optional[str]:
+        if not self._directoryPath:
+            return None
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self._directoryPath, f'native_capabilities_{digest}.json')
+
+    def _readFile(self, key: Tuple) -> Optional[RtpCapabilities]:
+        filePath = self._filePath(key)
+        if not filePath or not os.path.exists(filePath):
+            return None
+        try:
+            with open(filePath, 'r') as f:
+                content = json.load(f)
+            if content.get('key') != repr(key):
+                return None
+            return RtpCapabilities(**content['rtpCapabilities'])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f'NativeCapabilitiesCache | ignore broken cache file {filePath}: {e}')
+            return None
+
+    def _writeFile(self, key: Tuple, rtpCapabilities: RtpCapabilities):
+        filePath = self._filePath(key)
+        if not filePath:
+            return
+        # Write then rename, so that concurrent processes never read a partial file.
+        tmpFilePath = f'{filePath}.{os.getpid()}.tmp'
+        try:
+            with open(tmpFilePath, 'w') as f:
+                json.dump({'key': repr(key), 'rtpCapabilities': json.loads(rtpCapabilities.json())}, f)
+            os.replace(tmpFilePath, filePath)
+        except OSError as e:
+            logging.warning(f'NativeCapabilitiesCache | failed to write cache file {filePath}: {e}')
+
+
+# The process-wide cache shared by every handler.
+nativeCapabilitiesCache = NativeCapabilitiesCache()
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from ..errors import InvalidStateError
+from ..timing_stats import TimingStats
+
+
+class _Operation:
+    __slots__ = ('name', 'item', 'negotiate', 'mergeable', 'future', 'enqueueTime')
+
+    def __init__(self, name: str, item: Any, negotiate: Callable[[List[Tuple[str, Any]]], Awaitable[List[Any]]],
+                 mergeable: bool, future: asyncio.Future):
+        self.name = name
+        self.item = item
+        self.negotiate = negotiate
+        self.mergeable = mergeable
+        self.future = future
+        self.enqueueTime = time.perf_counter()
+
+
+class NegotiationQueue:
+    """
+    serializes the SDP negotiations of a handler on its RTCPeerConnection: the operations run one round after another
+    in the order they were pushed, and the adjacent mergeable operations sharing the same negotiate function
+    are handed together to a single round, i.e. a single offer/answer
+    """
+    # upper bounds(in seconds) of the timing histogram buckets, the last bucket holds the rest
+    TIMING_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+    def __init__(self, maxBatchSize: int = 50):
+        """
+        :param maxBatchSize: the max number of operations merged into a round
+        """
+        self._maxBatchSize = maxBatchSize
+        self._operations: Deque[_Operation] = deque()
+        # task running the rounds, alive while there are operations
+        self._drainTask: Optional[asyncio.Task] = None
+        self._closed = False
+        # operation name -> time spent queued
+        self._waitStats: Dict[str, TimingStats] = {}
+        self._roundStats = TimingStats(NegotiationQueue.TIMING_BUCKETS)
+        self._numMergedOperations: int = 0
+
+    def __len__(self):
+        return len(self._operations)
+
+    @property
+    def busy(self) -> bool:
+        return self._drainTask is not None
+
+    def push(self, name: str, item: Any, negotiate: Callable[[List[Tuple[str, Any]]], Awaitable[List[Any]]],
+             mergeable: bool = False) -> asyncio.Future:
+        """
+        queue an operation without waiting for it
+
+        :param name: name of the operation, the wait time is measured per name
+        :param item: argument of the operation
+        :param negotiate: coroutine function running a round: receives the (name, item) of the merged operations
+            and returns their results in the same order
+        :param mergeable: whether the operation can share a round with its mergeable neighbours of same negotiate
+        :return: future of the operation's result, cancelling it drops the operation if it has not run yet
+        """
+        if self._closed:
+            raise InvalidStateError('closed')
+        future = asyncio.get_event_loop().create_future()
+        self._operations.append(_Operation(name, item, negotiate, mergeable, future))
+        if self._drainTask is None:
+            self._drainTask = asyncio.ensure_future(self._drain())
+        return future
+
+    async def run(self, name: str, item: Any, negotiate: Callable[[List[Tuple[str, Any]]], Awaitable[List[Any]]],
+                  mergeable: bool = False) -> Any:
+        """
+        queue an operation and wait for its result, see push()
+        """
+        return await self.push(name, item, negotiate, mergeable)
+
+    def close(self):
+        """
+        fail the operations which have not run yet, the running round goes on
+        """
+        self._closed = True
+        while self._operations:
+            operation = self._operations.popleft()
+            if not operation.future.done():
+                operation.future.set_exception(InvalidStateError('closed'))
+
+    def stats(self) -> dict:
+        """
+        :return: {
+                'pending': int, number of queued operations,
+                'mergedOperations': int, number of operations which shared a round with others,
+                'wait': {operation name: {'count', 'totalSeconds', 'maxSeconds',
+                    'buckets': [(upper bound in seconds or None, count)]}}, time spent queued,
+                'negotiation': {'count', 'totalSeconds', 'maxSeconds', 'buckets'}, duration of the rounds
+            }
+        """
+        return {
+            'pending': len(self._operations),
+            'mergedOperations': self._numMergedOperations,
+            'wait': {name: stats.dict() for name, stats in self._waitStats.items()},
+            'negotiation': self._roundStats.dict()
+        }
+
+    def resetStats(self):
+        self._waitStats.clear()
+        self._roundStats = TimingStats(NegotiationQueue.TIMING_BUCKETS)
+        self._numMergedOperations = 0
+
+    def _nextRound(self) -> List[_Operation]:
+        batch: List[_Operation] = []
+        while self._operations:
+            operation = self._operations[0]
+            if batch and not (batch[0].mergeable and operation.mergeable
+                              and operation.negotiate == batch[0].negotiate
+                              and len(batch) < self._maxBatchSize):
+                break
+            self._operations.popleft()
+            # cancelled by its caller before it ran
+            if operation.future.done():
+                continue
+            batch.append(operation)
+        return batch
+
+    async def _drain(self):
+        batch: List[_Operation] = []
+        try:
+            while self._operations:
+                batch = self._nextRound()
+                if not batch:
+                    continue
+                startTime = time.perf_counter()
+                for operation in batch:
+                    stats = self._waitStats.get(operation.name)
+                    if stats is None:
+                        stats = self._waitStats[operation.name] = TimingStats(NegotiationQueue.TIMING_BUCKETS)
+                    stats.record(startTime - operation.enqueueTime)
+                if len(batch) > 1:
+                    self._numMergedOperations += len(batch)
+                try:
+                    results = await batch[0].negotiate([(operation.name, operation.item) for operation in batch])
+                except Exception as error:
+                    logging.error(f'NegotiationQueue round failed [operations:{[op.name for op in batch]}]: {error!r}')
+                    for operation in batch:
+                        if not operation.future.done():
+                            operation.future.set_exception(error)
+                else:
+                    for operation, result in zip(batch, results):
+                        if not operation.future.done():
+                            operation.future.set_result(result)
+                finally:
+                    self._roundStats.record(time.perf_counter() - startTime)
+        finally:
+            self._drainTask = None
+            # cancelled with the loop, in the middle of a round
+            for operation in batch:
+                if not operation.future.done():
+                    operation.future.cancel()
@@ -8,6 +8,7 @@ else:
 import re
 import logging
 from aiortc import RTCIceParameters, RTCIceCandidate, RTCDtlsParameters
+from ...deps.sdp_transform import sdp_transform
 from ...producer import ProducerCodecOptions
 from ...rtp_parameters import RtpParameters, RtpCodecParameters, RtpEncodingParameters
 from ...sctp_parameters import SctpParameters
@@ -31,6 +32,8 @@ class MediaSection:
         planB:bool=False
     ):
         self._mediaDict: dict={}
+        # Rendered SDP text of this section, None until rendered or after a change.
+        self._sdp: Optional[str]=None
         self._planB=planB
         if iceParameters:
             self.setIceParameters(iceParameters)
@@ -55,12 +58,23 @@ class MediaSection:
     
     def getDict(self):
         return self._mediaDict
+
+    def getSdp(self) -> str:
+        # NOTE: Changes made to getDict() from outside must be followed by invalidateSdp().
+        if self._sdp is None:
+            self._sdp = sdp_transform.writeMedia(self._mediaDict)
+        return self._sdp
+
+    def invalidateSdp(self):
+        self._sdp = None
     
     def setIceParameters(self, iceParameters: RTCIceParameters):
         self._mediaDict['iceUfrag'] = iceParameters.usernameFragment
         self._mediaDict['icePwd'] = iceParameters.password
+        self._sdp = None
     
     def disable(self):
+        self._sdp = None
         self._mediaDict['direction'] = 'inactive'
         self._mediaDict.pop('ext', None)
         self._mediaDict.pop('ssrcs', None)
@@ -70,6 +84,7 @@ class MediaSection:
         self._mediaDict.pop('rids', None)
     
     def close(self):
+        self._sdp = None
         self._mediaDict['direction'] = 'inactive'
         self._mediaDict['port'] = 0
         self._mediaDict.pop('ext', None)
@@ -246,6 +261,7 @@ class AnswerMediaSection(MediaSection):
                         'maxMessageSize': sctpParameters.maxMessageSize
                     }
     def setDtlsRole(self, role: str):
+        self._sdp = None
         if role == 'client':
             self._mediaDict['setup'] = 'active'
         elif role == 'server':
@@ -385,10 +401,12 @@ class OfferMediaSection(MediaSection):
                         'maxMessageSize': sctpParameters.maxMessageSize
                     }
     def setDtlsRole(self, _):
+        self._sdp = None
         # Always 'actpass'.
         self._mediaDict['setup'] = 'actpass'
     
     def planBReceive(self, offerRtpParameters: RtpParameters, streamId: str, trackId: str):
+        self._sdp = None
         encoding = offerRtpParameters.encodings[0]
         ssrc = encoding.ssrc
         rtxSsrc = encoding.rtx.ssrc if encoding.rtx and encoding.rtx.ssrc else None
@@ -424,6 +442,7 @@ class OfferMediaSection(MediaSection):
             })
     
     def planBStopReceiving(self, offerRtpParameters: RtpParameters):
+        self._sdp = None
         encoding = offerRtpParameters.encodings[0]
         ssrc = encoding.ssrc
         rtxSsrc = encoding.rtx.ssrc if encoding.rtx and encoding.rtx.ssrc else None
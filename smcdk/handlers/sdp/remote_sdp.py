@@ -86,6 +86,8 @@ class RemoteSdp:
         logging.debug(f'updateIceParameters() [iceParameters:{iceParameters}]')
         self._iceParameters = iceParameters
         self._sdpDict['icelite'] = 'ice-lite' if iceParameters.iceLite else None
+        for mediaSection in self._mediaSections:
+            mediaSection.setIceParameters(iceParameters)
     
     def updateDtlsRole(self, role: DtlsRole):
         logging.debug(f'updateDtlsRole() [role:{role}]')
@@ -94,10 +96,10 @@ class RemoteSdp:
             for mediaSection in self._mediaSections:
                 mediaSection.setDtlsRole(role)
         
-    def getNextMediaSectionIdx(self):
+    def getNextMediaSectionIdx(self, reuseClosed: bool = True):
         # If a closed media section is found, return its index.
         for idx, mediaSection in enumerate(self._mediaSections):
-            if mediaSection.closed:
+            if reuseClosed and mediaSection.closed:
                 logging.debug(f'remoteSdp | getNextMediaSectionIdx() Closed media sections found { mediaSection}')
                 return MediaSectionIdx(idx=idx, reuseMid=mediaSection.mid)
         # If no closed media section is found, return next one.
@@ -143,10 +145,11 @@ class RemoteSdp:
         kind: Literal['audio', 'video', 'application'],
         offerRtpParameters: RtpParameters,
         streamId: str,
-        trackId: str
+        trackId: str,
+        reuseMid: Optional[str]=None
     ):
         idx: int = self._midToIndex.get(str(mid), -1)
-        if idx != -1:
+        if idx != -1 and not reuseMid:
             mediaSection = self._mediaSections[idx]
             # Plan-B.
             mediaSection.planBReceive(offerRtpParameters, streamId, trackId)
@@ -165,11 +168,12 @@ class RemoteSdp:
                 streamId=streamId,
                 trackId=trackId
             )
-            # Let's try to recycle a closed media section (if any).
-            # NOTE: Yes, we can recycle a closed m=audio section with a new m=video.
-            closedMediaSections = [ms for ms in self._mediaSections if ms.closed]
-            if closedMediaSections:
-                self._replaceMediaSection(mediaSection, closedMediaSections[0].mid)
+            # NOTE: Unlike browsers, aiortc binds a mid to its m-line for good, so a closed media section
+            # is only recycled under its own mid, by a new section of the same kind.
+            if reuseMid:
+                if not self._mediaSections[self._midToIndex[str(reuseMid)]].closed:
+                    raise Exception(f"media section with mid '{reuseMid}' is not closed")
+                self._replaceMediaSection(mediaSection, reuseMid)
             else:
                 self._addMediaSection(mediaSection)
             
@@ -180,7 +184,10 @@ class RemoteSdp:
         mediaSection = self._mediaSections[idx]
         mediaSection.disable()
     
-    def closeMediaSection(self, mid: str):
+    def closeMediaSection(self, mid: str) -> bool:
+        """
+        :return: whether it is closed, the first one is only disabled
+        """
         idx: int = self._midToIndex.get(str(mid), -1)
         if idx == -1:
             raise Exception(f"no media section found with mid '{mid}'")
@@ -190,10 +197,11 @@ class RemoteSdp:
         if mid == self._firstMid:
             logging.debug(f'closeMediaSection() | cannot close first media section, disabling it instead [mid:{mid}]')
             self.disableMediaSection(mid)
-            return
+            return False
         mediaSection.close()
         # Regenerate BUNDLE mids.
         self._regenerateBundleMids()
+        return True
     
     def planBStopReceiving(self, mid: str, offerRtpParameters: RtpParameters):
         idx: int = self._midToIndex.get(str(mid), -1)
@@ -230,7 +238,11 @@ class RemoteSdp:
     def getSdp(self) -> str:
         # Increase SDP version.
         self._sdpDict['origin']['sessionVersion'] += 1
-        return sdp_transform.write(self._sdpDict)
+        # Only the session level lines are written here, every media section
+        # keeps its own rendered text until it changes.
+        sdpLines = [sdp_transform.writeSession(self._sdpDict)]
+        sdpLines.extend(mediaSection.getSdp() for mediaSection in self._mediaSections)
+        return '\r\n'.join(sdpLines)
     
     def _addMediaSection(self, newMediaSection: MediaSection):
         if self._firstMid == None:
@@ -266,6 +278,8 @@ class RemoteSdp:
                 raise Exception(f"no media section found with mid '{newMediaSection.mid}'")
             # Replace the index in the vector with the new media section.
             self._mediaSections[idx] = newMediaSection
+            # Plan-B sections are updated in place, so drop their rendered text.
+            newMediaSection.invalidateSdp()
             # Update the SDP object.
             self._sdpDict['media'][idx] = newMediaSection.getDict()
     
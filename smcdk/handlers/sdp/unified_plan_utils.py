@@ -1,9 +1,9 @@
 import re
 from typing import List
-from ...rtp_parameters import RtpEncodingParameters, RTX
+from ...rtp_structs import RtpEncodingParametersStruct, RtxStruct
 
 
-def getRtpEncodings(offerMediaDict: dict) -> List[RtpEncodingParameters]:
+def getRtpEncodings(offerMediaDict: dict) -> List[RtpEncodingParametersStruct]:
     ssrcs = set()
     for line in offerMediaDict.get('ssrcs', []):
         ssrc = line.get('id')
@@ -37,11 +37,11 @@ def getRtpEncodings(offerMediaDict: dict) -> List[RtpEncodingParameters]:
     for ssrc in ssrcs:
         ssrcToRtxSsrc[ssrc] = None
     
-    encodings: List[RtpEncodingParameters] = []
+    encodings: List[RtpEncodingParametersStruct] = []
     for ssrc, rtxSsrc in ssrcToRtxSsrc.items():
-        encoding = RtpEncodingParameters(ssrc=ssrc)
+        encoding = RtpEncodingParametersStruct(ssrc=ssrc)
         if rtxSsrc != None:
-            encoding.rtx = RTX(ssrc=rtxSsrc)
+            encoding.rtx = RtxStruct(ssrc=rtxSsrc)
         encodings.append(encoding)
     return encodings
 
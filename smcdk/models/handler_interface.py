@@ -12,6 +12,7 @@ from ..ortc import ExtendedRtpCapabilities
 from ..sctp_parameters import SctpParameters, SctpStreamParameters
 from ..producer import ProducerCodecOptions
 from ..rtp_parameters import RtpCodecCapability, RtpParameters, MediaKind, RtpEncodingParameters
+from ..rtp_structs import RtpParametersStruct
 
 
 class HandlerRunOptions(BaseModel):
@@ -49,7 +50,11 @@ class HandlerSendResult(BaseModel):
 class HandlerReceiveOptions(BaseModel):
     trackId: str
     kind: MediaKind
-    rtpParameters: RtpParameters
+    # Validated by Transport.consume(), see rtp_structs.
+    rtpParameters: RtpParametersStruct
+
+    class Config:
+        arbitrary_types_allowed=True
 
 class HandlerReceiveResult(BaseModel):
     localId: str
@@ -1,6 +1,9 @@
+import hashlib
 import logging
-from typing import List, Optional
+from collections import OrderedDict
+from typing import Dict, List, Optional
 from .rtp_parameters import RtpCodec, RtcpFeedback, RtpHeaderExtension, RtpCapabilities, ExtendedRtpCapabilities, ExtendedCodec, ExtendedHeaderExtension, RtpCodecCapability, RtpHeaderExtension, MediaKind, RtpParameters, RtpCodecParameters, RtpHeaderExtensionParameters, RtpEncodingParameters, RtcpParameters
+from .rtp_structs import RtpParametersStruct, RtpEncodingParametersStruct, RtcpParametersStruct
 from .deps.h264_profile_level_id import h264_profile_level_id as h264
 
 
@@ -338,13 +341,13 @@ def reduceCodecs(codecs: List[RtpCodecParameters], capCodec: Optional[RtpCodecCa
     return filteredCodecs
 
 # Create RTP parameters for a Consumer for the RTP probator.
-def generateProbatorRtpParameters(videoRtpParameters: RtpParameters) -> RtpParameters:
-    videoRtpParameters = videoRtpParameters.copy(deep=True)
+def generateProbatorRtpParameters(videoRtpParameters: RtpParametersStruct) -> RtpParametersStruct:
+    videoRtpParameters = videoRtpParameters.copy()
 
-    rtpParameters: RtpParameters = RtpParameters(
+    rtpParameters: RtpParametersStruct = RtpParametersStruct(
         mid=RTP_PROBATOR_MID,
-        encodings=[RtpEncodingParameters(ssrc=RTP_PROBATOR_SSRC)],
-        rtcp=RtcpParameters(cname='probator')
+        encodings=[RtpEncodingParametersStruct(ssrc=RTP_PROBATOR_SSRC)],
+        rtcp=RtcpParametersStruct(cname='probator')
     )
 
     rtpParameters.codecs.append(videoRtpParameters.codecs[0])
@@ -366,3 +369,117 @@ def canReceive(rtpParameters: RtpParameters, extendedRtpCapabilities: ExtendedRt
     firstMediaCodec = rtpParameters.codecs[0]
 
     return len([codec for codec in extendedRtpCapabilities.codecs if codec.remotePayloadType == firstMediaCodec.payloadType]) > 0
+
+
+class _OrtcCacheEntry:
+    __slots__ = ('extendedRtpCapabilities', 'recvRtpCapabilities', 'sendingRtpParametersByKind',
+                 'sendingRemoteRtpParametersByKind')
+
+    def __init__(self, extendedRtpCapabilities: ExtendedRtpCapabilities):
+        self.extendedRtpCapabilities: ExtendedRtpCapabilities = extendedRtpCapabilities
+        self.recvRtpCapabilities: Optional[RtpCapabilities] = None
+        self.sendingRtpParametersByKind: Dict[str, RtpParametersStruct] = {}
+        self.sendingRemoteRtpParametersByKind: Dict[str, RtpParametersStruct] = {}
+
+# LRU cache of the ORTC negotiation results, keyed by a hash of the local and
+# remote capabilities, and by a hash of the resulting ExtendedRtpCapabilities
+# for the calls taking them, whatever object carries them. Every client connecting to the same router with the same
+# handler negotiates the very same capabilities, so only the first one pays.
+#
+# The cached results are never handed out, every call returns a copy which the
+# caller owns: the ExtendedRtpCapabilities and receiving RTP capabilities are
+# deep copied (once per Device load), the sending RTP parameters are cached as
+# RtpParametersStruct, whose copies are cheap, for AiortcHandler.
+class OrtcCache:
+    def __init__(self, maxSize: int = 64):
+        self._maxSize: int = maxSize
+        self._entries: 'OrderedDict[str, _OrtcCacheEntry]' = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+    def clear(self):
+        self._entries.clear()
+
+    def getExtendedRtpCapabilities(self, localCaps: RtpCapabilities, remoteCaps: RtpCapabilities) -> ExtendedRtpCapabilities:
+        # NOTE: the key must be computed first, matchCodecs() modifies localCaps.
+        key = 'caps:' + hashlib.sha1(f'{localCaps.json()}|{remoteCaps.json()}'.encode()).hexdigest()
+        entry = self._get(key)
+        if entry is None:
+            entry = self._put(key, _OrtcCacheEntry(getExtendedRtpCapabilities(localCaps, remoteCaps)))
+            # Also found by the content of its copies.
+            self._put(self._contentKey(entry.extendedRtpCapabilities), entry)
+        return entry.extendedRtpCapabilities.copy(deep=True)
+
+    def getRecvRtpCapabilities(self, extendedRtpCapabilities: ExtendedRtpCapabilities) -> RtpCapabilities:
+        entry = self._entryOf(extendedRtpCapabilities)
+        if entry.recvRtpCapabilities is None:
+            self.misses += 1
+            entry.recvRtpCapabilities = getRecvRtpCapabilities(entry.extendedRtpCapabilities)
+        else:
+            self.hits += 1
+        return entry.recvRtpCapabilities.copy(deep=True)
+
+    def getSendingRtpParameters(self, kind: MediaKind, extendedRtpCapabilities: ExtendedRtpCapabilities) -> RtpParametersStruct:
+        entry = self._entryOf(extendedRtpCapabilities)
+        rtpParameters = entry.sendingRtpParametersByKind.get(kind)
+        if rtpParameters is None:
+            self.misses += 1
+            rtpParameters = RtpParametersStruct.fromModel(getSendingRtpParameters(kind, entry.extendedRtpCapabilities))
+            entry.sendingRtpParametersByKind[kind] = rtpParameters
+        else:
+            self.hits += 1
+        return rtpParameters.copy()
+
+    def getSendingRemoteRtpParameters(self, kind: MediaKind, extendedRtpCapabilities: ExtendedRtpCapabilities) -> RtpParametersStruct:
+        entry = self._entryOf(extendedRtpCapabilities)
+        rtpParameters = entry.sendingRemoteRtpParametersByKind.get(kind)
+        if rtpParameters is None:
+            self.misses += 1
+            rtpParameters = RtpParametersStruct.fromModel(
+                getSendingRemoteRtpParameters(kind, entry.extendedRtpCapabilities))
+            entry.sendingRemoteRtpParametersByKind[kind] = rtpParameters
+        else:
+            self.hits += 1
+        return rtpParameters.copy()
+
+    # Find (or create) the entry of the given extended RTP capabilities, which
+    # usually are a copy returned by getExtendedRtpCapabilities(). Keyed by their
+    # content, so that a copy changed in place gets an entry of its own.
+    def _entryOf(self, extendedRtpCapabilities: ExtendedRtpCapabilities) -> _OrtcCacheEntry:
+        key = self._contentKey(extendedRtpCapabilities)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._put(key, _OrtcCacheEntry(extendedRtpCapabilities.copy(deep=True)))
+        else:
+            self._entries.move_to_end(key)
+        return entry
+
+    @staticmethod
+    def _contentKey(extendedRtpCapabilities: ExtendedRtpCapabilities) -> str:
+        return 'extended:' + hashlib.sha1(extendedRtpCapabilities.json().encode()).hexdigest()
+
+    def _get(self, key: str) -> Optional[_OrtcCacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key: str, entry: _OrtcCacheEntry) -> _OrtcCacheEntry:
+        self._entries[key] = entry
+        while len(self._entries) > self._maxSize:
+            self._entries.popitem(last=False)
+        logging.debug(f'OrtcCache | new entry [key:{key}, size:{len(self._entries)}]')
+        return entry
+
+# The process-wide ORTC cache used by Device and AiortcHandler.
+ortcCache = OrtcCache()
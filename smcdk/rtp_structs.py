@@ -0,0 +1,259 @@
+from typing import Any, Dict, List, Optional, Type
+
+from pydantic import BaseModel
+
+from .rtp_parameters import RtcpFeedback, RtpCodecParameters, RtpHeaderExtensionParameters, RTX, \
+    RtpEncodingParameters, RtcpParameters, RtpParameters
+
+
+# Slotted counterparts of the RTP parameters models of rtp_parameters, used on
+# the negotiation hot path (AiortcHandler.send(), Transport.consume(), ORTC and
+# SDP helpers) instead of the pydantic models, whose deep copies and dict()
+# cost hundreds of microseconds per producer or consumer.
+#
+# They are not validated: the models are validated once at the public API
+# boundary, converted with fromModel(), and handed back to the application with
+# toModel(). Their attributes have the names, defaults and order of the fields
+# of the models, so that the code reading either of them is the same, and
+# dict() returns what the model dict() would.
+class _Struct:
+    __slots__ = ()
+    # The mirrored pydantic model.
+    MODEL: Type[BaseModel] = BaseModel
+    # Slot -> struct class of its value, or of the items of its list value.
+    NESTED: Dict[str, type] = {}
+
+    @classmethod
+    def fromModel(cls, model: BaseModel) -> '_Struct':
+        struct = object.__new__(cls)
+        for name in cls.__slots__:
+            value = getattr(model, name)
+            structClass = cls.NESTED.get(name)
+            if structClass is None or value is None:
+                value = _copyValue(value)
+            elif isinstance(value, list):
+                value = [structClass.fromModel(item) for item in value]
+            else:
+                value = structClass.fromModel(value)
+            setattr(struct, name, value)
+        return struct
+
+    @classmethod
+    def fromDict(cls, values: dict) -> '_Struct':
+        """
+        :param values: a dict() of this struct or of its model, missing keys take the defaults
+        """
+        values = dict(values)
+        for name, structClass in cls.NESTED.items():
+            value = values.get(name)
+            if isinstance(value, list):
+                values[name] = [structClass.fromDict(item) if isinstance(item, dict) else item for item in value]
+            elif isinstance(value, dict):
+                values[name] = structClass.fromDict(value)
+        return cls(**values)
+
+    def toModel(self) -> BaseModel:
+        """
+        :return: the pydantic model, built without validation like BaseModel.construct() does
+        """
+        values = {name: _modelValue(getattr(self, name)) for name in self.__slots__}
+        model = self.MODEL.__new__(self.MODEL)
+        object.__setattr__(model, '__dict__', values)
+        object.__setattr__(model, '__fields_set__', set(values))
+        return model
+
+    def copy(self) -> '_Struct':
+        """
+        :return: a deep copy
+        """
+        struct = object.__new__(type(self))
+        for name in self.__slots__:
+            setattr(struct, name, _copyValue(getattr(self, name)))
+        return struct
+
+    def dict(self, exclude_none: bool = False) -> dict:
+        result = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is None and exclude_none:
+                continue
+            result[name] = _dictValue(value, exclude_none)
+        return result
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+# Immutable values, returned as they are.
+_SCALAR_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+def _copyValue(value: Any) -> Any:
+    if type(value) in _SCALAR_TYPES:
+        return value
+    elif isinstance(value, _Struct):
+        return value.copy()
+    elif isinstance(value, list):
+        return [_copyValue(item) for item in value]
+    elif isinstance(value, dict):
+        return {key: _copyValue(item) for key, item in value.items()}
+    return value
+
+
+def modelDict(model: BaseModel, exclude_none: bool = False) -> dict:
+    """
+    dict() of a RTP parameters model, e.g. a Producer's, without the per field machinery of BaseModel.dict():
+    these models have neither aliases nor private or excluded fields
+
+    :param model: model of rtp_parameters, or struct
+    """
+    if isinstance(model, _Struct):
+        return model.dict(exclude_none=exclude_none)
+    result = {}
+    for name, value in model.__dict__.items():
+        if value is None and exclude_none:
+            continue
+        result[name] = _dictValue(value, exclude_none)
+    return result
+
+
+def _dictValue(value: Any, exclude_none: bool) -> Any:
+    # NOTE: like pydantic, exclude_none drops the None fields but not the None items of lists and dicts.
+    if type(value) in _SCALAR_TYPES:
+        return value
+    elif isinstance(value, (_Struct, BaseModel)):
+        return modelDict(value, exclude_none=exclude_none)
+    elif isinstance(value, list):
+        return [_dictValue(item, exclude_none) for item in value]
+    elif isinstance(value, dict):
+        return {key: _dictValue(item, exclude_none) for key, item in value.items()}
+    return value
+
+
+def _modelValue(value: Any) -> Any:
+    if type(value) in _SCALAR_TYPES:
+        return value
+    elif isinstance(value, _Struct):
+        return value.toModel()
+    elif isinstance(value, list):
+        return [_modelValue(item) for item in value]
+    elif isinstance(value, dict):
+        return {key: _modelValue(item) for key, item in value.items()}
+    return value
+
+
+class RtcpFeedbackStruct(_Struct):
+    __slots__ = ('type', 'parameter')
+    MODEL = RtcpFeedback
+
+    def __init__(self, type: str, parameter: str = ''):
+        self.type = type
+        self.parameter = parameter
+
+    # The most numerous structs, copied and serialized without the generic walk.
+    def copy(self) -> 'RtcpFeedbackStruct':
+        return RtcpFeedbackStruct(self.type, self.parameter)
+
+    def dict(self, exclude_none: bool = False) -> dict:
+        if self.parameter is None and exclude_none:
+            return {'type': self.type}
+        return {'type': self.type, 'parameter': self.parameter}
+
+
+class RtpCodecParametersStruct(_Struct):
+    __slots__ = ('mimeType', 'clockRate', 'channels', 'rtcpFeedback', 'parameters', 'payloadType')
+    MODEL = RtpCodecParameters
+    NESTED = {'rtcpFeedback': RtcpFeedbackStruct}
+
+    def __init__(self, mimeType: str, clockRate: int, payloadType: int, channels: Optional[int] = None,
+                 rtcpFeedback: Optional[List[RtcpFeedbackStruct]] = None, parameters: Optional[dict] = None):
+        self.mimeType = mimeType
+        self.clockRate = clockRate
+        self.channels = channels
+        self.rtcpFeedback = rtcpFeedback if rtcpFeedback is not None else []
+        self.parameters = parameters if parameters is not None else {}
+        self.payloadType = payloadType
+
+
+class RtpHeaderExtensionParametersStruct(_Struct):
+    __slots__ = ('uri', 'id', 'encrypt', 'parameters')
+    MODEL = RtpHeaderExtensionParameters
+
+    def __init__(self, uri: str, id: int, encrypt: Optional[bool] = False, parameters: Optional[dict] = None):
+        self.uri = uri
+        self.id = id
+        self.encrypt = encrypt
+        self.parameters = parameters if parameters is not None else {}
+
+    def copy(self) -> 'RtpHeaderExtensionParametersStruct':
+        return RtpHeaderExtensionParametersStruct(self.uri, self.id, self.encrypt, _copyValue(self.parameters))
+
+
+class RtxStruct(_Struct):
+    __slots__ = ('ssrc',)
+    MODEL = RTX
+
+    def __init__(self, ssrc: int):
+        self.ssrc = ssrc
+
+
+class RtpEncodingParametersStruct(_Struct):
+    __slots__ = ('ssrc', 'rid', 'codecPayloadType', 'rtx', 'dtx', 'scalabilityMode', 'scaleResolutionDownBy',
+                 'maxBitrate', 'maxFramerate', 'adaptivePtime', 'priority', 'networkPriority')
+    MODEL = RtpEncodingParameters
+    NESTED = {'rtx': RtxStruct}
+
+    def __init__(self, ssrc: Optional[int] = None, rid: Optional[str] = None, codecPayloadType: Optional[int] = None,
+                 rtx: Optional[RtxStruct] = None, dtx: Optional[bool] = False, scalabilityMode: Optional[str] = None,
+                 scaleResolutionDownBy: Optional[int] = None, maxBitrate: Optional[int] = None,
+                 maxFramerate: Optional[int] = None, adaptivePtime: Optional[bool] = None,
+                 priority: Optional[str] = None, networkPriority: Optional[str] = None):
+        self.ssrc = ssrc
+        self.rid = rid
+        self.codecPayloadType = codecPayloadType
+        self.rtx = rtx
+        self.dtx = dtx
+        self.scalabilityMode = scalabilityMode
+        self.scaleResolutionDownBy = scaleResolutionDownBy
+        self.maxBitrate = maxBitrate
+        self.maxFramerate = maxFramerate
+        self.adaptivePtime = adaptivePtime
+        self.priority = priority
+        self.networkPriority = networkPriority
+
+
+class RtcpParametersStruct(_Struct):
+    __slots__ = ('cname', 'reducedSize', 'mux')
+    MODEL = RtcpParameters
+
+    def __init__(self, cname: Optional[str] = None, reducedSize: Optional[bool] = True, mux: Optional[bool] = None):
+        self.cname = cname
+        self.reducedSize = reducedSize
+        self.mux = mux
+
+
+class RtpParametersStruct(_Struct):
+    __slots__ = ('mid', 'codecs', 'headerExtensions', 'encodings', 'rtcp')
+    MODEL = RtpParameters
+    NESTED = {
+        'codecs': RtpCodecParametersStruct,
+        'headerExtensions': RtpHeaderExtensionParametersStruct,
+        'encodings': RtpEncodingParametersStruct,
+        'rtcp': RtcpParametersStruct
+    }
+
+    def __init__(self, mid: Optional[str] = None, codecs: Optional[List[RtpCodecParametersStruct]] = None,
+                 headerExtensions: Optional[List[RtpHeaderExtensionParametersStruct]] = None,
+                 encodings: Optional[List[RtpEncodingParametersStruct]] = None,
+                 rtcp: Optional[RtcpParametersStruct] = None):
+        self.mid = mid
+        self.codecs = codecs if codecs is not None else []
+        self.headerExtensions = headerExtensions if headerExtensions is not None else []
+        self.encodings = encodings if encodings is not None else []
+        self.rtcp = rtcp
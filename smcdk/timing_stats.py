@@ -0,0 +1,38 @@
+from bisect import bisect_left
+from typing import Tuple
+
+
+class TimingStats:
+    """
+    count, total, max and histogram of durations, e.g. of the dispatches of a message method
+    or of the rounds of a negotiation queue
+    """
+    __slots__ = ('bounds', 'count', 'totalSeconds', 'maxSeconds', 'buckets')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        """
+        :param bounds: upper bounds(in seconds) of the histogram buckets, ascending, the last bucket holds the rest
+        """
+        self.bounds: Tuple[float, ...] = bounds
+        self.count: int = 0
+        self.totalSeconds: float = 0
+        self.maxSeconds: float = 0
+        self.buckets = [0] * (len(bounds) + 1)
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.totalSeconds += seconds
+        if seconds > self.maxSeconds:
+            self.maxSeconds = seconds
+        self.buckets[bisect_left(self.bounds, seconds)] += 1
+
+    def dict(self) -> dict:
+        """
+        :return: {'count', 'totalSeconds', 'maxSeconds', 'buckets': [(upper bound in seconds or None, count)]}
+        """
+        return {
+            'count': self.count,
+            'totalSeconds': self.totalSeconds,
+            'maxSeconds': self.maxSeconds,
+            'buckets': list(zip(self.bounds + (None,), self.buckets))
+        }
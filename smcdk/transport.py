@@ -20,6 +20,7 @@ from .data_consumer import DataConsumer, DataConsumerOptions
 from .data_producer import DataProducer, DataProducerOptions
 from .producer import ProducerCodecOptions
 from .rtp_parameters import RtpParameters, RtpCodecCapability, RtpEncodingParameters, MediaKind
+from .rtp_structs import RtpParametersStruct
 
 
 class Transport(EnhancedEventEmitter):
@@ -274,7 +275,8 @@ class Transport(EnhancedEventEmitter):
             appData=appData
         )
         logging.debug('Transport consume()')
-        rtpParameters:  RtpParameters = options.rtpParameters.copy(deep=True)
+        # Validated above, a copy of them in the internal representation.
+        rtpParameters: RtpParametersStruct = RtpParametersStruct.fromModel(options.rtpParameters)
         if self._closed:
             raise InvalidStateError('closed')
         elif self._direction != 'recv':
@@ -297,7 +299,7 @@ class Transport(EnhancedEventEmitter):
             localId=handlerReceiveResult.localId,
             producerId=options.producerId,
             track=handlerReceiveResult.track,
-            rtpParameters=rtpParameters,
+            rtpParameters=rtpParameters.toModel(),
             appData=options.appData
         )
 
@@ -307,21 +309,101 @@ class Transport(EnhancedEventEmitter):
         # If this is the first video Consumer and the Consumer for RTP probation
         # has not yet been created, create it now.
         if not self._probatorConsumerCreated and options.kind == 'video':
-            probatorRtpParameters = generateProbatorRtpParameters(consumer.rtpParameters)
-            await self._handler.receive(
-                trackId='probator',
-                kind='video',
-                rtpParameters=probatorRtpParameters
-            )
+            probatorRtpParameters = generateProbatorRtpParameters(rtpParameters)
+            # Set before negotiating so that concurrent calls create it once.
+            self._probatorConsumerCreated = True
+            try:
+                await self._handler.receive(
+                    trackId='probator',
+                    kind='video',
+                    rtpParameters=probatorRtpParameters
+                )
+            except Exception:
+                self._probatorConsumerCreated = False
+                raise
 
             logging.debug('Transport consume() | Consumer for RTP probation created')
-
-            self._probatorConsumerCreated = True
         
         self._observer.emit('newconsumer', consumer)
 
         return consumer
     
+    # Create several Consumers within a single SDP negotiation.
+    #
+    # Each item holds the consume() arguments (id, producerId, kind,
+    # rtpParameters and optionally appData). Consumers are returned in the
+    # same order.
+    async def consumeMany(
+        self,
+        consumerOptionsList: List[Union[ConsumerOptions, dict]]
+    ) -> List[Consumer]:
+        logging.debug(f'Transport consumeMany() [count:{len(consumerOptionsList)}]')
+        optionsList: List[ConsumerOptions] = [
+            options if isinstance(options, ConsumerOptions) else ConsumerOptions(**options)
+            for options in consumerOptionsList
+        ]
+        if self._closed:
+            raise InvalidStateError('closed')
+        elif self._direction != 'recv':
+            raise UnsupportedError('not a receiving Transport')
+        elif len(self.listeners('connect')) == 0 and self._connectionState == 'new':
+            raise TypeError('no "connect" listener set into this transport')
+        if not optionsList:
+            return []
+
+        rtpParametersList: List[RtpParametersStruct] = [RtpParametersStruct.fromModel(options.rtpParameters)
+                                                        for options in optionsList]
+        for rtpParameters in rtpParametersList:
+            if not canReceive(rtpParameters=rtpParameters, extendedRtpCapabilities=self._extendedRtpCapabilities):
+                raise UnsupportedError('cannot consume this Producer')
+
+        receiveOptionsList: List[HandlerReceiveOptions] = [
+            HandlerReceiveOptions(trackId=options.id, kind=options.kind, rtpParameters=rtpParameters)
+            for options, rtpParameters in zip(optionsList, rtpParametersList)
+        ]
+        # If there is a video Consumer and the Consumer for RTP probation has
+        # not yet been created, negotiate it within the same round.
+        createProbator = False
+        if not self._probatorConsumerCreated:
+            videoRtpParametersList = [rtpParameters for options, rtpParameters in zip(optionsList, rtpParametersList)
+                                      if options.kind == 'video']
+            if videoRtpParametersList:
+                receiveOptionsList.append(HandlerReceiveOptions(
+                    trackId='probator',
+                    kind='video',
+                    rtpParameters=generateProbatorRtpParameters(videoRtpParametersList[0])
+                ))
+                createProbator = True
+                # Set before negotiating so that concurrent calls create it once.
+                self._probatorConsumerCreated = True
+
+        try:
+            handlerReceiveResults: List[HandlerReceiveResult] = await self._handler.receiveMany(receiveOptionsList)
+        except Exception:
+            if createProbator:
+                self._probatorConsumerCreated = False
+            raise
+
+        if createProbator:
+            logging.debug('Transport consumeMany() | Consumer for RTP probation created')
+
+        consumers: List[Consumer] = []
+        for options, rtpParameters, handlerReceiveResult in zip(optionsList, rtpParametersList, handlerReceiveResults):
+            consumer: Consumer = Consumer(
+                id=options.id,
+                localId=handlerReceiveResult.localId,
+                producerId=options.producerId,
+                track=handlerReceiveResult.track,
+                rtpParameters=rtpParameters.toModel(),
+                appData=options.appData
+            )
+            self._consumers[consumer.id] = consumer
+            self._handleConsumer(consumer)
+            self._observer.emit('newconsumer', consumer)
+            consumers.append(consumer)
+
+        return consumers
+    
     # Create a DataProducer
     async def produceData(
         self,
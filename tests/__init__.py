@@ -1,22 +1,66 @@
+import asyncio
+import copy
+import json
 import logging
+import struct
+import fractions
+import inspect
+import os
+import queue
+import random
+import tempfile
+import threading
 import unittest
-from aiortc import VideoStreamTrack
-from aiortc.mediastreams import AudioStreamTrack
+import wave
+
+import av
+from aiortc import MediaStreamTrack, RTCDtlsTransport, RTCRtpReceiver, VideoStreamTrack
+from aiortc.contrib.media import MediaRecorder
+from aiortc.mediastreams import AudioStreamTrack, MediaStreamError
+from aiortc.codecs.h264 import H264Encoder
+from aiortc.jitterbuffer import JitterFrame
+from aiortc.rtcrtpparameters import RTCRtpCodecParameters
 
 from smcdk import Device
+from smcdk import MediasoupClient
+from smcdk import MediasoupClientHost
+from smcdk import MediasoupClientSupervisor
 from smcdk import AiortcHandler
-from smcdk.rtp_parameters import RtpCapabilities, RtpParameters
+from smcdk import nativeCapabilitiesCache
+from smcdk.rtp_parameters import RtpCapabilities, RtpParameters, RtpEncodingParameters
 from smcdk.sctp_parameters import SctpCapabilities, SctpStreamParameters
 from smcdk.transport import Transport
 from smcdk.models.transport import DtlsParameters
 from smcdk.producer import Producer
 from smcdk.data_producer import DataProducer
 from smcdk.data_consumer import DataConsumer
-from smcdk.errors import UnsupportedError
+from smcdk.errors import UnsupportedError, InvalidStateError
 from smcdk.consumer import Consumer
+from smcdk.deps.sdp_transform import sdp_transform
+from smcdk.api.mediasoup_signaler import ProtooSignaler, Notification
+from smcdk.api.signaling_codec import CODECS, StdlibJsonCodec, createCodec
+from smcdk.api.notification_listener import BandwidthNotificationListener, PeerNotificationListener, \
+    ProducerNotificationListener, ConsumerNotificationListener, DataConsumerNotificationListener, NotificationQueue, \
+    OverflowPolicy
+from smcdk.api.message_router import MessageRouter
+from smcdk.api.media_source_registry import MediaSourceRegistry
+from smcdk.api.encoded_recorder import EncodedFrameRecorder, RtpDumpRecorder
+from smcdk.api.recording_pool import PooledMediaRecorder, RecordingPool
+from smcdk.api.segmented_recording import RecordFileLimiter, RecordSegmenter, SegmentFile, SegmentedRecorder
+from smcdk.api.room_peer import Room, Peer, PeerAppData
+from smcdk.api.consumer_registry import ConsumerRegistry
+from smcdk.api.multimedia_runtime import MultimediaRuntime, probeMediaCodecs
+from smcdk.ortc import ortcCache, getExtendedRtpCapabilities, getSendingRemoteRtpParameters, generateProbatorRtpParameters
+from smcdk.rtp_structs import RtpParametersStruct, RtpEncodingParametersStruct, modelDict
+from smcdk.handlers.sdp.remote_sdp import RemoteSdp
+from smcdk.handlers.negotiation_queue import NegotiationQueue
 
 from .fake_parameters import generateRouterRtpCapabilities, generateTransportRemoteParameters, generateConsumerRemoteParameters, generateDataProducerRemoteParameters, generateDataConsumerRemoteParameters
 from .fake_handler import FakeHandler
+from .fake_media import generateMediaFile, generateRtpPackets, createFakeReceiver
+from .fake_signaler import FakeSignaler, createFakeClient
+from .fake_room import FakeRoomServer, joinClient, leaveClient, runPeerChurn, runConcurrentJoins
+from .fake_sdp import legacyWrite, generateRandomSdp, generateRandomSdpDict
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -349,7 +393,58 @@ class TestMethods(unittest.IsolatedAsyncioTestCase):
 
         sendTransport.remove_all_listeners('producedata')
 
-    
+
+    async def test_stop_sending(self):
+        device = Device(handlerFactory=FakeHandler.createFactory(tracks=TRACKS))
+        await device.load(generateRouterRtpCapabilities())
+        id,iceParameters,iceCandidates,dtlsParameters,sctpParameters = generateTransportRemoteParameters()
+        sendTransport = device.createSendTransport(
+            id=id,
+            iceParameters=iceParameters,
+            iceCandidates=iceCandidates,
+            dtlsParameters=dtlsParameters,
+            sctpParameters=sctpParameters
+        )
+
+        @sendTransport.on('connect')
+        async def on_connect(dtlsParameters):
+            pass
+
+        @sendTransport.on('produce')
+        async def on_produce(kind: str, rtpParameters: RtpParameters, appData: dict) -> str:
+            id, _, _, _, _ = generateTransportRemoteParameters()
+            return id
+
+        handler = sendTransport.handler
+        producers = [await sendTransport.produce(track=track) for track in (AudioStreamTrack(), VideoStreamTrack())]
+        transceivers = [handler._mapMidTransceiver[producer.localId] for producer in producers]
+
+        # the sender stops and the media section is closed, the first one is only disabled
+        for producer in producers:
+            await producer.close()
+            self.assertEqual(producer.track.readyState, 'ended')
+        self.assertEqual(len(handler._mapMidTransceiver), 0)
+        for transceiver in transceivers:
+            self.assertEqual(transceiver.direction, 'inactive')
+            self.assertEqual(transceiver.currentDirection, 'inactive')
+            # no more frame encoded, even if the sender had not started yet
+            self.assertFalse(transceiver.sender._enabled)
+        mediaSections = handler.remoteSdp._mediaSections
+        self.assertEqual([mediaSection.closed for mediaSection in mediaSections], [False, True])
+        localMedia = sdp_transform.parse(handler.pc.localDescription.sdp)['media']
+        self.assertEqual([media['direction'] for media in localMedia], ['inactive', 'inactive'])
+        with self.assertRaises(Exception):
+            await handler.stopSending(producers[0].localId)
+
+        # a new producer gets a new media section, appended like its transceiver
+        producer = await sendTransport.produce(track=AudioStreamTrack())
+        self.assertNotIn(producer.localId, [transceiver.mid for transceiver in transceivers])
+        self.assertEqual(len(mediaSections), 3)
+        self.assertEqual(len(handler.pc.getTransceivers()), 3)
+        self.assertEqual(handler._mapMidTransceiver[producer.localId].direction, 'sendonly')
+
+        await sendTransport.close()
+
     async def test_consume(self):
         device = Device(handlerFactory=FakeHandler.createFactory(tracks=TRACKS))
         await device.load(generateRouterRtpCapabilities())
@@ -392,6 +487,7 @@ class TestMethods(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(audioConsumer.producerId, audioConsumerRemoteParameters['producerId'])
         self.assertFalse(audioConsumer.closed)
         self.assertEqual(audioConsumer.kind, 'audio')
+        self.assertTrue(isinstance(audioConsumer.rtpParameters, RtpParameters))
         self.assertEqual(audioConsumer.rtpParameters.mid, None)
         self.assertEqual(len(audioConsumer.rtpParameters.codecs), 1)
 
@@ -547,3 +643,1359 @@ class TestMethods(unittest.IsolatedAsyncioTestCase):
         self.assertFalse(dataConsumer.closed)
         self.assertEqual(dataConsumer.label, 'FOO')
         self.assertEqual(dataConsumer.protocol, 'BAR')
+
+    async def test_consume_many(self):
+        device = Device(handlerFactory=FakeHandler.createFactory(tracks=TRACKS))
+        await device.load(generateRouterRtpCapabilities())
+        id,iceParameters,iceCandidates,dtlsParameters,sctpParameters = generateTransportRemoteParameters()
+        recvTransport = device.createRecvTransport(
+            id=id,
+            iceParameters=iceParameters,
+            iceCandidates=iceCandidates,
+            dtlsParameters=dtlsParameters,
+            sctpParameters=sctpParameters
+        )
+
+        connectEventNumTimesCalled = 0
+
+        @recvTransport.on('connect')
+        async def on_connect(dtlsParameters):
+            nonlocal connectEventNumTimesCalled
+            connectEventNumTimesCalled += 1
+
+        remoteParametersList = [
+            generateConsumerRemoteParameters(codecMimeType='audio/opus'),
+            generateConsumerRemoteParameters(codecMimeType='video/VP8'),
+            generateConsumerRemoteParameters(codecMimeType='audio/opus')
+        ]
+        consumers = await recvTransport.consumeMany([{
+            'id': remoteParameters['id'],
+            'producerId': remoteParameters['producerId'],
+            'kind': remoteParameters['kind'],
+            'rtpParameters': remoteParameters['rtpParameters']
+        } for remoteParameters in remoteParametersList])
+
+        self.assertEqual(connectEventNumTimesCalled, 1)
+        self.assertEqual(len(consumers), 3)
+        self.assertEqual([consumer.id for consumer in consumers],
+                         [remoteParameters['id'] for remoteParameters in remoteParametersList])
+        self.assertEqual([consumer.kind for consumer in consumers], ['audio', 'video', 'audio'])
+        self.assertEqual(len({consumer.localId for consumer in consumers}), 3)
+        for consumer in consumers:
+            self.assertFalse(consumer.closed)
+            self.assertEqual(consumer.track.kind, consumer.kind)
+
+        # closed media sections are reused by the next consumers of the same kind, the first one is only disabled
+        handler = recvTransport.handler
+        numMediaSections = len(handler.remoteSdp._mediaSections)
+        closedReceivers = {consumer.localId: handler._mapMidTransceiver[consumer.localId].receiver
+                           for consumer in consumers}
+        for consumer in consumers:
+            await consumer.close()
+        remoteParametersList = [
+            generateConsumerRemoteParameters(codecMimeType='video/VP8'),
+            generateConsumerRemoteParameters(codecMimeType='audio/opus'),
+            generateConsumerRemoteParameters(codecMimeType='audio/opus')
+        ]
+        newConsumers = [await recvTransport.consume(
+            id=remoteParameters['id'],
+            producerId=remoteParameters['producerId'],
+            kind=remoteParameters['kind'],
+            rtpParameters=remoteParameters['rtpParameters']
+        ) for remoteParameters in remoteParametersList]
+        self.assertEqual(newConsumers[0].localId, consumers[1].localId)
+        self.assertEqual(newConsumers[1].localId, consumers[2].localId)
+        self.assertNotIn(newConsumers[2].localId, closedReceivers)
+        self.assertEqual(len(handler.remoteSdp._mediaSections), numMediaSections + 1)
+        for consumer in newConsumers[:2]:
+            # a new receiver and track on the reused transceiver
+            self.assertIsNot(consumer.rtpReceiver, closedReceivers[consumer.localId])
+            self.assertEqual(consumer.track.readyState, 'live')
+            self.assertEqual(consumer.track.kind, consumer.kind)
+        self.assertEqual(len(handler.pc.getTransceivers()), numMediaSections + 1)
+
+        # a closed transceiver taken by a failed round is reused by the next one
+        await newConsumers[0].close()
+        negotiateRecvRound = handler._negotiateRecvRound
+
+        async def failingNegotiateRecvRound(operations, pendingResults):
+            raise Exception('round failed')
+
+        handler._negotiateRecvRound = failingNegotiateRecvRound
+        remoteParameters = generateConsumerRemoteParameters(codecMimeType='video/VP8')
+        with self.assertRaises(Exception):
+            await recvTransport.consume(id=remoteParameters['id'], producerId=remoteParameters['producerId'],
+                                        kind=remoteParameters['kind'], rtpParameters=remoteParameters['rtpParameters'])
+        self.assertEqual([transceiver.mid for transceiver in handler._closedRecvTransceiversByKind['video']],
+                         [newConsumers[0].localId])
+        handler._negotiateRecvRound = negotiateRecvRound
+        remoteParameters = generateConsumerRemoteParameters(codecMimeType='video/VP8')
+        consumer = await recvTransport.consume(id=remoteParameters['id'], producerId=remoteParameters['producerId'],
+                                               kind=remoteParameters['kind'],
+                                               rtpParameters=remoteParameters['rtpParameters'])
+        self.assertEqual(consumer.localId, newConsumers[0].localId)
+        self.assertEqual(consumer.track.readyState, 'live')
+
+        await recvTransport.close()
+
+    async def test_negotiation_queue(self):
+        queue = NegotiationQueue(maxBatchSize=3)
+        rounds = []
+
+        async def negotiate(operations):
+            rounds.append([item for _, item in operations])
+            await asyncio.sleep(0)
+            if 'fail' in [item for _, item in operations]:
+                raise Exception('round failed')
+            return [item * 2 for _, item in operations]
+
+        async def negotiateAlone(operations):
+            rounds.append([item for _, item in operations])
+            return [-item for _, item in operations]
+
+        futures = [queue.push('receive', idx, negotiate, mergeable=True) for idx in range(5)]
+        futures += [queue.push('send', idx, negotiateAlone) for idx in (10, 11)]
+        cancelled = queue.push('receive', 12, negotiate, mergeable=True)
+        cancelled.cancel()
+        futures.append(queue.push('receive', 13, negotiate, mergeable=True))
+        self.assertTrue(queue.busy)
+        self.assertEqual(await asyncio.gather(*futures), [0, 2, 4, 6, 8, -10, -11, 26])
+        # adjacent mergeable operations share a round up to maxBatchSize, the cancelled one never ran
+        self.assertEqual(rounds, [[0, 1, 2], [3, 4], [10], [11], [13]])
+        self.assertFalse(queue.busy)
+
+        # a failed round fails all of its operations, the next rounds go on
+        failing = [queue.push('receive', 'fail', negotiate, mergeable=True),
+                   queue.push('receive', 'x', negotiate, mergeable=True)]
+        following = queue.push('send', 1, negotiateAlone)
+        for future in failing:
+            with self.assertRaisesRegex(Exception, 'round failed'):
+                await future
+        self.assertEqual(await following, -1)
+
+        stats = queue.stats()
+        self.assertEqual(stats['pending'], 0)
+        self.assertEqual(stats['mergedOperations'], 7)
+        self.assertEqual({name: wait['count'] for name, wait in stats['wait'].items()}, {'receive': 8, 'send': 3})
+        self.assertEqual(stats['negotiation']['count'], 7)
+        self.assertEqual(sum(count for _, count in stats['negotiation']['buckets']), 7)
+        queue.resetStats()
+        self.assertEqual(queue.stats()['negotiation']['count'], 0)
+
+        pending = queue.push('send', 2, negotiateAlone)
+        queue.close()
+        with self.assertRaises(InvalidStateError):
+            await pending
+        with self.assertRaises(InvalidStateError):
+            queue.push('send', 3, negotiateAlone)
+
+    async def test_background_negotiation(self):
+        numPeers = 6
+        inline = await runConcurrentJoins(numPeers, negotiateInBackground=False)
+        background = await runConcurrentJoins(numPeers, negotiateInBackground=True)
+        for result in (inline, background):
+            self.assertEqual(result['consumers'], 2 * numPeers)
+            for name in ('room.consumerIdToPeer', 'room.dataConsumerIdToPeer', 'runtime.consumers',
+                         'runtime.dataConsumers', 'recvTransport.consumers', 'recvTransport.dataConsumers'):
+                self.assertEqual(result['sizes'][name], 0, name)
+            # a single probator for every concurrent video consumer
+            self.assertEqual(result['sizes']['handler.mapMidTransceiver'], 1)
+            stats = result['negotiationStats']['recv']
+            self.assertEqual(stats['pending'], 0)
+            self.assertEqual(stats['wait']['receive']['count'], 2 * numPeers + 1)
+            self.assertEqual(stats['wait']['receiveDataChannel']['count'], numPeers)
+        # consumed in the server event loop, one offer/answer per operation
+        inlineStats = inline['negotiationStats']['recv']
+        self.assertEqual(inlineStats['negotiation']['count'], 3 * numPeers + 1)
+        self.assertEqual(inlineStats['mergedOperations'], 0)
+        # handed off, the operations queued meanwhile share the rounds
+        backgroundStats = background['negotiationStats']['recv']
+        self.assertLess(backgroundStats['negotiation']['count'], inlineStats['negotiation']['count'])
+        self.assertGreater(backgroundStats['mergedOperations'], 0)
+
+        # a notification about a consumer still negotiating waits for it
+        server = FakeRoomServer()
+        client, joinTask = await joinClient(server, 'held', {'consumeBatchWindow': 0, 'negotiateInBackground': True})
+        try:
+            server.pushMessage({'notification': True, 'method': 'newPeer',
+                                'data': {'id': 'p1', 'displayName': 'p1', 'device': {}}})
+            while client.room.getPeerByPeerId('p1') is None:
+                await asyncio.sleep(0)
+            remoteParameters = generateConsumerRemoteParameters(codecMimeType='video/VP8')
+            answered = server._pushServerRequest('newConsumer', {
+                **remoteParameters, 'peerId': 'p1', 'type': 'simple', 'producerPaused': False, 'appData': {}})
+            server.pushMessage({'notification': True, 'method': 'consumerClosed',
+                                'data': {'consumerId': remoteParameters['id']}})
+            await asyncio.wait_for(answered, 10)
+            await asyncio.wait_for(client.waitReleased(), 10)
+            self.assertEqual(len(client.multimediaRuntime.consumerRegistry), 0)
+            self.assertNotIn(remoteParameters['id'], client.multimediaRuntime._recvTransport._consumers)
+            self.assertEqual(len(client._heldNotifications), 0)
+        finally:
+            await leaveClient(client, joinTask)
+
+    async def test_consumer_registry(self):
+        registry = ConsumerRegistry()
+        for consumerId, peerId, producerId in (('c1', 'p1', 'a1'), ('c2', 'p1', 'v1'), ('c3', 'p2', 'a2')):
+            registry.add(consumerId, peerId, producerId, 'audio', None)
+        self.assertEqual([entry.consumerId for entry in registry.getByPeerId('p1')], ['c1', 'c2'])
+        self.assertEqual(registry.remove('c1').producerId, 'a1')
+        self.assertIsNone(registry.remove('c1'))
+        self.assertEqual([entry.consumerId for entry in registry.removeByPeerId('p1')], ['c2'])
+        self.assertEqual(registry.stats(), {'consumers': 1, 'peers': 1, 'producers': 1})
+
+        # the recorders of both consumers of a peer are kept, then released on close notifications
+        class StoppedRecorder:
+            def __init__(self):
+                self.stopped = False
+
+            def addTrack(self, track):
+                pass
+
+            async def start(self):
+                pass
+
+            async def stop(self):
+                self.stopped = True
+
+        client = MediasoupClient(signaler=FakeSignaler())
+        runtime = client.multimediaRuntime
+        device = Device(handlerFactory=FakeHandler.createFactory(tracks=TRACKS))
+        await device.load(generateRouterRtpCapabilities())
+        id, iceParameters, iceCandidates, dtlsParameters, sctpParameters = generateTransportRemoteParameters()
+        runtime._recvTransport = device.createRecvTransport(id=id, iceParameters=iceParameters,
+                                                            iceCandidates=iceCandidates,
+                                                            dtlsParameters=dtlsParameters,
+                                                            sctpParameters=sctpParameters)
+        runtime._recvTransport.on('connect', lambda dtlsParameters: None)
+        room = client.room
+        room.roomId = 'room'
+        peers = {peerId: room.addPeer(peerId, PeerAppData(peerId, {})) for peerId in ('p1', 'p2')}
+        recorders = {}
+
+        def createRecorder(mePeer, consumerId, producePeer, producerId, kind, rtpParameters):
+            recorders[consumerId] = StoppedRecorder()
+            runtime.consumerRegistry.add(consumerId, producePeer.peerId, producerId, kind, recorders[consumerId])
+            return recorders[consumerId]
+
+        runtime._createRecorder = createRecorder
+        consumerInfos = []
+        for peerId, codecMimeType in (('p1', 'audio/opus'), ('p1', 'video/VP8'), ('p2', 'audio/opus')):
+            remoteParameters = generateConsumerRemoteParameters(codecMimeType=codecMimeType)
+            consumerInfos.append({'consumerId': remoteParameters['id'], 'producePeer': peers[peerId],
+                                  'producerId': remoteParameters['producerId'], 'kind': remoteParameters['kind'],
+                                  'rtpParameters': remoteParameters['rtpParameters']})
+            room.bindConsumerIdToPeer(remoteParameters['id'], peers[peerId])
+        await runtime.consumeMany(client._mePeer, consumerInfos)
+        consumerIds = [info['consumerId'] for info in consumerInfos]
+        self.assertEqual([entry.consumerId for entry in runtime.consumerRegistry.getByPeerId('p1')], consumerIds[:2])
+
+        for listener in client._notificationListeners:
+            listener.setQueue(listener.newQueue())
+        await client._dispatchServerMessage({'notification': True, 'method': 'consumerClosed',
+                                             'data': {'consumerId': consumerIds[0]}})
+        await asyncio.gather(*client._releaseTasks)
+        self.assertTrue(recorders[consumerIds[0]].stopped)
+        self.assertNotIn(consumerIds[0], runtime.consumerRegistry)
+        # forwarded to the listener all the same
+        self.assertEqual(client._consumerNotificationListener.queueSize(), 1)
+
+        await client._dispatchServerMessage({'notification': True, 'method': 'peerClosed',
+                                             'data': {'peerId': 'p1'}})
+        await asyncio.gather(*client._releaseTasks)
+        self.assertTrue(recorders[consumerIds[1]].stopped)
+        self.assertFalse(recorders[consumerIds[2]].stopped)
+        self.assertEqual([entry.consumerId for entry in runtime.consumerRegistry], consumerIds[2:])
+        self.assertEqual(list(runtime._recvTransport._consumers), consumerIds[2:])
+        # a notification about a consumer already released is harmless
+        self.assertFalse(await runtime.closeConsumer(consumerIds[0]))
+
+        await runtime.close(lambda: None)
+        self.assertTrue(recorders[consumerIds[2]].stopped)
+        self.assertEqual(len(runtime.consumerRegistry), 0)
+
+    async def test_peer_churn_memory(self):
+        numPeers = 8
+        result = await runPeerChurn(numPeers, numWarmupPeers=3)
+        sizesBefore, sizesAfter = result['sizesBefore'], result['sizesAfter']
+        # everything indexed by consumer is released with it, only me and the probator are left
+        for name in ('room.peers', 'room.consumerIdToPeer', 'room.dataConsumerIdToPeer', 'runtime.consumers',
+                     'runtime.dataConsumers', 'signaler.responses', 'recvTransport.consumers',
+                     'recvTransport.dataConsumers', 'handler.mapMidTransceiver', 'remoteSdp.mediaSections',
+                     'pc.transceivers'):
+            self.assertEqual(sizesAfter[name], sizesBefore[name], name)
+        self.assertEqual(sizesAfter['room.peers'], 1)
+        self.assertEqual(sizesAfter['handler.mapMidTransceiver'], 1)
+        # the closed media sections are reused by the next peers, the sdp only varies with the ssrcs
+        self.assertLessEqual(abs(sizesAfter['pc.remoteSdpBytes'] - sizesBefore['pc.remoteSdpBytes']), 64)
+        self.assertLess(result['filteredBytesPerPeer'], 32 * 1024)
+
+    async def test_native_capabilities_cache(self):
+        nativeCapabilitiesCache.invalidate()
+        misses = nativeCapabilitiesCache.misses
+        rtpCapabilities = await AiortcHandler(tracks=TRACKS).getNativeRtpCapabilities()
+        self.assertEqual(nativeCapabilitiesCache.misses, misses + 1)
+        # Served from memory, but as a copy.
+        cachedRtpCapabilities = await AiortcHandler(tracks=TRACKS).getNativeRtpCapabilities()
+        self.assertEqual(nativeCapabilitiesCache.misses, misses + 1)
+        self.assertEqual(cachedRtpCapabilities, rtpCapabilities)
+        self.assertIsNot(cachedRtpCapabilities, rtpCapabilities)
+        sctpCapabilities = await AiortcHandler(tracks=TRACKS).getNativeSctpCapabilities()
+        self.assertEqual(sctpCapabilities, await AiortcHandler(tracks=TRACKS).getNativeSctpCapabilities())
+
+        with tempfile.TemporaryDirectory() as directoryPath:
+            nativeCapabilitiesCache.enableDiskCache(directoryPath)
+            try:
+                audioRtpCapabilities = await AiortcHandler(tracks=[audioTrack]).getNativeRtpCapabilities()
+                self.assertEqual(nativeCapabilitiesCache.misses, misses + 2)
+                # Drop the memory entries only, the next load reads the file.
+                nativeCapabilitiesCache.disableDiskCache()
+                nativeCapabilitiesCache.invalidate()
+                nativeCapabilitiesCache.enableDiskCache(directoryPath)
+                diskRtpCapabilities = await AiortcHandler(tracks=[audioTrack]).getNativeRtpCapabilities()
+                self.assertEqual(nativeCapabilitiesCache.misses, misses + 2)
+                self.assertEqual(diskRtpCapabilities, audioRtpCapabilities)
+                nativeCapabilitiesCache.invalidate()
+                await AiortcHandler(tracks=[audioTrack]).getNativeRtpCapabilities()
+                self.assertEqual(nativeCapabilitiesCache.misses, misses + 3)
+            finally:
+                nativeCapabilitiesCache.disableDiskCache()
+
+    async def test_ortc_cache(self):
+        ortcCache.clear()
+        nativeRtpCapabilities = await FakeHandler(tracks=TRACKS).getNativeRtpCapabilities()
+        expectedExtendedRtpCapabilities = getExtendedRtpCapabilities(
+            nativeRtpCapabilities.copy(deep=True), generateRouterRtpCapabilities())
+        devices = []
+        for _ in range(3):
+            device = Device(handlerFactory=FakeHandler.createFactory(tracks=TRACKS))
+            await device.load(generateRouterRtpCapabilities())
+            devices.append(device)
+        # one entry, keyed by the negotiated capabilities and by its content
+        self.assertEqual(ortcCache.size, 2)
+        self.assertEqual(devices[0]._extendedRtpCapabilities, expectedExtendedRtpCapabilities)
+        # Every Device owns its copy of the cached results.
+        self.assertEqual(devices[1]._extendedRtpCapabilities, devices[0]._extendedRtpCapabilities)
+        self.assertIsNot(devices[1]._extendedRtpCapabilities, devices[0]._extendedRtpCapabilities)
+        # Receiving capabilities belong to the application.
+        self.assertEqual(devices[1].rtpCapabilities, devices[0].rtpCapabilities)
+        self.assertIsNot(devices[1].rtpCapabilities, devices[0].rtpCapabilities)
+
+        hits = ortcCache.hits
+        misses = ortcCache.misses
+        id,iceParameters,iceCandidates,dtlsParameters,sctpParameters = generateTransportRemoteParameters()
+        for device in devices:
+            device.createSendTransport(
+                id=id,
+                iceParameters=iceParameters,
+                iceCandidates=iceCandidates,
+                dtlsParameters=dtlsParameters,
+                sctpParameters=sctpParameters
+            )
+        # 4 sending parameters are computed by the first handler only.
+        self.assertEqual(ortcCache.misses, misses + 4)
+        self.assertEqual(ortcCache.hits, hits + 8)
+        self.assertEqual(
+            ortcCache.getSendingRemoteRtpParameters('video', devices[2]._extendedRtpCapabilities).toModel(),
+            getSendingRemoteRtpParameters('video', expectedExtendedRtpCapabilities))
+        # Modifying a result does not modify the next ones.
+        hits = ortcCache.hits
+        misses = ortcCache.misses
+        rtpParameters = ortcCache.getSendingRtpParameters('video', devices[0]._extendedRtpCapabilities)
+        rtpParameters.codecs[0].parameters['x-copy'] = 1
+        rtpParameters.headerExtensions.clear()
+        devices[0]._extendedRtpCapabilities.codecs[0].localParameters['x-copy'] = 1
+        self.assertNotIn('x-copy', ortcCache.getSendingRtpParameters(
+            'video', devices[1]._extendedRtpCapabilities).codecs[0].parameters)
+        self.assertTrue(ortcCache.getSendingRtpParameters('video', devices[1]._extendedRtpCapabilities).headerExtensions)
+        extendedRtpCapabilities = ortcCache.getExtendedRtpCapabilities(
+            nativeRtpCapabilities.copy(deep=True), generateRouterRtpCapabilities())
+        self.assertEqual(extendedRtpCapabilities, expectedExtendedRtpCapabilities)
+        self.assertEqual((ortcCache.hits, ortcCache.misses), (hits + 4, misses))
+        # Capabilities changed in place are keyed by their new content.
+        misses = ortcCache.misses
+        videoCodec = next(codec for codec in devices[0]._extendedRtpCapabilities.codecs if codec.kind == 'video')
+        videoCodec.localParameters['x-changed'] = 1
+        self.assertEqual(ortcCache.getSendingRtpParameters(
+            'video', devices[0]._extendedRtpCapabilities).codecs[0].parameters['x-changed'], 1)
+        self.assertEqual(ortcCache.misses, misses + 1)
+        # Sending codecs are built from the cached parameters, and belong to the application.
+        hits = ortcCache.hits
+        codecs = devices[0].getSendingCodecs('video')
+        self.assertEqual(ortcCache.hits, hits + 1)
+        codecs[0].parameters['x-copy'] = 1
+        codecs[0].rtcpFeedback.clear()
+        self.assertNotIn('x-copy', devices[1].getSendingCodecs('video')[0].parameters)
+        self.assertTrue(devices[1].getSendingCodecs('video')[0].rtcpFeedback)
+
+    async def test_rtp_structs(self):
+        nativeRtpCapabilities = await FakeHandler(tracks=TRACKS).getNativeRtpCapabilities()
+        extendedRtpCapabilities = getExtendedRtpCapabilities(nativeRtpCapabilities, generateRouterRtpCapabilities())
+        models = [getSendingRemoteRtpParameters(kind, extendedRtpCapabilities) for kind in ('audio', 'video')]
+        models += [RtpParameters(**generateConsumerRemoteParameters(codecMimeType=codecMimeType)['rtpParameters'])
+                   for codecMimeType in ('audio/opus', 'video/VP8')]
+        models[0].encodings = [RtpEncodingParameters(ssrc=1111, rid='r0', rtx={'ssrc': 1112}, maxBitrate=100000)]
+        for model in models:
+            struct = RtpParametersStruct.fromModel(model)
+            # same dict() as the model, keys in the same order
+            for excludeNone in (False, True):
+                self.assertEqual(struct.dict(exclude_none=excludeNone), model.dict(exclude_none=excludeNone))
+                self.assertEqual(modelDict(model, exclude_none=excludeNone), model.dict(exclude_none=excludeNone))
+                self.assertEqual(json.dumps(struct.dict(exclude_none=excludeNone)),
+                                 json.dumps(model.dict(exclude_none=excludeNone)))
+            self.assertEqual(struct.toModel(), model)
+            self.assertTrue(isinstance(struct.toModel().codecs[0], type(model.codecs[0])))
+            self.assertEqual(RtpParametersStruct.fromDict(model.dict()), struct)
+            # deep copies
+            for copy_ in (struct.copy(), RtpParametersStruct.fromModel(model)):
+                self.assertEqual(copy_, struct)
+                copy_.codecs[0].parameters['x-copy'] = 1
+                copy_.codecs[0].rtcpFeedback.clear()
+                copy_.headerExtensions[0].id = 99
+            self.assertEqual(struct.toModel(), model)
+            model.codecs[0].parameters['x-copy'] = 1
+            self.assertNotIn('x-copy', struct.codecs[0].parameters)
+        self.assertEqual(RtpEncodingParametersStruct().dict(), RtpEncodingParameters().dict())
+
+        probatorRtpParameters = generateProbatorRtpParameters(RtpParametersStruct.fromModel(models[3]))
+        self.assertEqual(probatorRtpParameters.mid, 'probator')
+        self.assertEqual(probatorRtpParameters.codecs[0].payloadType, 127)
+        self.assertEqual(models[3].codecs[0].payloadType, 101)
+        self.assertEqual(probatorRtpParameters.encodings[0].ssrc, 1234)
+
+    async def test_protoo_signaler_requests(self):
+        class FakeWebSocket:
+            def __init__(self):
+                self.sentMessages = []
+
+            async def send(self, message):
+                self.sentMessages.append(json.loads(message))
+
+        signaler = ProtooSignaler(requestTimeout=5, requestTimeouts={'produce': 0.05})
+        signaler._loop = asyncio.get_running_loop()
+        signaler._websocket = FakeWebSocket()
+
+        requestIds = [await signaler.getRouterRtpCapabilities() for _ in range(3)]
+        self.assertEqual(requestIds, list(range(requestIds[0], requestIds[0] + 3)))
+        self.assertEqual(signaler.inflightRequests, 3)
+        for requestId in requestIds:
+            signaler.setResponse({'response': True, 'id': requestId, 'ok': True, 'data': {'id': requestId}})
+        self.assertEqual(signaler.inflightRequests, 0)
+        for requestId in requestIds:
+            response = await signaler.getResponse(requestId)
+            self.assertEqual(response.data, {'id': requestId})
+        self.assertEqual(len(signaler._responses), 0)
+
+        # ids in use are skipped after a wrap around
+        signaler._nextRequestId = ProtooSignaler.MAX_REQUEST_ID
+        pendingRequestId = await signaler.getRouterRtpCapabilities()
+        signaler._nextRequestId = pendingRequestId
+        self.assertNotEqual(await signaler.getRouterRtpCapabilities(), pendingRequestId)
+
+        # per method timeout, the late response is dropped
+        requestId = await signaler.produce('transportId', 'audio', {}, {})
+        with self.assertRaises(Exception):
+            await signaler.getResponse(requestId)
+        self.assertEqual(signaler.timedOutRequests, 1)
+        self.assertNotIn(requestId, signaler._responses)
+        signaler.setResponse({'response': True, 'id': requestId, 'ok': True, 'data': {}})
+
+        # a timed out request nobody waits for is dropped as well
+        requestId = await signaler.produce('transportId', 'video', {}, {})
+        await asyncio.sleep(0.1)
+        self.assertNotIn(requestId, signaler._responses)
+        self.assertEqual(signaler.timedOutRequests, 2)
+
+    async def test_signaling_codecs(self):
+        message = {'request': True, 'id': 1, 'method': 'newConsumer',
+                   'data': {**generateConsumerRemoteParameters(codecMimeType='video/VP8'), 'displayName': 'é'}}
+        for name in CODECS:
+            try:
+                codec = createCodec(name)
+            except ImportError:
+                continue
+            encoded = codec.encode(message)
+            self.assertIsInstance(encoded, str)
+            self.assertEqual(json.loads(encoded), message)
+            self.assertEqual(codec.decode(encoded), message)
+            self.assertEqual(codec.decode(encoded.encode('utf-8')), message)
+        with self.assertRaises(ValueError):
+            createCodec('unknown')
+
+        class FakeWebSocket:
+            def __init__(self, receivedMessages):
+                self.sentMessages = []
+                self.receivedMessages = receivedMessages
+
+            async def send(self, message):
+                self.sentMessages.append(message)
+
+            async def recv(self):
+                return self.receivedMessages.pop(0)
+
+        small = json.dumps({'notification': True, 'method': 'downlinkBwe', 'data': {}})
+        big = json.dumps({'response': True, 'id': 1, 'ok': True,
+                          'data': generateRouterRtpCapabilities().dict(exclude_none=True)})
+        signaler = ProtooSignaler(codec='json', offloadDecodeThreshold=len(big))
+        self.assertEqual(signaler.codec.name, 'json')
+        signaler._loop = asyncio.get_running_loop()
+        signaler._websocket = FakeWebSocket([small, big])
+        self.assertEqual(await signaler.receiveMessage(), json.loads(small))
+        self.assertEqual(await signaler.receiveMessage(), json.loads(big))
+        await signaler.responseToNewConsumer(7)
+        self.assertEqual(json.loads(signaler._websocket.sentMessages[0]),
+                         {'response': True, 'id': 7, 'ok': True, 'data': {}})
+        signaler.setCodec(StdlibJsonCodec())
+        self.assertIsInstance(signaler.codec, StdlibJsonCodec)
+
+    async def test_coalescing_notification_queue(self):
+        queue = NotificationQueue(policy=OverflowPolicy.COALESCE)
+        for score in range(3):
+            for consumerId in ('c1', 'c2'):
+                queue.put_nowait(Notification(None, 'consumerScore', {'consumerId': consumerId, 'score': score}))
+        queue.put_nowait(Notification(None, 'consumerPaused', {'consumerId': 'c1'}))
+        queue.put_nowait(Notification(None, 'consumerScore', {'consumerId': 'c3', 'score': 0}))
+        queue.put_nowait(Notification(None, 'consumerClosed', {'consumerId': 'c3'}))
+        self.assertEqual(queue.qsize(), 4)
+        self.assertEqual(queue.merged, 4)
+        self.assertEqual(queue.dropped, 1)
+        # the latest per consumer, at the position of the first one
+        delivered = [await queue.get() for _ in range(4)]
+        self.assertEqual([(message.method, message.data['consumerId'], message.data.get('score'))
+                          for message in delivered],
+                         [('consumerScore', 'c1', 2), ('consumerScore', 'c2', 2), ('consumerPaused', 'c1', None),
+                          ('consumerClosed', 'c3', None)])
+
+        # at most maxRate deliveries per second, notifications arriving meanwhile are merged
+        listener = BandwidthNotificationListener(None)
+        listener.setCoalescing(maxRate=20)
+        queue = listener.newQueue()
+        listener.setQueue(queue)
+        loop = asyncio.get_running_loop()
+        await listener.enqueue({'method': 'downlinkBwe', 'data': {'availableBitrate': 0}})
+        startTime = loop.time()
+        await listener.dequeue()
+        for availableBitrate in range(1, 10):
+            await listener.enqueue({'method': 'downlinkBwe', 'data': {'availableBitrate': availableBitrate}})
+        message = await listener.dequeue()
+        self.assertGreaterEqual(loop.time() - startTime, 0.04)
+        self.assertEqual(message.data['availableBitrate'], 9)
+        self.assertEqual(listener.mergedCount(), 8)
+        self.assertEqual(listener.queueSize(), 0)
+
+    async def test_bounded_notification_queue(self):
+        def notifications(count):
+            return [Notification(None, 'consumerPaused', {'consumerId': str(idx)}) for idx in range(count)]
+
+        queue = NotificationQueue(maxSize=2, policy=OverflowPolicy.DROP_OLDEST)
+        for notification in notifications(5):
+            self.assertTrue(queue.put_nowait(notification))
+        self.assertEqual([queue.get_nowait().data['consumerId'] for _ in range(2)], ['3', '4'])
+        self.assertEqual(queue.stats(), {'depth': 0, 'highWatermark': 2, 'merged': 0, 'dropped': 3, 'overflowed': 0})
+
+        queue = NotificationQueue(maxSize=2, policy=OverflowPolicy.DROP_NEWEST)
+        self.assertEqual([queue.put_nowait(notification) for notification in notifications(3)], [True, True, False])
+        self.assertEqual([queue.get_nowait().data['consumerId'] for _ in range(2)], ['0', '1'])
+        self.assertEqual(queue.dropped, 1)
+
+        # a full coalescing queue makes room by dropping the oldest coalesced notification only
+        queue = NotificationQueue(maxSize=2, policy=OverflowPolicy.COALESCE)
+        queue.put_nowait(Notification(None, 'consumerPaused', {'consumerId': 'c1'}))
+        queue.put_nowait(Notification(None, 'consumerScore', {'consumerId': 'c1', 'score': 1}))
+        queue.put_nowait(Notification(None, 'consumerScore', {'consumerId': 'c2', 'score': 1}))
+        queue.put_nowait(Notification(None, 'consumerResumed', {'consumerId': 'c1'}))
+        self.assertEqual([(message.method, message.data['consumerId']) for message in
+                          [queue.get_nowait() for _ in range(queue.qsize())]],
+                         [('consumerPaused', 'c1'), ('consumerResumed', 'c1')])
+        self.assertEqual((queue.dropped, queue.overflowed), (2, 0))
+
+        # put_nowait never waits nor loses notifications of a full blocking queue, put() waits for room
+        queue = NotificationQueue(maxSize=2, policy=OverflowPolicy.BLOCK)
+        for notification in notifications(3):
+            self.assertTrue(queue.put_nowait(notification))
+        self.assertEqual((queue.qsize(), queue.overflowed, queue.highWatermark), (3, 1, 3))
+        putTask = asyncio.create_task(queue.put(notifications(4)[3]))
+        await asyncio.sleep(0.01)
+        self.assertFalse(putTask.done())
+        await queue.get()
+        await queue.get()
+        await putTask
+        self.assertEqual([queue.get_nowait().data['consumerId'] for _ in range(2)], ['2', '3'])
+
+        listener = BandwidthNotificationListener(None)
+        listener.setQueuePolicy(maxSize=1, policy=OverflowPolicy.DROP_NEWEST)
+        listener.setQueue(listener.newQueue())
+        self.assertTrue(listener.enqueueNowait({'method': 'downlinkBwe', 'data': {}}))
+        self.assertFalse(listener.enqueueNowait({'method': 'downlinkBwe', 'data': {}}))
+        self.assertEqual(listener.queueStats()['dropped'], 1)
+
+        # bounded and coalescing by default, never blocking the server event loop
+        self.assertEqual(NotificationQueue().maxsize, NotificationQueue.DEFAULT_MAX_SIZE)
+        listener = BandwidthNotificationListener(None)
+        self.assertIs(listener.newQueue().policy, OverflowPolicy.COALESCE)
+        with self.assertRaises(Exception):
+            listener.setQueuePolicy(policy=OverflowPolicy.BLOCK)
+        listener.setCoalescing(False)
+        self.assertIs(listener.newQueue().policy, OverflowPolicy.DROP_OLDEST)
+
+    async def test_listener_requesting_with_full_queue(self):
+        signaler = FakeSignaler(rtt=0.05)
+        handled = []
+
+        class RequestingBandwidthListener(BandwidthNotificationListener):
+            async def onDownlinkBwe(self, message: Notification):
+                # the response is read by the server event loop, which keeps feeding the full queue meanwhile
+                requestId = await signaler._sendRequest('getStats', {})
+                await signaler.getResponse(requestId)
+                handled.append(message.data['availableBitrate'])
+
+        bandwidthListener = RequestingBandwidthListener(None)
+        bandwidthListener.setQueuePolicy(maxSize=2, policy=OverflowPolicy.DROP_OLDEST)
+        client = MediasoupClient(signaler=signaler, notificationListeners=[
+            bandwidthListener, PeerNotificationListener(None), ProducerNotificationListener(None),
+            ConsumerNotificationListener(None), DataConsumerNotificationListener(None)])
+        joinTask = asyncio.create_task(client.joinRoom(
+            roomAddressInfo={'serverAddress': 'localhost:4443', 'enableSslVerification': False, 'roomId': 'room'},
+            peerInfo={'peerId': 'peer', 'displayName': 'peer'},
+            producerConfig={'autoProduce': False, 'mediaFilePath': ''},
+            consumerConfig={'recordDirectoryPath': ''}
+        ))
+        await client.waitJoined()
+        signaler.pushMessage({'notification': True, 'method': 'downlinkBwe', 'data': {'availableBitrate': 0}})
+        while 'getStats' not in [method for method, _ in signaler.sentRequests]:
+            await asyncio.sleep(0.01)
+        for bitrate in range(1, 11):
+            signaler.pushMessage({'notification': True, 'method': 'downlinkBwe', 'data': {'availableBitrate': bitrate}})
+
+        for _ in range(100):
+            if len(handled) == 3:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(handled, [0, 9, 10])
+        self.assertEqual(bandwidthListener.queueStats()['dropped'], 8)
+        await leaveClient(client, joinTask)
+
+    async def test_message_router(self):
+        responses = []
+        router = MessageRouter(responseHandler=responses.append)
+        notifications = []
+        router.addNotificationRoute('downlinkBwe', notifications.append)
+
+        async def onRequest(message):
+            return message['id']
+
+        router.addRequestRoute('custom', onRequest)
+        self.assertEqual(await router.dispatch({'request': True, 'id': 5, 'method': 'custom', 'data': {}}), 5)
+        for _ in range(3):
+            await router.dispatch({'notification': True, 'method': 'downlinkBwe', 'data': {}})
+        await router.dispatch({'notification': True, 'method': 'unknown', 'data': {}})
+        await router.dispatch({'response': True, 'id': 1, 'ok': True, 'data': {}})
+        self.assertEqual((len(notifications), len(responses)), (3, 1))
+        stats = router.stats()
+        self.assertEqual(stats['request']['custom']['count'], 1)
+        self.assertEqual(stats['notification']['downlinkBwe']['count'], 3)
+        self.assertEqual(sum(count for _, count in stats['notification']['downlinkBwe']['buckets']), 3)
+        self.assertEqual(stats['notification']['unknown']['count'], 1)
+        self.assertEqual(stats['response'][None]['count'], 1)
+
+        # routes built from the listeners, extended without subclassing MediasoupClient
+        client = MediasoupClient(signaler=FakeSignaler())
+        client._consumerNotificationListener.setQueue(client._consumerNotificationListener.newQueue())
+        await client._dispatchServerMessage({'notification': True, 'method': 'consumerPaused',
+                                             'data': {'consumerId': 'c1'}})
+        self.assertEqual(client._consumerNotificationListener.queueSize(), 1)
+        received = []
+        client.registerNotificationHandler('consumerPaused', received.append)
+        client.registerNotificationHandler('peerMuted', received.append)
+
+        async def onCustomRequest(request):
+            received.append(request)
+
+        client.registerRequestHandler('custom', onCustomRequest)
+        await client._dispatchServerMessage({'notification': True, 'method': 'consumerPaused',
+                                             'data': {'consumerId': 'c1'}})
+        await client._dispatchServerMessage({'notification': True, 'method': 'peerMuted', 'data': {'peerId': 'p'}})
+        await client._dispatchServerMessage({'request': True, 'id': 9, 'method': 'custom', 'data': {}})
+        self.assertEqual(client._consumerNotificationListener.queueSize(), 1)
+        self.assertEqual([(type(message).__name__, message.method) for message in received],
+                         [('Notification', 'consumerPaused'), ('Notification', 'peerMuted'), ('Request', 'custom')])
+        self.assertEqual(client.dispatchStats()['notification']['consumerPaused']['count'], 2)
+
+    async def test_pipelined_join_room(self):
+        rtt = 0.1
+        signaler = FakeSignaler(rtt=rtt)
+        client = MediasoupClient(signaler=signaler)
+        joinTask = asyncio.create_task(client.joinRoom(
+            roomAddressInfo={'serverAddress': 'localhost:4443', 'enableSslVerification': False, 'roomId': 'room'},
+            peerInfo={'peerId': 'peer', 'displayName': 'peer'},
+            producerConfig={'autoProduce': False, 'mediaFilePath': ''},
+            consumerConfig={'recordDirectoryPath': ''}
+        ))
+        for _ in range(100):
+            if 'total' in client.joinTimings:
+                break
+            self.assertFalse(joinTask.done())
+            await asyncio.sleep(0.01)
+
+        methods = [method for method, _ in signaler.sentRequests]
+        self.assertEqual(methods, ['getRouterRtpCapabilities', 'createWebRtcTransport', 'createWebRtcTransport', 'join'])
+        # Both transports are requested within the same round-trip, join waits for one more.
+        self.assertLess(signaler.sentRequests[2][1] - signaler.sentRequests[1][1], rtt)
+        self.assertGreaterEqual(signaler.sentRequests[3][1] - signaler.sentRequests[1][1], rtt)
+        # Serialized, the transports and join would take 3 round-trips after loading the device.
+        self.assertLess(client.joinTimings['total'] - client.joinTimings['loadDevice'], 2.5 * rtt)
+        for phase in ['connectToRoom', 'loadDevice', 'createSendTransport', 'createRecvTransport', 'join']:
+            self.assertIn(phase, client.joinTimings)
+
+        await client.close()
+        await asyncio.gather(joinTask, return_exceptions=True)
+
+    async def test_mediasoup_client_host(self):
+        joinInterval = 0.05
+        host = MediasoupClientHost(joinInterval=joinInterval, maxConcurrentJoins=2, lagProbeInterval=0.01)
+        signalers = {}
+        joinStartTimes = []
+
+        def createClient(signaler: FakeSignaler) -> MediasoupClient:
+            client = MediasoupClient(signaler=signaler)
+            joinRoom = client.joinRoom
+
+            async def timedJoinRoom(*args):
+                joinStartTimes.append(asyncio.get_running_loop().time())
+                return await joinRoom(*args)
+
+            client.joinRoom = timedJoinRoom
+            return client
+
+        for idx in range(4):
+            clientId = f'client-{idx}'
+            signalers[clientId] = FakeSignaler(rtt=0.01)
+            host.addClient(clientId, lambda signaler=signalers[clientId]: createClient(signaler))
+            host.join(clientId,
+                      roomAddressInfo={'serverAddress': 'localhost:4443', 'enableSslVerification': False,
+                                       'roomId': 'room'},
+                      peerInfo={'peerId': clientId, 'displayName': clientId},
+                      producerConfig={'autoProduce': False, 'mediaFilePath': ''},
+                      consumerConfig={'recordDirectoryPath': ''})
+        await asyncio.wait_for(host.waitJoined(), timeout=10)
+
+        # joins start one joinInterval apart
+        self.assertEqual(len(joinStartTimes), 4)
+        for previousTime, nextTime in zip(joinStartTimes, joinStartTimes[1:]):
+            self.assertGreaterEqual(nextTime - previousTime, joinInterval * 0.9)
+        stats = host.stats()
+        self.assertIsNotNone(stats['maxRssBytesPerClientAvg'])
+        self.assertEqual((stats['clients'], stats['joined'], stats['failed']), (4, 4, 0))
+        # the server event loop, 5 notification listener loops and the hosted client task
+        self.assertEqual(stats['perClient']['client-0']['tasks'], 7)
+        self.assertEqual(stats['tasks'], 28)
+        self.assertGreaterEqual(stats['loopLag']['max'], 0)
+
+        await host.removeClient('client-0')
+        self.assertEqual(host.clientIds, ['client-1', 'client-2', 'client-3'])
+        await host.close()
+        self.assertEqual(host.stats()['tasks'], 0)
+
+    async def test_mediasoup_client_supervisor(self):
+        supervisor = MediasoupClientSupervisor(numWorkers=2, clientFactory=createFakeClient,
+                                               hostOptions={'joinInterval': 0, 'lagProbeInterval': 0.01},
+                                               maxLoopLag=0)
+        await supervisor.start()
+        try:
+            for idx in range(4):
+                clientStats = await asyncio.wait_for(supervisor.join(
+                    f'client-{idx}',
+                    roomAddressInfo={'serverAddress': 'localhost:4443', 'enableSslVerification': False,
+                                     'roomId': 'room'},
+                    peerInfo={'peerId': f'client-{idx}', 'displayName': f'client-{idx}'},
+                    producerConfig={'autoProduce': False, 'mediaFilePath': ''},
+                    consumerConfig={'recordDirectoryPath': ''}), timeout=30)
+                self.assertTrue(clientStats['joined'])
+            with self.assertRaises(Exception):
+                await supervisor.play('unknown')
+            stats = await supervisor.stats()
+            # sharded evenly across the workers
+            self.assertEqual([workerStats['clients'] for workerStats in stats['workers']], [2, 2])
+            await supervisor.leave('client-0')
+            stats = await supervisor.stats()
+            self.assertEqual(stats['clients'], 3)
+            self.assertEqual(sorted(workerStats['clients'] for workerStats in stats['workers']), [1, 2])
+
+            # a lagging worker hands clients over to the others
+            supervisor._maxLoopLag = 0.05
+            laggingWorker = max(supervisor._workers, key=lambda worker: len(worker.clientIds))
+            laggingWorker.loopLag = 1
+            await supervisor._rebalance()
+            self.assertEqual(supervisor.movedClients, 1)
+            self.assertEqual(sorted(len(worker.clientIds) for worker in supervisor._workers), [1, 2])
+        finally:
+            await supervisor.close()
+
+    async def test_media_source_registry(self):
+        registry = MediaSourceRegistry()
+        with tempfile.TemporaryDirectory() as directoryPath:
+            mediaFilePath = f'{directoryPath}/tone.wav'
+            with wave.open(mediaFilePath, 'wb') as file:
+                file.setnchannels(1)
+                file.setsampwidth(2)
+                file.setframerate(8000)
+                file.writeframes(b'\x00\x01' * 8000)
+
+            first = registry.acquire(mediaFilePath)
+            second = registry.acquire(mediaFilePath)
+            self.assertEqual(len(registry), 1)
+            self.assertIsNone(first.video)
+            self.assertIsNot(first.audio, second.audio)
+            self.assertEqual(registry.stats()[mediaFilePath], {'refCount': 2, 'subscriptions': 2})
+            # both subscribers receive the frames decoded once
+            firstFrame, secondFrame = await asyncio.wait_for(
+                asyncio.gather(first.audio.recv(), second.audio.recv()), timeout=5)
+            self.assertIs(firstFrame, secondFrame)
+            sourceTrack = registry._sources[mediaFilePath].player.audio
+
+            # a runtime closing releases its subscription, the source stays open for the other one
+            runtime = MultimediaRuntime()
+            runtime.setPlayerFactory(registry.acquire)
+            runtime.initializeProducerAndConsumerOptions(False, mediaFilePath, False, '', None)
+            runtime._preparePlayerEngine()
+            self.assertEqual(registry.stats()[mediaFilePath]['refCount'], 3)
+            await runtime.close(lambda: None)
+            first.close()
+            self.assertEqual(registry.stats()[mediaFilePath]['refCount'], 1)
+            self.assertEqual(sourceTrack.readyState, 'live')
+
+            # the last producer track ending closes the source
+            second.audio.stop()
+            self.assertEqual(len(registry), 0)
+            self.assertEqual(sourceTrack.readyState, 'ended')
+            # and the next subscriber opens it again
+            third = registry.acquire(mediaFilePath)
+            self.assertEqual(registry.stats()[mediaFilePath], {'refCount': 1, 'subscriptions': 1})
+            third.close()
+            self.assertEqual(len(registry), 0)
+
+    async def test_passthrough_producing(self):
+        with tempfile.TemporaryDirectory() as directoryPath:
+            vp8FilePath = f'{directoryPath}/vp8_opus.mkv'
+            generateMediaFile(vp8FilePath, videoCodec='libvpx', audioCodec='libopus')
+            h264FilePath = f'{directoryPath}/h264.mkv'
+            generateMediaFile(h264FilePath, videoCodec='libx264', audioCodec=None)
+            h264Mp4FilePath = f'{directoryPath}/h264.mp4'
+            generateMediaFile(h264Mp4FilePath, videoCodec='libx264', audioCodec=None)
+            h264TsFilePath = f'{directoryPath}/h264.ts'
+            generateMediaFile(h264TsFilePath, videoCodec='libx264', audioCodec=None)
+            pcmuFilePath = f'{directoryPath}/pcmu.wav'
+            generateMediaFile(pcmuFilePath, videoCodec=None, audioCodec='pcm_mulaw')
+            mpeg4FilePath = f'{directoryPath}/mpeg4.mkv'
+            generateMediaFile(mpeg4FilePath, audioCodec=None)
+
+            self.assertEqual(probeMediaCodecs(vp8FilePath), {'video': 'video/VP8', 'audio': 'audio/opus'})
+            runtime = MultimediaRuntime()
+            runtime.initializeProducerAndConsumerOptions(True, vp8FilePath, False, '', None, passthrough=True)
+            await runtime.loadDevice(generateRouterRtpCapabilities())
+            self.assertEqual(runtime._passthroughCodecs['video'].mimeType, 'video/VP8')
+            self.assertEqual(runtime._passthroughCodecs['audio'].mimeType, 'audio/opus')
+            # the tracks deliver the demuxed packets, to be packetized as they are by the senders
+            packet = await asyncio.wait_for(runtime._videoTrack.recv(), timeout=5)
+            self.assertIsInstance(packet, av.Packet)
+            await runtime.close(lambda: None)
+
+            # AVCC(MKV, MP4) is turned into Annex B, Annex B(MPEG-TS) is sent as it is
+            for mediaFilePath in (h264FilePath, h264Mp4FilePath, h264TsFilePath):
+                runtime = MultimediaRuntime()
+                runtime.initializeProducerAndConsumerOptions(True, mediaFilePath, False, '', None, passthrough=True)
+                await runtime.loadDevice(generateRouterRtpCapabilities())
+                self.assertEqual(runtime._passthroughCodecs['video'].mimeType, 'video/H264')
+                self.assertEqual(runtime._passthroughCodecs['video'].parameters['packetization-mode'], 1)
+                self.assertIsNone(runtime._audioTrack)
+                packet = await asyncio.wait_for(runtime._videoTrack.recv(), timeout=5)
+                self.assertTrue(packet.is_keyframe)
+                payloads, _ = H264Encoder().pack(packet)
+                # SPS and PPS aggregated(STAP-A) ahead of the key frame
+                self.assertEqual(payloads[0][0] & 0x1f, 24)
+                nalTypes, offset = [], 1
+                while offset < len(payloads[0]):
+                    nalTypes.append(payloads[0][offset + 2] & 0x1f)
+                    offset += 2 + struct.unpack('!H', payloads[0][offset:offset + 2])[0]
+                self.assertTrue({7, 8} <= set(nalTypes))
+                packet = await asyncio.wait_for(runtime._videoTrack.recv(), timeout=5)
+                self.assertTrue(H264Encoder().pack(packet)[0])
+                await runtime.close(lambda: None)
+
+            # mismatches are detected before producing
+            for mediaFilePath in (pcmuFilePath, mpeg4FilePath):
+                runtime = MultimediaRuntime()
+                runtime.initializeProducerAndConsumerOptions(True, mediaFilePath, False, '', None, passthrough=True)
+                with self.assertRaises(Exception):
+                    await runtime.loadDevice(generateRouterRtpCapabilities())
+                await runtime.close(lambda: None)
+
+    async def test_encoded_recording(self):
+        vp8Codec = RTCRtpCodecParameters(mimeType='video/VP8', clockRate=90000, payloadType=101)
+        h264Codec = RTCRtpCodecParameters(mimeType='video/H264', clockRate=90000, payloadType=103,
+                                          parameters={'packetization-mode': 1})
+        opusCodec = RTCRtpCodecParameters(mimeType='audio/opus', clockRate=48000, channels=2, payloadType=100)
+        with tempfile.TemporaryDirectory() as directoryPath:
+            vp8FilePath = f'{directoryPath}/vp8_opus.webm'
+            generateMediaFile(vp8FilePath, videoCodec='libvpx', audioCodec='libopus')
+            # Annex B, as depacketized from RTP
+            h264FilePath = f'{directoryPath}/h264.h264'
+            generateMediaFile(h264FilePath, videoCodec='libx264', audioCodec=None)
+
+            # the encoded frames are written into containers without being decoded
+            for kind, codec, mediaFilePath in (('video', vp8Codec, vp8FilePath), ('audio', opusCodec, vp8FilePath),
+                                               ('video', h264Codec, h264FilePath)):
+                receiver = await createFakeReceiver(kind, codec)
+                recorder = EncodedFrameRecorder(f'{directoryPath}/{codec.name}.rec', codec.mimeType)
+                recorder.addReceiver(receiver)
+                await recorder.start()
+                try:
+                    for _, packet in generateRtpPackets(mediaFilePath, kind, codec):
+                        await receiver._handle_rtp_packet(packet, arrival_time_ms=0)
+                finally:
+                    await receiver.stop()
+                    await recorder.stop()
+                # nothing reached the track, but its end
+                with self.assertRaises(MediaStreamError):
+                    await asyncio.wait_for(receiver.track.recv(), timeout=1)
+                self.assertGreater(recorder.framesWritten, 20)
+                self.assertEqual(recorder.framesSkipped, 0)
+                with av.open(f'{directoryPath}/{codec.name}.rec') as container:
+                    self.assertEqual(sum(1 for _ in container.decode(container.streams[0])), recorder.framesWritten)
+
+            # or the RTP packets dumped along with an SDP sidecar
+            receiver = await createFakeReceiver('video', vp8Codec)
+            recorder = RtpDumpRecorder(f'{directoryPath}/vp8.rtp', 'video', generateConsumerRemoteParameters(
+                codecMimeType='video/VP8')['rtpParameters'])
+            recorder.addReceiver(receiver)
+            await recorder.start()
+            packets = generateRtpPackets(vp8FilePath, 'video', vp8Codec)
+            try:
+                for _, packet in packets:
+                    await receiver._handle_rtp_packet(packet, arrival_time_ms=0)
+            finally:
+                await receiver.stop()
+                await recorder.stop()
+            with open(f'{directoryPath}/vp8.rtp', 'rb') as file:
+                self.assertTrue(file.readline().startswith(b'#!rtpplay1.0 '))
+                file.read(16)
+                dumpedPackets = []
+                while header := file.read(8):
+                    length, packetLength, _ = struct.unpack('!HHI', header)
+                    self.assertEqual(length, packetLength + 8)
+                    dumpedPackets.append(file.read(packetLength))
+            self.assertEqual(dumpedPackets, [packet.serialize() for _, packet in packets])
+            with open(f'{directoryPath}/vp8.sdp', encoding='utf-8') as file:
+                sdp = sdp_transform.parse(file.read())
+            self.assertEqual(sdp['media'][0]['rtp'][0]['codec'], 'VP8')
+
+            # selected per kind by the runtime
+            runtime = MultimediaRuntime()
+            runtime.initializeProducerAndConsumerOptions(False, None, False, directoryPath, None,
+                                                         recordMode={'video': 'container', 'audio': 'rtp'})
+            room = Room(roomId='room')
+            mePeer = Peer(room, 'me', PeerAppData('me', {}))
+            producePeer = Peer(room, 'other', PeerAppData('other', {}))
+            videoRecorder = runtime._createRecorder(mePeer, 'c1', producePeer, 'p1', 'video', {
+                'codecs': [{'mimeType': 'video/VP8', 'clockRate': 90000, 'payloadType': 101}]})
+            audioRecorder = runtime._createRecorder(mePeer, 'c2', producePeer, 'p2', 'audio', {
+                'codecs': [{'mimeType': 'audio/opus', 'clockRate': 48000, 'channels': 2, 'payloadType': 100}]})
+            self.assertIsInstance(videoRecorder, EncodedFrameRecorder)
+            self.assertTrue(videoRecorder._file.endswith('.webm'))
+            self.assertIsInstance(audioRecorder, RtpDumpRecorder)
+            self.assertTrue(audioRecorder._file.endswith('.rtp'))
+            with self.assertRaises(Exception):
+                runtime.initializeProducerAndConsumerOptions(False, None, False, directoryPath, None,
+                                                             recordMode='raw')
+
+    async def test_encoded_recording_aiortc_hooks(self):
+        # the encoded recorders hook into aiortc internals(checked against aiortc 1.15), fail loudly when they move
+        receiver = await createFakeReceiver('video', RTCRtpCodecParameters(mimeType='video/VP8', clockRate=90000,
+                                                                           payloadType=101))
+        try:
+            self.assertIsInstance(getattr(receiver, '_RTCRtpReceiver__decoder_queue', None), queue.Queue)
+            self.assertIn('self.__decoder_queue.put(', inspect.getsource(RTCRtpReceiver._handle_rtp_packet))
+            # the transport looks the packet handler up on the receiver, so that RtpDumpRecorder can wrap it
+            self.assertIn('receiver._handle_rtp_packet(', inspect.getsource(RTCDtlsTransport._handle_rtp_data))
+        finally:
+            await receiver.stop()
+
+    async def test_encoded_recording_timestamps(self):
+        vp8Codec = RTCRtpCodecParameters(mimeType='video/VP8', clockRate=90000, payloadType=101)
+        # 30 fps frames, a key frame every 3 frames, the RTP timestamps wrapping around between the 3rd and 4th
+        keyFrame, deltaFrame = b'\x00' + bytes(15), b'\x01' + bytes(15)
+        frames = [JitterFrame(keyFrame if idx % 3 == 0 else deltaFrame, (2 ** 32 - 3 * 3000 + idx * 3000) % 2 ** 32)
+                  for idx in range(9)]
+
+        # in ms, the time base of webm
+        def demuxedPts(filePath: str) -> list:
+            with av.open(filePath) as container:
+                stream = container.streams[0]
+                return [int(packet.pts * stream.time_base * 1000) for packet in container.demux(stream) if packet.size]
+
+        with tempfile.TemporaryDirectory() as directoryPath:
+            # starts at 0 and counts on across the wrap around
+            recorder = EncodedFrameRecorder(f'{directoryPath}/wrap.webm', vp8Codec.mimeType)
+            await recorder.start()
+            for frame in frames:
+                recorder._writeFrame(vp8Codec, frame)
+            await recorder.stop()
+            self.assertEqual(recorder.framesWritten, 9)
+            self.assertEqual(demuxedPts(f'{directoryPath}/wrap.webm'), [round(idx * 1000 / 30) for idx in range(9)])
+
+            # every segment starts at 0 again
+            segmenter = RecordSegmenter(f'{directoryPath}/segments.webm', segmentSize=1,
+                                        limiter=RecordFileLimiter(fsyncInterval=0))
+            recorder = EncodedFrameRecorder(f'{directoryPath}/segments.webm', vp8Codec.mimeType, segmenter=segmenter)
+            await recorder.start()
+            for frame in frames:
+                recorder._writeFrame(vp8Codec, frame)
+            await recorder.stop()
+            self.assertEqual(len(segmenter.segments), 3)
+            for segment in segmenter.segments:
+                self.assertEqual(demuxedPts(f'{directoryPath}/{segment["file"]}'), [0, 33, 67])
+
+    async def test_pooled_recording(self):
+        class FrameTrack(MediaStreamTrack):
+            kind = 'video'
+
+            def __init__(self, numFrames: int):
+                super().__init__()
+                self._frames = []
+                for idx in range(numFrames):
+                    frame = av.VideoFrame(64, 48, 'yuv420p')
+                    for plane in frame.planes:
+                        plane.update(bytes([idx * 8 % 256]) * plane.buffer_size)
+                    frame.pts, frame.time_base = idx, fractions.Fraction(1, 30)
+                    self._frames.append(frame)
+
+            async def recv(self):
+                if not self._frames:
+                    self.stop()
+                    raise MediaStreamError
+                return self._frames.pop(0)
+
+        def decodedFrameCount(filePath: str) -> int:
+            with av.open(filePath) as container:
+                return sum(1 for _ in container.decode(video=0))
+
+        pool = RecordingPool('thread', numWorkers=2)
+        processPool = RecordingPool('process', numWorkers=1)
+        try:
+            with tempfile.TemporaryDirectory() as directoryPath:
+                # a stalled writer makes the frames pile up to the bound, then be dropped, not the loop stalled
+                for dropPolicy, lastPts in (('drop-oldest', 19), ('drop-newest', None)):
+                    recorder = PooledMediaRecorder(f'{directoryPath}/{dropPolicy}.mp4', pool=pool, maxQueueSize=5,
+                                                   dropPolicy=dropPolicy)
+                    recorder.addTrack(FrameTrack(20))
+                    await recorder.start()
+                    gate = threading.Event()
+                    writtenPts = []
+                    write = recorder._writer.write
+
+                    def stalledWrite(kind, frame, write=write, gate=gate, writtenPts=writtenPts):
+                        gate.wait(5)
+                        writtenPts.append(frame.pts)
+                        write(kind, frame)
+
+                    recorder._writer.write = stalledWrite
+                    await asyncio.wait_for(asyncio.gather(*recorder._tasks), timeout=5)
+                    self.assertEqual(recorder.maxQueueDepth, 5)
+                    self.assertGreater(recorder.droppedFrames, 0)
+                    gate.set()
+                    await recorder.stop()
+                    stats = recorder.stats()
+                    self.assertEqual(stats['queueDepth'], 0)
+                    self.assertIsNone(stats['error'])
+                    self.assertEqual(stats['writtenFrames'] + stats['droppedFrames'], 20)
+                    if lastPts is None:
+                        self.assertNotIn(19, writtenPts)
+                    else:
+                        self.assertEqual(writtenPts[-1], lastPts)
+                    self.assertEqual(decodedFrameCount(f'{directoryPath}/{dropPolicy}.mp4'), stats['writtenFrames'])
+
+                # or the frames encoded and written by a worker process
+                recorder = PooledMediaRecorder(f'{directoryPath}/process.webm', pool=processPool, maxQueueSize=50)
+                recorder.addTrack(FrameTrack(20))
+                await recorder.start()
+                await asyncio.wait_for(asyncio.gather(*recorder._tasks), timeout=5)
+                await recorder.stop()
+                self.assertEqual(recorder.droppedFrames, 0)
+                self.assertEqual(decodedFrameCount(f'{directoryPath}/process.webm'), 20)
+
+                # selected by the runtime for the transcoded recordings
+                runtime = MultimediaRuntime()
+                runtime.initializeProducerAndConsumerOptions(False, None, False, directoryPath, None,
+                                                             recordingPool=pool, recordQueueSize=10)
+                room = Room(roomId='room')
+                recorder = runtime._createRecorder(Peer(room, 'me', PeerAppData('me', {})), 'c1',
+                                                   Peer(room, 'other', PeerAppData('other', {})), 'p1', 'video',
+                                                   {'codecs': [{'mimeType': 'video/VP8', 'clockRate': 90000}]})
+                self.assertIsInstance(recorder, PooledMediaRecorder)
+                self.assertEqual(runtime.recorderStats()['c1']['droppedFrames'], 0)
+        finally:
+            pool.shutdown()
+            processPool.shutdown()
+
+    async def test_segmented_recording(self):
+        class PacedFrameTrack(MediaStreamTrack):
+            kind = 'video'
+
+            def __init__(self, numFrames: int):
+                super().__init__()
+                self._numFrames = numFrames
+                self._frameIdx = 0
+
+            async def recv(self):
+                if self._frameIdx >= self._numFrames:
+                    self.stop()
+                    raise MediaStreamError
+                await asyncio.sleep(1 / 30)
+                frame = av.VideoFrame(64, 48, 'yuv420p')
+                for plane in frame.planes:
+                    plane.update(bytes([self._frameIdx * 8 % 256]) * plane.buffer_size)
+                frame.pts, frame.time_base = self._frameIdx, fractions.Fraction(1, 30)
+                self._frameIdx += 1
+                return frame
+
+        def decodedFrameCount(filePath: str) -> int:
+            with av.open(filePath) as container:
+                return sum(1 for _ in container.decode(container.streams[0]))
+
+        with tempfile.TemporaryDirectory() as directoryPath:
+            # buffered writes, the ones before the flushed end applied on the next flush
+            limiter = RecordFileLimiter(maxOpenFiles=1, fsyncInterval=0)
+            segmentFile = SegmentFile(f'{directoryPath}/buffered.bin', flushSize=4, limiter=limiter)
+            segmentFile.write(b'abcdef')
+            self.assertEqual(os.path.getsize(f'{directoryPath}/buffered.bin'), 6)
+            segmentFile.seek(1)
+            segmentFile.write(b'XY')
+            segmentFile.seek(0, os.SEEK_END)
+            segmentFile.write(b'gh')
+            segmentFile.close()
+            with open(f'{directoryPath}/buffered.bin', 'rb') as file:
+                self.assertEqual(file.read(), b'aXYdefgh')
+            self.assertEqual(limiter.fsyncs, limiter.flushes)
+            # no more files open at once than the cap, whatever the writing threads
+            segmentFiles = [SegmentFile(f'{directoryPath}/{idx}.bin', flushSize=1024, limiter=limiter)
+                            for idx in range(8)]
+            threads = [threading.Thread(target=lambda file=file: [file.write(bytes(256)) for _ in range(64)])
+                       for file in segmentFiles]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for file in segmentFiles:
+                file.close()
+            self.assertEqual(limiter.maxOpenFilesReached, 1)
+            self.assertEqual(limiter.openFiles, 0)
+            self.assertEqual({os.path.getsize(file.name) for file in segmentFiles}, {256 * 64})
+
+            # the segments are flushed, closed and listed off the event loop, even while every file slot is taken
+            busyLimiter = RecordFileLimiter(maxOpenFiles=1, fsyncInterval=0)
+            busyLimiter.acquire()
+            segmenter = RecordSegmenter(f'{directoryPath}/busy.bin', limiter=busyLimiter)
+            for idx in range(3):
+                segmenter.openSegment().write(bytes([idx]) * 16)
+            closeTask = asyncio.ensure_future(segmenter.close())
+            await asyncio.sleep(0.1)
+            self.assertFalse(closeTask.done())
+            self.assertEqual(busyLimiter.flushes, 0)
+            busyLimiter.release()
+            await asyncio.wait_for(closeTask, timeout=5)
+            with open(f'{directoryPath}/busy.manifest.json', encoding='utf-8') as file:
+                manifest = json.load(file)
+            self.assertTrue(manifest['complete'])
+            self.assertEqual([segment['bytes'] for segment in manifest['segments']], [16, 16, 16])
+            for idx, segment in enumerate(manifest['segments']):
+                with open(f'{directoryPath}/{segment["file"]}', 'rb') as file:
+                    self.assertEqual(file.read(), bytes([idx]) * 16)
+            self.assertEqual(busyLimiter.fsyncs, 3)
+
+            # a transcoded recording rotated every 0.3s into standalone segments
+            segmenter = RecordSegmenter(f'{directoryPath}/transcoded.mp4', segmentDuration=0.3, limiter=limiter)
+            recorder = SegmentedRecorder(segmenter, lambda file: MediaRecorder(file), checkInterval=0.05)
+            track = PacedFrameTrack(45)
+            recorder.addTrack(track)
+            await recorder.start()
+            while track.readyState != 'ended':
+                await asyncio.sleep(0.1)
+            await recorder.stop()
+            with open(f'{directoryPath}/transcoded.manifest.json', encoding='utf-8') as file:
+                manifest = json.load(file)
+            self.assertTrue(manifest['complete'])
+            self.assertGreaterEqual(len(manifest['segments']), 3)
+            self.assertEqual([segment['file'] for segment in manifest['segments']][:2],
+                             ['transcoded.00000.mp4', 'transcoded.00001.mp4'])
+            self.assertEqual(sum(decodedFrameCount(f'{directoryPath}/{segment["file"]}')
+                                 for segment in manifest['segments']), 45)
+
+            # the encoded frames rotated on key frames, so that every segment is decodable on its own
+            vp8Codec = RTCRtpCodecParameters(mimeType='video/VP8', clockRate=90000, payloadType=101)
+            vp8FilePath = f'{directoryPath}/vp8.webm'
+            generateMediaFile(vp8FilePath, seconds=2, videoCodec='libvpx', audioCodec=None, gopSize=15)
+            receiver = await createFakeReceiver('video', vp8Codec)
+            segmenter = RecordSegmenter(f'{directoryPath}/encoded.webm', segmentSize=1, limiter=limiter)
+            encodedRecorder = EncodedFrameRecorder(f'{directoryPath}/encoded.webm', vp8Codec.mimeType,
+                                                   segmenter=segmenter)
+            encodedRecorder.addReceiver(receiver)
+            await encodedRecorder.start()
+            try:
+                for _, packet in generateRtpPackets(vp8FilePath, 'video', vp8Codec):
+                    await receiver._handle_rtp_packet(packet, arrival_time_ms=0)
+            finally:
+                await receiver.stop()
+                await encodedRecorder.stop()
+            self.assertGreater(len(segmenter.segments), 1)
+            self.assertEqual(sum(decodedFrameCount(f'{directoryPath}/{segment["file"]}')
+                                 for segment in segmenter.segments), encodedRecorder.framesWritten)
+
+            # selected by the runtime, named by the recordFilePathGenerator
+            runtime = MultimediaRuntime()
+            runtime.initializeProducerAndConsumerOptions(
+                False, None, False, directoryPath,
+                lambda mePeer, consumerId, producePeer, producerId, kind: ('custom', f'{kind}-{consumerId}', 'mkv'),
+                recordSegmentDuration=60)
+            room = Room(roomId='room')
+            recorder = runtime._createRecorder(Peer(room, 'me', PeerAppData('me', {})), 'c1',
+                                               Peer(room, 'other', PeerAppData('other', {})), 'p1', 'video',
+                                               {'codecs': [{'mimeType': 'video/VP8', 'clockRate': 90000}]})
+            self.assertIsInstance(recorder, SegmentedRecorder)
+            self.assertEqual(recorder.segmenter.manifestPath, f'{directoryPath}/custom/video-c1.manifest.json')
+
+    def test_sdp_transform_parse(self):
+        sdpDict = sdp_transform.parse('\r\n'.join([
+            'v=0',
+            'o=- 20518 0 IN IP4 203.0.113.1',
+            's=-',
+            't=0 0',
+            'a=group:BUNDLE 0',
+            'a=ice-lite',
+            'm=audio 9 UDP/TLS/RTP/SAVPF 111',
+            'a=mid:0',
+            'a=sendonly',
+            'a=rtcp-mux-only',
+            'a=rtpmap:111 opus/48000/2',
+            'a=rtcp-fb:111 trr-int 100',
+            'a=rtcp-fb:111 nack pli',
+            'a=fmtp:111 minptime=10;useinbandfec=1',
+            'a=x-unknown:foo',
+            ''
+        ]))
+
+        self.assertDictEqual(sdpDict['origin'], {
+            'username'       : '-',
+            'sessionId'      : 20518,
+            'sessionVersion' : 0,
+            'netType'        : 'IN',
+            'ipVer'          : 4,
+            'address'        : '203.0.113.1'
+        })
+        self.assertEqual(sdpDict['groups'], [{ 'type': 'BUNDLE', 'mids': 0 }])
+        self.assertEqual(sdpDict['icelite'], 'ice-lite')
+
+        audioDict = sdpDict['media'][0]
+        self.assertEqual(audioDict['mid'], 0)
+        self.assertEqual(audioDict['direction'], 'sendonly')
+        self.assertEqual(audioDict['rtcpMux'], 'rtcp-mux')
+        self.assertEqual(audioDict['rtp'], [{ 'payload': 111, 'codec': 'opus', 'rate': 48000, 'encoding': 2 }])
+        self.assertEqual(audioDict['rtcpFbTrrInt'], [{ 'payload': 111, 'value': 100 }])
+        self.assertEqual(audioDict['rtcpFb'], [{ 'payload': 111, 'type': 'nack', 'subtype': 'pli' }])
+        self.assertEqual(audioDict['fmtp'], [{ 'payload': 111, 'config': 'minptime=10;useinbandfec=1' }])
+        self.assertEqual(audioDict['invalid'], [{ 'value': 'x-unknown:foo' }])
+
+    def test_sdp_transform_write(self):
+        # golden: an SDP in the writer's line order is written back byte for byte
+        golden = '\r\n'.join([
+            'v=0',
+            'o=- 3848736491 2 IN IP4 127.0.0.1',
+            's=-',
+            't=0 0',
+            'a=ice-lite',
+            'a=msid-semantic: WMS *',
+            'a=group:BUNDLE 0 1',
+            'm=audio 9 UDP/TLS/RTP/SAVPF 111',
+            'c=IN IP4 0.0.0.0',
+            'a=rtpmap:111 opus/48000/2',
+            'a=fmtp:111 minptime=10;useinbandfec=1',
+            'a=rtcp:9 IN IP4 0.0.0.0',
+            'a=rtcp-fb:111 transport-cc',
+            'a=extmap:1 urn:ietf:params:rtp-hdrext:sdes:mid',
+            'a=setup:active',
+            'a=msid:stream track',
+            'a=sendonly',
+            'a=ice-ufrag:8fcG',
+            'a=ice-pwd:rUbFLmjgW0xbUeDo2fG4Mc',
+            'a=fingerprint:sha-256 82:5A:68:3D',
+            'a=candidate:0 1 udp 1076302079 192.168.56.1 44444 typ host',
+            'a=end-of-candidates',
+            'a=ssrc:1001 cname:abc',
+            'a=rtcp-mux',
+            'a=rtcp-rsize',
+            'a=mid:0',
+            'm=video 9 UDP/TLS/RTP/SAVPF 96 97',
+            'a=rtpmap:96 VP8/90000',
+            'a=rtpmap:97 rtx/90000',
+            'a=fmtp:97 apt=96',
+            'a=rtcp-fb:96 nack pli',
+            'a=recvonly',
+            'a=ssrc-group:FID 1001 1002',
+            'a=rid:1 send max-width=1280',
+            'a=simulcast:send 1;2',
+            'a=mid:1',
+            'a=x-unknown:foo',
+            'm=application 9 UDP/DTLS/SCTP webrtc-datachannel',
+            'a=sctp-port:5000',
+            'a=max-message-size:262144',
+            'a=mid:datachannel'
+        ])
+        self.assertEqual(sdp_transform.write(sdp_transform.parse(golden)), golden)
+        self.assertEqual(legacyWrite(sdp_transform.parse(golden)), golden)
+
+        # fuzz: random dicts are written like the former writer did, and parsed back to the same dict
+        rand = random.Random(0)
+        customOrder = ['v', 'o', 's', 't', 'a', 'c', 'a']
+        for _ in range(300):
+            sdpDict = sdp_transform.parse(generateRandomSdp(rand))
+            self.assertEqual(sdp_transform.parse(sdp_transform.write(sdpDict)), sdpDict)
+            sdpDict = generateRandomSdpDict(rand)
+            sdp = sdp_transform.write(sdpDict)
+            self.assertEqual(sdp, legacyWrite(copy.deepcopy(sdpDict)))
+            self.assertEqual(sdp, '\r\n'.join([sdp_transform.writeSession(sdpDict)] +
+                                               [sdp_transform.writeMedia(mLine) for mLine in sdpDict['media']]))
+            self.assertEqual(sdp_transform.write(sdpDict, outerOrder=customOrder),
+                             legacyWrite(copy.deepcopy(sdpDict), outerOrder=customOrder))
+
+    def test_remote_sdp_cached_media_sections(self):
+        _, iceParameters, iceCandidates, dtlsParameters, sctpParameters = generateTransportRemoteParameters()
+        remoteSdp = RemoteSdp(
+            iceParameters=iceParameters,
+            iceCandidates=iceCandidates,
+            dtlsParameters=dtlsParameters,
+            sctpParameters=sctpParameters
+        )
+        for mid, codecMimeType in enumerate(['audio/opus', 'video/VP8', 'audio/opus']):
+            consumerRemoteParameters = generateConsumerRemoteParameters(codecMimeType=codecMimeType)
+            rtpParameters = RtpParameters(**consumerRemoteParameters['rtpParameters'])
+            remoteSdp.receive(
+                mid=str(mid),
+                kind=consumerRemoteParameters['kind'],
+                offerRtpParameters=rtpParameters,
+                streamId=rtpParameters.rtcp.cname,
+                trackId=consumerRemoteParameters['id']
+            )
+            self.assertEqual(remoteSdp.getSdp(), sdp_transform.write(remoteSdp._sdpDict))
+
+        # Every mutation must show up in the next getSdp().
+        remoteSdp.updateDtlsRole('client')
+        self.assertEqual(remoteSdp.getSdp(), sdp_transform.write(remoteSdp._sdpDict))
+        remoteSdp.closeMediaSection('1')
+        sdp = remoteSdp.getSdp()
+        self.assertEqual(sdp, sdp_transform.write(remoteSdp._sdpDict))
+        self.assertEqual(sdp_transform.parse(sdp)['media'][1]['port'], 0)
+        _, newIceParameters, _, _, _ = generateTransportRemoteParameters()
+        newIceParameters.usernameFragment = 'restarted'
+        remoteSdp.updateIceParameters(newIceParameters)
+        sdp = remoteSdp.getSdp()
+        self.assertEqual(sdp, sdp_transform.write(remoteSdp._sdpDict))
+        self.assertTrue(all(m['iceUfrag'] == 'restarted' for m in sdp_transform.parse(sdp)['media']))
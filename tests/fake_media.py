@@ -0,0 +1,95 @@
+import fractions
+from typing import List, Tuple
+
+import av
+from aiortc import RTCRtpReceiver
+from aiortc.codecs import get_encoder
+from aiortc.rtcrtpparameters import RTCRtpCodecParameters, RTCRtpDecodingParameters, RTCRtpReceiveParameters
+from aiortc.rtcrtpreceiver import RemoteStreamTrack
+from aiortc.rtp import RtpPacket
+
+
+def generateMediaFile(filePath: str, seconds: float = 1, videoCodec: str = 'mpeg4', audioCodec: str = 'pcm_s16le',
+                      width: int = 320, height: int = 240, gopSize: int = None):
+    """
+    write a media file with a moving gradient video at 30 fps and a silent stereo audio at 48 kHz,
+    a None codec leaves the stream out, gopSize is the max frames between two key frames
+    """
+    container = av.open(filePath, mode='w')
+    videoStream = audioStream = None
+    if videoCodec is not None:
+        videoStream = container.add_stream(videoCodec, rate=30)
+        videoStream.width, videoStream.height, videoStream.pix_fmt = width, height, 'yuv420p'
+        if gopSize is not None:
+            videoStream.codec_context.gop_size = gopSize
+    if audioCodec is not None:
+        audioStream = container.add_stream(audioCodec, rate=48000)
+        audioStream.layout = 'stereo'
+    if videoStream is not None:
+        for idx in range(int(seconds * 30)):
+            videoFrame = av.VideoFrame(width, height, 'yuv420p')
+            for plane in videoFrame.planes:
+                # so that every frame costs a real encode and decode
+                plane.update(bytes((idx + offset) % 256 for offset in range(plane.line_size)) * plane.height)
+            videoFrame.pts, videoFrame.time_base = idx, fractions.Fraction(1, 30)
+            container.mux(videoStream.encode(videoFrame))
+        container.mux(videoStream.encode())
+    if audioStream is not None:
+        for idx in range(int(seconds * 50)):
+            audioFrame = av.AudioFrame(format=audioStream.format.name, layout='stereo', samples=960)
+            for plane in audioFrame.planes:
+                plane.update(bytes(plane.buffer_size))
+            audioFrame.sample_rate, audioFrame.pts = 48000, idx * 960
+            container.mux(audioStream.encode(audioFrame))
+        container.mux(audioStream.encode())
+    container.close()
+
+
+class FakeDtlsTransport:
+    """
+    stands in for the RTCDtlsTransport of an RTCRtpReceiver fed by hand
+    """
+    state = 'new'
+
+    def _register_rtp_receiver(self, receiver, parameters):
+        pass
+
+    def _unregister_rtp_receiver(self, receiver):
+        pass
+
+    async def _send_rtp(self, data: bytes):
+        pass
+
+
+async def createFakeReceiver(kind: str, codec: RTCRtpCodecParameters, ssrc: int = 1234) -> RTCRtpReceiver:
+    receiver = RTCRtpReceiver(kind, FakeDtlsTransport())
+    receiver._track = RemoteStreamTrack(kind=kind)
+    await receiver.receive(RTCRtpReceiveParameters(
+        codecs=[codec], encodings=[RTCRtpDecodingParameters(ssrc=ssrc, payloadType=codec.payloadType)]))
+    return receiver
+
+
+def generateRtpPackets(mediaFilePath: str, kind: str, codec: RTCRtpCodecParameters, ssrc: int = 1234) \
+        -> List[Tuple[float, RtpPacket]]:
+    """
+    :return: [(seconds since the first packet, RTP packet)] of the first stream of the kind in the media file,
+        packetized as is by the aiortc encoder of the codec
+    """
+    encoder = get_encoder(codec)
+    packets = []
+    sequenceNumber = 0
+    with av.open(mediaFilePath) as container:
+        stream = next(stream for stream in container.streams if stream.type == kind)
+        for frameIdx, packet in enumerate(container.demux(stream)):
+            if not packet.size:
+                continue
+            if packet.pts is None:
+                # raw streams are not timestamped, the video of generateMediaFile() is at 30 fps
+                packet.pts, packet.time_base = frameIdx, fractions.Fraction(1, 30)
+            payloads, timestamp = encoder.pack(packet)
+            for idx, payload in enumerate(payloads):
+                packets.append((float(packet.pts * packet.time_base), RtpPacket(
+                    payload_type=codec.payloadType, sequence_number=sequenceNumber, timestamp=timestamp & 0xffffffff,
+                    ssrc=ssrc, payload=payload, marker=int(idx == len(payloads) - 1))))
+                sequenceNumber = (sequenceNumber + 1) & 0xffff
+    return packets
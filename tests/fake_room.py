@@ -0,0 +1,252 @@
+import asyncio
+import itertools
+import time
+import tracemalloc
+from typing import Dict, List
+
+from smcdk.api.mediasoup_client import MediasoupClient
+from smcdk.api.room_peer import Room
+
+from .fake_parameters import generateConsumerRemoteParameters, generateDataConsumerRemoteParameters
+from .fake_signaler import FakeSignaler
+
+
+class FakeRoomServer(FakeSignaler):
+    """
+    in-memory protoo room server whose remote peers join, are consumed by the client and leave
+    """
+
+    def __init__(self, rtt: float = 0):
+        super().__init__(rtt=rtt)
+        # requestId -> future resolved once the client answered that server request
+        self._pendingServerRequests: Dict[int, asyncio.Future] = {}
+        self._serverRequestIds = itertools.count(1000000)
+        # the data channels of a transport need distinct SCTP stream ids
+        self._sctpStreamIds = itertools.count(1)
+        # peerId -> (consumerIds, dataConsumerIds)
+        self._remotePeers: Dict[str, tuple] = {}
+
+    async def responseToNewConsumer(self, requestId: int):
+        await super().responseToNewConsumer(requestId)
+        self._answerServerRequest(requestId)
+
+    async def responseToNewDataConsumer(self, requestId: int):
+        await super().responseToNewDataConsumer(requestId)
+        self._answerServerRequest(requestId)
+
+    def _answerServerRequest(self, requestId: int):
+        future = self._pendingServerRequests.pop(requestId, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def _pushServerRequest(self, method: str, data: dict) -> asyncio.Future:
+        requestId = next(self._serverRequestIds)
+        future = self._pendingServerRequests[requestId] = self._loop.create_future()
+        self.pushMessage({'request': True, 'id': requestId, 'method': method, 'data': data})
+        return future
+
+    async def joinPeer(self, room: Room, peerId: str, codecMimeTypes: List[str] = ('audio/opus', 'video/VP8'),
+                       numDataConsumers: int = 0):
+        """
+        a remote peer joins and produces, wait until the client has consumed it all
+
+        :param room: room of the client, like a real server the peer produces only once the client knows it
+        """
+        self.pushMessage({'notification': True, 'method': 'newPeer',
+                          'data': {'id': peerId, 'displayName': peerId, 'device': {}}})
+        while room.getPeerByPeerId(peerId) is None:
+            await asyncio.sleep(0)
+        consumerIds = []
+        futures = []
+        for codecMimeType in codecMimeTypes:
+            remoteParameters = generateConsumerRemoteParameters(codecMimeType=codecMimeType)
+            consumerIds.append(remoteParameters['id'])
+            futures.append(self._pushServerRequest('newConsumer', {
+                **remoteParameters, 'peerId': peerId, 'type': 'simple', 'producerPaused': False, 'appData': {}}))
+        dataConsumerIds = []
+        for _ in range(numDataConsumers):
+            id, dataProducerId, sctpStreamParameters = generateDataConsumerRemoteParameters()
+            sctpStreamParameters.streamId = next(self._sctpStreamIds)
+            dataConsumerIds.append(id)
+            futures.append(self._pushServerRequest('newDataConsumer', {
+                'id': id, 'dataProducerId': dataProducerId, 'peerId': peerId,
+                'sctpStreamParameters': sctpStreamParameters.dict(exclude_none=True), 'label': 'chat',
+                'protocol': '', 'appData': {}}))
+        await asyncio.gather(*futures)
+        self._remotePeers[peerId] = (consumerIds, dataConsumerIds)
+
+    def leavePeer(self, peerId: str):
+        """
+        a remote peer leaves: its consumers are closed, then the peer
+        """
+        consumerIds, dataConsumerIds = self._remotePeers.pop(peerId)
+        for consumerId in consumerIds:
+            self.pushMessage({'notification': True, 'method': 'consumerClosed', 'data': {'consumerId': consumerId}})
+        for dataConsumerId in dataConsumerIds:
+            self.pushMessage({'notification': True, 'method': 'dataConsumerClosed',
+                              'data': {'dataConsumerId': dataConsumerId}})
+        self.pushMessage({'notification': True, 'method': 'peerClosed', 'data': {'peerId': peerId}})
+
+
+def structureSizes(client: MediasoupClient) -> Dict[str, int]:
+    """
+    sizes of the structures of a client which grow with the consumers of the room
+    """
+    runtime = client.multimediaRuntime
+    sizes = {
+        'room.peers': len(client.room._peerIdToPeerMap),
+        'room.consumerIdToPeer': len(client.room._consumerIdToPeerMap),
+        'room.dataConsumerIdToPeer': len(client.room._dataConsumerIdToPeerMap),
+        'runtime.consumers': len(runtime.consumerRegistry),
+        'runtime.dataConsumers': len(runtime._dataConsumers),
+        'signaler.responses': len(client._signaler._responses)
+    }
+    recvTransport = runtime._recvTransport
+    if recvTransport is not None:
+        handler = recvTransport.handler
+        sizes['recvTransport.consumers'] = len(recvTransport._consumers)
+        sizes['recvTransport.dataConsumers'] = len(recvTransport._dataConsumers)
+        sizes['handler.mapMidTransceiver'] = len(handler._mapMidTransceiver)
+        sizes['remoteSdp.mediaSections'] = len(handler.remoteSdp._mediaSections)
+        sizes['pc.transceivers'] = len(handler.pc.getTransceivers())
+        # the last offer built from the remote sdp
+        remoteDescription = handler.pc.remoteDescription
+        sizes['pc.remoteSdpBytes'] = len(remoteDescription.sdp) if remoteDescription is not None else 0
+    return sizes
+
+
+async def joinClient(server: FakeRoomServer, roomId: str, consumerConfig: dict) -> tuple:
+    """
+    a client joins the room of the server, without producing nor recording
+
+    :return: (MediasoupClient, task running joinRoom)
+    """
+    client = MediasoupClient(signaler=server)
+    joinTask = asyncio.ensure_future(client.joinRoom(
+        {'serverAddress': 'wss://localhost', 'roomId': roomId, 'enableSslVerification': False},
+        {'peerId': 'me', 'displayName': 'me'},
+        {'autoProduce': False, 'mediaFilePath': ''},
+        {'recordDirectoryPath': '', **consumerConfig}))
+    await client.waitJoined()
+    return client, joinTask
+
+
+async def leaveClient(client: MediasoupClient, joinTask: asyncio.Task):
+    await client.close()
+    joinTask.cancel()
+    await asyncio.gather(joinTask, return_exceptions=True)
+
+
+async def churnPeers(client: MediasoupClient, server: FakeRoomServer, peerIds: List[str],
+                     numDataConsumers: int = 1) -> List[float]:
+    """
+    every peer joins, is consumed, then leaves and is released by the client, one after another
+
+    :return: seconds spent per peer
+    """
+    room = client.room
+    peerSeconds = []
+    for peerId in peerIds:
+        startTime = time.perf_counter()
+        await server.joinPeer(room, peerId, numDataConsumers=numDataConsumers)
+        server.leavePeer(peerId)
+        while room.getPeerByPeerId(peerId) is not None:
+            await asyncio.sleep(0)
+        await client.waitReleased()
+        peerSeconds.append(time.perf_counter() - startTime)
+    return peerSeconds
+
+
+async def runPeerChurn(numPeers: int, numWarmupPeers: int = 10, numDataConsumers: int = 1,
+                       traceFilePattern: str = '*/smcdk/*') -> dict:
+    """
+    soak a client with remote peers joining and leaving, and trace the memory it keeps
+
+    :param numPeers: number of peers churned between the two tracemalloc snapshots
+    :param numWarmupPeers: number of peers churned before, so that caches and lazy imports are settled
+    :param traceFilePattern: the memory allocated by the matching files is reported apart
+    :return: {
+                'sizesBefore': structureSizes() after warmup, 'sizesAfter': structureSizes() after churn,
+                'bytesPerPeer': float, 'filteredBytesPerPeer': float, allocated by traceFilePattern only,
+                'topGrowth': [(str, int), ...], the allocation sites that grew most, 'seconds': float,
+                'peerSeconds': [float, ...], per churned peer
+            }
+    """
+    server = FakeRoomServer()
+    client, joinTask = await joinClient(server, 'churn', {'consumeBatchWindow': 0})
+    try:
+        await churnPeers(client, server, [f'warmup-{idx}' for idx in range(numWarmupPeers)], numDataConsumers)
+        sizesBefore = structureSizes(client)
+        startedTracing = not tracemalloc.is_tracing()
+        if startedTracing:
+            tracemalloc.start()
+        try:
+            snapshotBefore = tracemalloc.take_snapshot()
+            startTime = time.perf_counter()
+            peerSeconds = await churnPeers(client, server, [f'peer-{idx}' for idx in range(numPeers)],
+                                           numDataConsumers)
+            seconds = time.perf_counter() - startTime
+            snapshotAfter = tracemalloc.take_snapshot()
+        finally:
+            if startedTracing:
+                tracemalloc.stop()
+        sizesAfter = structureSizes(client)
+    finally:
+        await leaveClient(client, joinTask)
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    snapshotBefore = snapshotBefore.filter_traces(filters)
+    snapshotAfter = snapshotAfter.filter_traces(filters)
+    growth = snapshotAfter.compare_to(snapshotBefore, 'lineno')
+    traceFilter = [tracemalloc.Filter(True, traceFilePattern)]
+    filteredGrowth = snapshotAfter.filter_traces(traceFilter).compare_to(
+        snapshotBefore.filter_traces(traceFilter), 'filename')
+    return {
+        'sizesBefore': sizesBefore,
+        'sizesAfter': sizesAfter,
+        'bytesPerPeer': sum(stat.size_diff for stat in growth) / numPeers,
+        'filteredBytesPerPeer': sum(stat.size_diff for stat in filteredGrowth) / numPeers,
+        'topGrowth': [(str(stat.traceback), stat.size_diff) for stat in growth[:10]],
+        'seconds': seconds,
+        'peerSeconds': peerSeconds
+    }
+
+
+async def runConcurrentJoins(numPeers: int, negotiateInBackground: bool, numDataConsumers: int = 1) -> dict:
+    """
+    remote peers join all at once and the client consumes them, then they all leave
+
+    :param negotiateInBackground: see MediasoupClient.joinRoom() consumerConfig
+    :return: {
+                'seconds': float, until every peer was consumed, 'consumers': number of consumers then,
+                'dispatchStats': client.dispatchStats(), 'negotiationStats': client.negotiationStats(),
+                'sizes': structureSizes() once they left
+            }
+    """
+    server = FakeRoomServer()
+    client, joinTask = await joinClient(server, 'concurrent', {'consumeBatchWindow': 0,
+                                                               'negotiateInBackground': negotiateInBackground})
+    try:
+        room = client.room
+        peerIds = [f'peer-{idx}' for idx in range(numPeers)]
+        startTime = time.perf_counter()
+        await asyncio.gather(*[server.joinPeer(room, peerId, numDataConsumers=numDataConsumers)
+                               for peerId in peerIds])
+        seconds = time.perf_counter() - startTime
+        consumers = len(client.multimediaRuntime.consumerRegistry)
+        dispatchStats = client.dispatchStats()
+        negotiationStats = client.negotiationStats()
+        for peerId in peerIds:
+            server.leavePeer(peerId)
+        while any(room.getPeerByPeerId(peerId) is not None for peerId in peerIds):
+            await asyncio.sleep(0)
+        await client.waitReleased()
+        sizes = structureSizes(client)
+    finally:
+        await leaveClient(client, joinTask)
+    return {
+        'seconds': seconds,
+        'consumers': consumers,
+        'dispatchStats': dispatchStats,
+        'negotiationStats': negotiationStats,
+        'sizes': sizes
+    }
@@ -0,0 +1,173 @@
+import random
+
+from smcdk.deps.sdp_transform.grammar import grammar
+from smcdk.deps.sdp_transform.parser import parse
+from smcdk.deps.sdp_transform.writer import makeLine, defaultOuterOrder, defaultInnerOrder
+
+# every optional part of the grammar formats, a line at least per branch
+SESSION_LINES = [
+    'o=- 3848736491 2 IN IP4 127.0.0.1',
+    'o=jdoe 2890844526 2890842807 IN IP6 ::1',
+    's=-',
+    'i=a session',
+    'u=http://www.example.com/seminars/sdp.pdf',
+    'e=j.doe@example.com (Jane Doe)',
+    'p=+1 617 555-6011',
+    'c=IN IP4 224.2.17.12/127',
+    'b=AS:4000',
+    't=0 0',
+    'r=7d 1h 0 25h',
+    'z=2882844526 -1h 2898848070 0',
+    'a=group:BUNDLE 0 1 datachannel',
+    'a=group:LS 0 1',
+    'a=msid-semantic: WMS *',
+    'a=ice-lite',
+    'a=ice-options:trickle',
+    'a=fingerprint:sha-256 82:5A:68:3D:36:C3:0A:DE:AF:E7:32:43:D2:88:83:57:E2:BD:2D:9D',
+    'a=setup:actpass',
+    'a=extmap-allow-mixed',
+    'a=x-unknown-session-attribute',
+]
+
+MEDIA_LINES = [
+    'i=a media',
+    'c=IN IP4 0.0.0.0',
+    'c=IN IP6 ::1',
+    'b=TIAS:512000',
+    'b=AS:500',
+    'a=rtpmap:111 opus/48000/2',
+    'a=rtpmap:96 VP8/90000',
+    'a=rtpmap:0 PCMU',
+    'a=fmtp:111 minptime=10;useinbandfec=1',
+    'a=control:streamid=0',
+    'a=rtcp:9 IN IP4 0.0.0.0',
+    'a=rtcp:65179',
+    'a=rtcp-fb:111 trr-int 100',
+    'a=rtcp-fb:96 nack pli',
+    'a=rtcp-fb:96 goog-remb',
+    'a=extmap:1 urn:ietf:params:rtp-hdrext:sdes:mid',
+    'a=extmap:2/recvonly urn:ietf:params:rtp-hdrext:toffset',
+    'a=extmap:3/sendrecv urn:ietf:params:rtp-hdrext:encrypt urn:ietf:params:rtp-hdrext:ssrc-audio-level vad=on',
+    'a=crypto:1 AES_CM_128_HMAC_SHA1_80 inline:PS1uQCVeeCFCanVmcjkpPywjNWhcYD0mXXtxaVBR|2^20|1:32',
+    'a=crypto:1 AES_CM_128_HMAC_SHA1_80 inline:PS1uQCVeeCFCanVmcjkpPywjNWhcYD0mXXtxaVBR|2^20|1:32 FEC_ORDER=FEC_SRTP',
+    'a=setup:active',
+    'a=connection:new',
+    'a=mid:0',
+    'a=msid:stream track',
+    'a=ptime:20',
+    'a=ptime:0.5',
+    'a=maxptime:60',
+    'a=sendrecv',
+    'a=recvonly',
+    'a=ice-ufrag:8fcG',
+    'a=ice-pwd:rUbFLmjgW0xbUeDo2fG4Mc',
+    'a=fingerprint:sha-256 82:5A:68:3D:36:C3:0A:DE:AF:E7:32:43:D2:88:83:57:E2:BD:2D:9D',
+    'a=candidate:0 1 udp 1076302079 192.168.56.1 44444 typ host',
+    'a=candidate:1 1 tcp 1518280447 192.168.56.1 9 typ host generation 0',
+    'a=candidate:2 1 udp 1686052607 203.0.113.1 5000 typ srflx raddr 192.168.56.1 rport 44444 generation 0 '
+    'network-id 1 network-cost 10',
+    'a=end-of-candidates',
+    'a=remote-candidates:1 192.168.1.1 5000 2 192.168.1.1 5001',
+    'a=ice-options:renomination',
+    'a=ssrc:1001 cname:abc',
+    'a=ssrc:1001 msid:stream track',
+    'a=ssrc-group:FID 1001 1002',
+    'a=msid-semantic: WMS stream',
+    'a=rtcp-mux',
+    'a=rtcp-rsize',
+    'a=sctpmap:5000 webrtc-datachannel 256',
+    'a=sctpmap:5000 webrtc-datachannel',
+    'a=x-google-flag:conference',
+    'a=rid:1 send max-width=1280;max-height=720',
+    'a=rid:2 recv',
+    'a=imageattr:97 send [x=800,y=640,sar=1.1,q=0.6] [x=480,y=320] recv [x=330,y=250]',
+    'a=imageattr:* send [x=800,y=640]',
+    'a=simulcast:send 1,2,3;~4,~5 recv 6;~7,~8',
+    'a=simulcast:recv 1;2',
+    'a=simulcast: send rid=1;2',
+    'a=framerate:29.97',
+    'a=source-filter: incl IN IP4 * 192.168.1.1',
+    'a=bundle-only',
+    'a=label:1',
+    'a=sctp-port:5000',
+    'a=max-message-size:262144',
+    'a=ts-refclk:ntp=/traceable/',
+    'a=ts-refclk:local',
+    'a=mediaclk:direct=963214424',
+    'a=mediaclk:id=src1 sender rate=1000/1001',
+    'a=keywds:keywords',
+    'a=content:main',
+    'a=floorctrl:c-s',
+    'a=confid:1',
+    'a=userid:1',
+    'a=floorid:1 mstrm:2',
+    'a=x-unknown:foo',
+]
+
+MEDIA_HEADERS = [
+    'm=audio 9 UDP/TLS/RTP/SAVPF 111 0',
+    'm=video 9 UDP/TLS/RTP/SAVPF 96 97',
+    'm=application 9 UDP/DTLS/SCTP webrtc-datachannel',
+    'm=video 0 UDP/TLS/RTP/SAVPF 96',
+]
+
+
+def legacyWrite(session: dict, outerOrder: list = defaultOuterOrder, innerOrder: list = defaultInnerOrder) -> str:
+    # the writer before the compiled emitters, kept as the reference of their output
+    if session.get('version') == None:
+        session['version'] = 0
+    if session.get('name') == None:
+        session['name'] = ' '
+    for media in session.get('media', []):
+        if media.get('payloads') == None:
+            media['payloads'] = ''
+    sdp = []
+    for field in outerOrder:
+        for obj in grammar[field]:
+            if obj.get('name'):
+                if obj['name'] in session.keys() and session.get(obj['name']) != None:
+                    sdp.append(makeLine(field, obj, session))
+            elif obj.get('push'):
+                if obj['push'] in session.keys() and session.get(obj['push']) != None:
+                    for el in session.get(obj['push']):
+                        sdp.append(makeLine(field, obj, el))
+    for mLine in session.get('media', []):
+        sdp.append(makeLine('m', grammar['m'][0], mLine))
+        for field in innerOrder:
+            for obj in grammar[field]:
+                if obj.get('name'):
+                    if obj['name'] in mLine.keys() and mLine.get(obj['name']) != None:
+                        sdp.append(makeLine(field, obj, mLine))
+                elif obj.get('push'):
+                    if obj['push'] in mLine.keys() and mLine.get(obj['push']) != None:
+                        for el in mLine.get(obj['push']):
+                            sdp.append(makeLine(field, obj, el))
+    return '\r\n'.join(sdp)
+
+
+def generateRandomSdp(rand: random.Random, maxMediaSections: int = 6) -> str:
+    """
+    a random SDP text made of the lines above, in random order and with random repetitions
+    """
+    lines = ['v=0'] + rand.sample(SESSION_LINES, rand.randint(0, len(SESSION_LINES)))
+    for _ in range(rand.randint(0, maxMediaSections)):
+        lines.append(rand.choice(MEDIA_HEADERS))
+        lines.extend(rand.choices(MEDIA_LINES, k=rand.randint(0, 30)))
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def generateRandomSdpDict(rand: random.Random, maxMediaSections: int = 6) -> dict:
+    """
+    a parsed random SDP, some of its values dropped or set to None, like the handlers modify them
+    """
+    sdpDict = parse(generateRandomSdp(rand, maxMediaSections))
+    for location in [sdpDict] + sdpDict['media']:
+        for key in list(location.keys()):
+            if key in ('media', 'version', 'name', 'payloads', 'type', 'port', 'protocol'):
+                continue
+            choice = rand.random()
+            if choice < 0.05:
+                location[key] = None
+            elif choice < 0.1:
+                del location[key]
+    return sdpDict
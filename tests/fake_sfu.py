@@ -0,0 +1,116 @@
+import asyncio
+import time
+from typing import List
+from uuid import uuid4
+
+from aiortc import RTCPeerConnection, RTCSessionDescription, VideoStreamTrack
+
+from smcdk import Device
+from smcdk.models.transport import IceParameters, IceCandidate, DtlsParameters
+from smcdk.rtp_parameters import RtpParameters
+
+from .fake_handler import FakeHandler
+from .fake_parameters import generateRouterRtpCapabilities
+
+
+class LoopbackSfu:
+    """
+    in-process aiortc peer standing for the router of a sending transport: it answers the offers of the handler,
+    so that the producers really encode and send their RTP to it over loopback ICE and DTLS
+    """
+
+    def __init__(self):
+        self.pc = RTCPeerConnection()
+        # the bundled transport, its parameters are handed to the client before the first offer
+        self._transceiver = self.pc.addTransceiver('video', direction='recvonly')
+
+    async def generateTransportRemoteParameters(self) -> tuple:
+        """
+        :return: (id, iceParameters, iceCandidates, dtlsParameters, sctpParameters), like the server would send them
+        """
+        dtlsTransport = self._transceiver.receiver.transport
+        iceGatherer = dtlsTransport.transport.iceGatherer
+        await iceGatherer.gather()
+        localIceParameters = iceGatherer.getLocalParameters()
+        iceParameters = IceParameters(usernameFragment=localIceParameters.usernameFragment,
+                                      password=localIceParameters.password, iceLite=False)
+        iceCandidates: List[IceCandidate] = [IceCandidate(
+            foundation=candidate.foundation,
+            priority=candidate.priority,
+            ip=candidate.ip,
+            protocol=candidate.protocol,
+            port=candidate.port,
+            type=candidate.type
+        ) for candidate in iceGatherer.getLocalCandidates() if ':' not in candidate.ip]
+        dtlsParameters = DtlsParameters(role='auto', fingerprints=[
+            {'algorithm': fingerprint.algorithm, 'value': fingerprint.value}
+            for fingerprint in dtlsTransport.getLocalParameters().fingerprints])
+        return str(uuid4()), iceParameters, iceCandidates, dtlsParameters, None
+
+    async def answer(self, offer: RTCSessionDescription):
+        """
+        apply the last offer of the sending handler, the handler already applied the answer of its remote sdp
+        """
+        await self.pc.setRemoteDescription(offer)
+        await self.pc.setLocalDescription(await self.pc.createAnswer())
+
+    async def close(self):
+        await self.pc.close()
+
+
+async def measureProducerCpu(numProducers: int, windowSeconds: float = 2) -> dict:
+    """
+    CPU time of the process while idle, while video producers send to a LoopbackSfu, and once they were closed,
+    their tracks left live like shared ones, so that only stopping the senders stops the encoding
+
+    :return: {'idle': float, 'producing': float, 'closed': float}, CPU seconds per wall second of each window,
+        the decoding of the loopback receivers included
+    """
+    sfu = LoopbackSfu()
+    device = Device(handlerFactory=FakeHandler.createFactory(tracks=[]))
+    await device.load(generateRouterRtpCapabilities())
+    id, iceParameters, iceCandidates, dtlsParameters, sctpParameters = await sfu.generateTransportRemoteParameters()
+    sendTransport = device.createSendTransport(
+        id=id,
+        iceParameters=iceParameters,
+        iceCandidates=iceCandidates,
+        dtlsParameters=dtlsParameters,
+        sctpParameters=sctpParameters
+    )
+
+    @sendTransport.on('connect')
+    async def on_connect(dtlsParameters):
+        pass
+
+    @sendTransport.on('produce')
+    async def on_produce(kind: str, rtpParameters: RtpParameters, appData: dict) -> str:
+        return str(uuid4())
+
+    async def cpuWindow() -> float:
+        startCpu = time.process_time()
+        startTime = time.perf_counter()
+        await asyncio.sleep(windowSeconds)
+        return (time.process_time() - startCpu) / (time.perf_counter() - startTime)
+
+    handler = sendTransport.handler
+    tracks = [VideoStreamTrack() for _ in range(numProducers)]
+    try:
+        idle = await cpuWindow()
+        producers = []
+        for track in tracks:
+            producers.append(await sendTransport.produce(track=track, stopTracks=False))
+            await sfu.answer(handler.pc.localDescription)
+        # the first window covers the connection and the first key frames
+        await cpuWindow()
+        producing = await cpuWindow()
+        for producer in producers:
+            await producer.close()
+            await sfu.answer(handler.pc.localDescription)
+        await cpuWindow()
+        closed = await cpuWindow()
+    finally:
+        await sendTransport.close()
+        await sfu.close()
+        for track in tracks:
+            track.stop()
+    return {'idle': idle, 'producing': producing, 'closed': closed}
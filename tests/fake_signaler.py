@@ -0,0 +1,106 @@
+import asyncio
+
+from smcdk.api.mediasoup_client import MediasoupClient
+from smcdk.api.mediasoup_signaler import MediasoupSignalerInterface, Response
+
+from .fake_parameters import generateRouterRtpCapabilities, generateTransportRemoteParameters
+
+
+class FakeSignaler(MediasoupSignalerInterface):
+    """
+    in-memory protoo server answering every request after the given round-trip time
+    """
+
+    def __init__(self, rtt: float = 0):
+        self.rtt = rtt
+        # (method, loop time) of every request sent
+        self.sentRequests = []
+        # requestIds of the server requests answered by the client
+        self.answeredRequestIds = []
+        self._loop = None
+        self._messages: asyncio.Queue = None
+        self._responses = {}
+        self._nextRequestId = 1
+
+    async def connectToRoom(self, loop, serverAddress, roomId, peerId, enableSslVerification: bool = True):
+        self._loop = loop
+        self._messages = asyncio.Queue()
+
+    def pushMessage(self, message: dict):
+        """
+        send a request or a notification from the server side
+        """
+        self._messages.put_nowait(message)
+
+    def _respond(self, requestId: int, method: str, data: dict):
+        if method == 'getRouterRtpCapabilities':
+            data = generateRouterRtpCapabilities().dict(exclude_none=True)
+        elif method == 'createWebRtcTransport':
+            id, iceParameters, iceCandidates, dtlsParameters, sctpParameters = generateTransportRemoteParameters()
+            data = {
+                'id': id,
+                'iceParameters': iceParameters.dict(exclude_none=True),
+                'iceCandidates': [iceCandidate.dict(exclude_none=True) for iceCandidate in iceCandidates],
+                'dtlsParameters': dtlsParameters.dict(exclude_none=True),
+                'sctpParameters': sctpParameters.dict(exclude_none=True)
+            }
+        elif method == 'join':
+            data = {'peers': []}
+        elif method in ('produce', 'produceData'):
+            data = {'id': f'{method}-{requestId}'}
+        else:
+            data = {}
+        self._messages.put_nowait({'response': True, 'id': requestId, 'ok': True, 'data': data})
+
+    async def _sendRequest(self, method: str, data: dict) -> int:
+        requestId = self._nextRequestId
+        self._nextRequestId += 1
+        self.sentRequests.append((method, self._loop.time()))
+        self._responses[requestId] = self._loop.create_future()
+        self._loop.call_later(self.rtt, self._respond, requestId, method, data)
+        return requestId
+
+    async def getRouterRtpCapabilities(self) -> int:
+        return await self._sendRequest('getRouterRtpCapabilities', {})
+
+    async def createSendTransport(self, sctpCapabilities: dict):
+        return await self._sendRequest('createWebRtcTransport', {'producing': True, 'consuming': False})
+
+    async def createRecvTransport(self, sctpCapabilities: dict):
+        return await self._sendRequest('createWebRtcTransport', {'producing': False, 'consuming': True})
+
+    async def join(self, displayName: str, device: dict, rtpCapabilities: dict, sctpCapabilities: dict):
+        return await self._sendRequest('join', {'displayName': displayName})
+
+    async def connectWebRtcTransport(self, transportId: str, dtlsParameters: dict):
+        return await self._sendRequest('connectWebRtcTransport', {'transportId': transportId})
+
+    async def produce(self, transportId: str, kind: str, rtpParameters: dict, appData: dict):
+        return await self._sendRequest('produce', {'transportId': transportId, 'kind': kind})
+
+    async def produceData(self, transportId: str, label: str, protocol: str, sctpStreamParameters: dict, appData: dict):
+        return await self._sendRequest('produceData', {'transportId': transportId})
+
+    async def receiveMessage(self):
+        return await self._messages.get()
+
+    async def responseToNewConsumer(self, requestId: int):
+        self.answeredRequestIds.append(requestId)
+
+    async def responseToNewDataConsumer(self, requestId: int):
+        self.answeredRequestIds.append(requestId)
+
+    def setResponse(self, message: dict):
+        self._responses[message['id']].set_result(message)
+
+    async def getResponse(self, requestId: int):
+        message = await self._responses[requestId]
+        del self._responses[requestId]
+        return Response(requestId=message['id'], method=None, data=message['data'])
+
+
+def createFakeClient():
+    """
+    client factory of the process pool tests, module level to be picklable
+    """
+    return MediasoupClient(signaler=FakeSignaler(rtt=0.01))